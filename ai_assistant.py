@@ -3,26 +3,113 @@ AI Assistant for Prompt Optimization and Parameter Generation
 Supports Ollama (local) and Google Gemini API
 """
 
+import csv
+import io
 import json
-import urllib.request
-import urllib.parse
-import urllib.error
+import re
 import os
-from typing import Optional, List, Dict, Any
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from typing import Optional, List, Dict, Any, Iterator, Tuple
+from ai_cache import ResponseCache
+from llm_transport import LLMTransport, TransportHTTPError
+from model_catalogue import ModelCatalogue
+from ollama_residency import OllamaResidency
 from ai_instructions import (
     OPTIMIZE_PROMPT_INSTRUCTION,
+    OPTIMIZE_BATCH_PROMPT_INSTRUCTION,
     EDIT_PROMPT_INSTRUCTION,
     GENERATE_PARAMETERS_INSTRUCTION,
+    CSV_CHUNK_NOTE,
     get_csv_with_instructions
 )
 
+# Sampling options are part of the cache key, so keep them in one place
+OLLAMA_OPTIONS = {
+    'temperature': 0.7,
+    'top_p': 0.9
+}
+# Default transport settings per provider (timeouts in seconds)
+DEFAULT_PROVIDER_SETTINGS = {
+    'ollama': {'timeout': 120, 'max_concurrency': 3},
+    'gemini': {'timeout': 30, 'max_concurrency': 4}
+}
+GEMINI_GENERATION_CONFIG = {
+    'temperature': 0.7,
+    'topP': 0.9,
+    'maxOutputTokens': 2048
+}
+
+# Fan-out settings for large CSV parameter requests
+CSV_CHUNK_SIZE = 10  # Rows requested per LLM call
+CSV_MAX_CONCURRENCY = 3  # Chunk calls in flight at once
+CSV_CHUNK_RETRIES = 2  # Extra attempts for a chunk whose output didn't parse
+
+
+def parse_csv_rows(text: str, parameters: list) -> List[List[str]]:
+    """
+    Parse LLM CSV output, validating that the header matches the requested parameters
+    
+    Markdown fences, comment lines and rows with the wrong column count are skipped.
+    
+    Raises:
+        ValueError: If no header row matching the parameters is found
+    """
+    expected = [p.strip().lower() for p in parameters]
+    lines = [
+        line for line in text.splitlines()
+        if line.strip() and not line.strip().startswith(('```', '#'))
+    ]
+    
+    rows = []
+    header_found = False
+    for row in csv.reader(lines, skipinitialspace=True):
+        cells = [cell.strip() for cell in row]
+        if not header_found:
+            if [c.lower() for c in cells] == expected:
+                header_found = True
+            continue
+        if [c.lower() for c in cells] == expected:
+            continue  # Repeated header
+        if len(cells) == len(expected) and any(cells):
+            rows.append(cells)
+    
+    if not header_found:
+        raise ValueError(f"Header row '{','.join(parameters)}' not found in response")
+    return rows
+
+
+def row_fingerprint(row: List[str]) -> Tuple[str, ...]:
+    """Normalize a row so case, punctuation and spacing variants compare equal"""
+    return tuple(' '.join(re.findall(r'\w+', cell.lower())) for cell in row)
+
+
+def format_csv_rows(rows: List[List[str]]) -> str:
+    """Serialize rows as CSV text, quoting only where needed"""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer, lineterminator='\n')
+    writer.writerows(rows)
+    return buffer.getvalue().rstrip('\n')
+
 
 class AIAssistant:
     """AI assistant for prompt optimization and parameter generation"""
     
-    def __init__(self, ollama_url: str = "http://127.0.0.1:11434"):
+    def __init__(
+        self,
+        ollama_url: str = "http://127.0.0.1:11434",
+        cache: Optional[ResponseCache] = None,
+        keep_alive_seconds: int = 300,
+        transport: Optional[LLMTransport] = None
+    ):
         self.ollama_url = ollama_url
         self.gemini_api_key = self._load_gemini_key()
+        self.cache = cache if cache is not None else ResponseCache()
+        self.transport = transport if transport is not None else LLMTransport(DEFAULT_PROVIDER_SETTINGS)
+        self.residency = OllamaResidency(ollama_url, keep_alive_seconds=keep_alive_seconds, transport=self.transport)
+        self.catalogue = ModelCatalogue({
+            'ollama': self.list_ollama_models,
+            'gemini': self.list_gemini_models
+        })
     
     def _load_gemini_key(self) -> Optional[str]:
         """Load Gemini API key from .env file"""
@@ -38,34 +125,142 @@ class AIAssistant:
                 print(f"Error loading .env file: {e}")
         return None
     
+    def list_ollama_models(self) -> List[Dict[str, Any]]:
+        """
+        Fetch Ollama models with metadata (raises if Ollama is unreachable)
+        
+        Returns:
+            List of dicts with 'name', 'size', 'family', 'parameter_size' and 'quantization'
+        """
+        data = self.transport.get_json('ollama', f"{self.ollama_url}/api/tags", timeout=5)
+        models = []
+        for model in data.get('models', []):
+            details = model.get('details') or {}
+            models.append({
+                'name': model['name'],
+                'size': model.get('size'),
+                'family': details.get('family'),
+                'parameter_size': details.get('parameter_size'),
+                'quantization': details.get('quantization_level')
+            })
+        return models
+    
+    def list_gemini_models(self) -> List[Dict[str, Any]]:
+        """Get Gemini models with metadata (empty without an API key)"""
+        if not self.gemini_api_key:
+            return []
+        return [
+            {'name': name, 'size': None, 'family': 'gemini', 'parameter_size': None, 'quantization': None}
+            for name in ('gemini-2.5-flash', 'gemini-2.5-pro')
+        ]
+    
     def get_available_ollama_models(self) -> List[str]:
         """Get list of available Ollama models"""
         try:
-            req = urllib.request.Request(
-                f"{self.ollama_url}/api/tags",
-                method="GET"
-            )
-            with urllib.request.urlopen(req, timeout=5) as response:
-                data = json.loads(response.read().decode())
-                return [model['name'] for model in data.get('models', [])]
+            return [model['name'] for model in self.list_ollama_models()]
         except Exception as e:
             print(f"Error fetching Ollama models: {e}")
             return []
     
     def get_available_gemini_models(self) -> List[str]:
         """Get list of available Gemini models"""
-        if not self.gemini_api_key:
-            return []
-        return ['gemini-2.5-flash', 'gemini-2.5-pro']
+        return [model['name'] for model in self.list_gemini_models()]
     
     def get_available_models(self) -> Dict[str, List[str]]:
-        """Get all available models grouped by provider"""
-        return {
-            'ollama': self.get_available_ollama_models(),
-            'gemini': self.get_available_gemini_models()
-        }
+        """Get all available models grouped by provider (served from the catalogue)"""
+        return self.catalogue.snapshot()['models']
+    
+    def build_optimize_instruction(self, prompt: str, use_instructions: bool = True, is_batch: bool = False) -> str:
+        """Render the instruction sent for prompt optimization"""
+        if not use_instructions:
+            # Just send the prompt directly without instructions
+            return prompt
+        if is_batch:
+            return OPTIMIZE_BATCH_PROMPT_INSTRUCTION.format(prompt=prompt)
+        return OPTIMIZE_PROMPT_INSTRUCTION.format(prompt=prompt)
+    
+    def build_edit_instruction(self, prompt: str, suggestion: str) -> str:
+        """Render the instruction sent for a suggested prompt edit"""
+        return EDIT_PROMPT_INSTRUCTION.format(prompt=prompt, suggestion=suggestion)
+    
+    def build_csv_instruction(
+        self,
+        base_prompt: str,
+        parameters: list,
+        count: int,
+        custom_context: str = None,
+        use_instructions: bool = True,
+        variable_parameters: list = None
+    ) -> str:
+        """Render the instruction sent for CSV parameter generation"""
+        # Build context info based on what's provided
+        context_parts = []
+        
+        if base_prompt:
+            context_parts.append(f"Base Prompt Template: {base_prompt}")
+        
+        # Add hints for variable parameters
+        if variable_parameters:
+            param_hints = []
+            if 'width' in variable_parameters or 'height' in variable_parameters:
+                param_hints.append("- width/height: Use values like 512, 768, 1024, 1536, 2048 (multiples of 64)")
+            if 'steps' in variable_parameters:
+                param_hints.append("- steps: Use values between 4-20 (4 for fast, 8-12 balanced, 16-20 detailed)")
+            if 'seed' in variable_parameters:
+                param_hints.append("- seed: Use random integers or leave empty for random generation")
+            if 'file_prefix' in variable_parameters:
+                param_hints.append("- file_prefix: Use descriptive names matching content (e.g., 'portrait', 'landscape', 'character')")
+            if 'subfolder' in variable_parameters:
+                param_hints.append("- subfolder: Use logical folder names for organization (e.g., 'portraits', 'landscapes', 'variations')")
+            if 'mcnl_lora' in variable_parameters or 'snofs_lora' in variable_parameters:
+                param_hints.append("- LoRA parameters: Use true/false, yes/no, or 1/0 to enable/disable")
+            
+            if param_hints:
+                context_parts.append("\nVariable Parameter Guidelines:\n" + "\n".join(param_hints))
+        
+        if custom_context:
+            context_parts.append(f"\nCustom Requirements: {custom_context}")
+        
+        context_info = "\n".join(context_parts) if context_parts else "Generate creative and diverse parameter values."
+        
+        headers = ",".join(parameters)
+        if use_instructions:
+            return GENERATE_PARAMETERS_INSTRUCTION.format(
+                context_info=context_info,
+                count=count,
+                headers=headers
+            )
+        # Without instructions, just send a simple request
+        return f"{context_info}\n\nGenerate {count} diverse CSV rows with these parameters: {headers}\n\nFirst row must be the headers, then {count} data rows."
+    
+    def build_parameter_values_instruction(self, parameter: str, count: int, instructions: str = None) -> str:
+        """Render the instruction sent for single-parameter value generation"""
+        # Build context for this parameter
+        context_parts = [f"Generate {count} diverse and creative values for the parameter '{parameter}'."]
+        
+        # Add parameter-specific hints
+        if parameter == 'width' or parameter == 'height':
+            context_parts.append("Use image dimensions like 512, 768, 1024, 1536, 2048 (multiples of 64). Consider various aspect ratios.")
+        elif parameter == 'steps':
+            context_parts.append("Use values between 4-20 (4 for fast generation, 8-12 balanced, 16-20 detailed).")
+        elif parameter == 'seed':
+            context_parts.append("Use random integers or -1 for random generation.")
+        elif parameter == 'file_prefix':
+            context_parts.append("Use descriptive file name prefixes that match the content (e.g., 'portrait', 'landscape', 'character', 'scene').")
+        elif parameter == 'subfolder':
+            context_parts.append("Use logical folder names for organization (e.g., 'portraits', 'landscapes', 'variations', 'tests').")
+        elif 'lora' in parameter.lower():
+            context_parts.append("Use boolean values: true, false, yes, no, 1, or 0.")
+        
+        # Add custom instructions if provided
+        if instructions:
+            context_parts.append(f"\nAdditional requirements: {instructions}")
+        
+        context_parts.append(f"\nOutput exactly {count} values, one per line. No numbering, no explanations, just the values.")
+        
+        return "\n".join(context_parts)
     
-    def optimize_prompt(self, prompt: str, model: str, provider: str = 'ollama', use_instructions: bool = True, is_batch: bool = False) -> Dict[str, Any]:
+    def optimize_prompt(self, prompt: str, model: str, provider: str = 'ollama', use_instructions: bool = True, is_batch: bool = False, use_cache: bool = True) -> Dict[str, Any]:
         """
         Optimize an image generation prompt
         
@@ -75,35 +270,19 @@ class AIAssistant:
             provider: 'ollama' or 'gemini'
             use_instructions: If True, use the optimize instructions. If False, just send the prompt.
             is_batch: If True, use batch prompt optimization (preserves [parameters])
+            use_cache: If False, bypass the response cache and always call the model
         
         Returns:
             Dict with 'success', 'optimized_prompt', and optional 'error'
         """
-        from ai_instructions import OPTIMIZE_BATCH_PROMPT_INSTRUCTION
-        
-        if use_instructions:
-            if is_batch:
-                instruction = OPTIMIZE_BATCH_PROMPT_INSTRUCTION.format(prompt=prompt)
-            else:
-                instruction = OPTIMIZE_PROMPT_INSTRUCTION.format(prompt=prompt)
-        else:
-            # Just send the prompt directly without instructions
-            instruction = prompt
+        instruction = self.build_optimize_instruction(prompt, use_instructions, is_batch)
         
         try:
-            if provider == 'ollama':
-                result = self._call_ollama(instruction, model)
-            elif provider == 'gemini':
-                result = self._call_gemini(instruction, model)
-            else:
-                return {'success': False, 'error': f'Unknown provider: {provider}'}
-            
-            return result
-        
+            return self.complete(instruction, model, provider, use_cache=use_cache)
         except Exception as e:
             return {'success': False, 'error': str(e)}
     
-    def suggest_prompt_edit(self, prompt: str, suggestion: str, model: str, provider: str = 'ollama') -> Dict[str, Any]:
+    def suggest_prompt_edit(self, prompt: str, suggestion: str, model: str, provider: str = 'ollama', use_cache: bool = True) -> Dict[str, Any]:
         """
         Apply a user suggestion to modify a prompt
         
@@ -112,22 +291,15 @@ class AIAssistant:
             suggestion: User's suggestion for modification
             model: Model name
             provider: 'ollama' or 'gemini'
+            use_cache: If False, bypass the response cache and always call the model
         
         Returns:
             Dict with 'success', 'edited_prompt', and optional 'error'
         """
-        instruction = EDIT_PROMPT_INSTRUCTION.format(prompt=prompt, suggestion=suggestion)
+        instruction = self.build_edit_instruction(prompt, suggestion)
         
         try:
-            if provider == 'ollama':
-                result = self._call_ollama(instruction, model)
-            elif provider == 'gemini':
-                result = self._call_gemini(instruction, model)
-            else:
-                return {'success': False, 'error': f'Unknown provider: {provider}'}
-            
-            return result
-        
+            return self.complete(instruction, model, provider, use_cache=use_cache)
         except Exception as e:
             return {'success': False, 'error': str(e)}
     
@@ -140,7 +312,8 @@ class AIAssistant:
         provider: str = 'ollama',
         custom_context: str = None,
         use_instructions: bool = True,
-        variable_parameters: list = None
+        variable_parameters: list = None,
+        use_cache: bool = True
     ) -> Dict[str, Any]:
         """
         Generate CSV parameter data for batch generation
@@ -154,80 +327,144 @@ class AIAssistant:
             custom_context: Custom suggestions/context
             use_instructions: Whether to include default instructions
             variable_parameters: List of parameter names that are generation params (width, height, etc.)
+            use_cache: If False, bypass the response cache and always call the model
         
         Returns:
             Dict with 'success', 'csv_data', and optional 'error'
         """
-        from ai_instructions import GENERATE_PARAMETERS_INSTRUCTION
-        
-        # Build context info based on what's provided
-        context_parts = []
-        
-        if base_prompt:
-            context_parts.append(f"Base Prompt Template: {base_prompt}")
-        
-        # Add hints for variable parameters
-        if variable_parameters:
-            param_hints = []
-            if 'width' in variable_parameters or 'height' in variable_parameters:
-                param_hints.append("- width/height: Use values like 512, 768, 1024, 1536, 2048 (multiples of 64)")
-            if 'steps' in variable_parameters:
-                param_hints.append("- steps: Use values between 4-20 (4 for fast, 8-12 balanced, 16-20 detailed)")
-            if 'seed' in variable_parameters:
-                param_hints.append("- seed: Use random integers or leave empty for random generation")
-            if 'file_prefix' in variable_parameters:
-                param_hints.append("- file_prefix: Use descriptive names matching content (e.g., 'portrait', 'landscape', 'character')")
-            if 'subfolder' in variable_parameters:
-                param_hints.append("- subfolder: Use logical folder names for organization (e.g., 'portraits', 'landscapes', 'variations')")
-            if 'mcnl_lora' in variable_parameters or 'snofs_lora' in variable_parameters:
-                param_hints.append("- LoRA parameters: Use true/false, yes/no, or 1/0 to enable/disable")
-            
-            if param_hints:
-                context_parts.append("\nVariable Parameter Guidelines:\n" + "\n".join(param_hints))
-        
-        if custom_context:
-            context_parts.append(f"\nCustom Requirements: {custom_context}")
-        
-        context_info = "\n".join(context_parts) if context_parts else "Generate creative and diverse parameter values."
-        
-        # Build the instruction
-        if use_instructions:
-            headers = ",".join(parameters)
-            instruction = GENERATE_PARAMETERS_INSTRUCTION.format(
-                context_info=context_info,
-                count=count,
-                headers=headers
-            )
-        else:
-            # Without instructions, just send a simple request
-            headers = ",".join(parameters)
-            instruction = f"{context_info}\n\nGenerate {count} diverse CSV rows with these parameters: {headers}\n\nFirst row must be the headers, then {count} data rows."
+        instruction = self.build_csv_instruction(
+            base_prompt,
+            parameters,
+            count,
+            custom_context=custom_context,
+            use_instructions=use_instructions,
+            variable_parameters=variable_parameters
+        )
         
         try:
-            if provider == 'ollama':
-                result = self._call_ollama(instruction, model)
-            elif provider == 'gemini':
-                result = self._call_gemini(instruction, model)
-            else:
-                return {'success': False, 'error': f'Unknown provider: {provider}'}
+            result = self.complete(instruction, model, provider, use_cache=use_cache)
             
             if result.get('success'):
                 # The result should contain 'optimized_prompt' which is our CSV data
                 csv_data = result.get('optimized_prompt', '')
-                return {'success': True, 'csv_data': csv_data}
+                return {'success': True, 'csv_data': csv_data, 'cached': result.get('cached', False)}
             else:
                 return result
         
         except Exception as e:
             return {'success': False, 'error': str(e)}
     
+    def iter_csv_parameters_parallel(
+        self,
+        base_prompt: str,
+        parameters: list,
+        count: int,
+        model: str,
+        provider: str = 'ollama',
+        custom_context: str = None,
+        use_instructions: bool = True,
+        variable_parameters: list = None,
+        use_cache: bool = True,
+        chunk_size: int = CSV_CHUNK_SIZE,
+        max_concurrency: int = CSV_MAX_CONCURRENCY,
+        retries: int = CSV_CHUNK_RETRIES
+    ) -> Iterator[Tuple[str, Any]]:
+        """
+        Generate CSV rows with concurrent chunked calls, yielding results as chunks finish
+        
+        Each chunk's output must carry the requested header; chunks that don't
+        parse are retried (bypassing the cache) without touching the others.
+        Near-duplicate rows across chunks are dropped.
+        
+        Yields:
+            ('rows', [row, ...]) for each finished chunk, then
+            ('error', message) for every chunk that failed all attempts
+        """
+        chunk_counts = [min(chunk_size, count - start) for start in range(0, count, chunk_size)]
+        total = len(chunk_counts)
+        seen = set()
+        
+        def run_chunk(index: int, attempt: int) -> List[List[str]]:
+            note = CSV_CHUNK_NOTE.format(index=index + 1, total=total)
+            context = f"{custom_context}\n{note}" if custom_context else note
+            instruction = self.build_csv_instruction(
+                base_prompt,
+                parameters,
+                chunk_counts[index],
+                custom_context=context,
+                use_instructions=use_instructions,
+                variable_parameters=variable_parameters
+            )
+            # Retries must not replay the response that just failed to parse
+            result = self.complete(instruction, model, provider, use_cache=use_cache and attempt == 0)
+            if not result.get('success'):
+                raise ValueError(result.get('error', 'Unknown error'))
+            return parse_csv_rows(result.get('optimized_prompt', ''), parameters)
+        
+        executor = ThreadPoolExecutor(max_workers=max(1, min(max_concurrency, total)))
+        try:
+            pending = {executor.submit(run_chunk, i, 0): (i, 0) for i in range(total)}
+            while pending:
+                future = next(as_completed(pending))
+                index, attempt = pending.pop(future)
+                try:
+                    rows = future.result()
+                except Exception as e:
+                    if attempt < retries:
+                        pending[executor.submit(run_chunk, index, attempt + 1)] = (index, attempt + 1)
+                    else:
+                        yield 'error', f"Chunk {index + 1}/{total} failed: {e}"
+                    continue
+                
+                unique_rows = []
+                for row in rows:
+                    key = row_fingerprint(row)
+                    if key not in seen:
+                        seen.add(key)
+                        unique_rows.append(row)
+                yield 'rows', unique_rows
+        finally:
+            # Don't start queued chunks if the consumer went away (e.g. stream stopped)
+            executor.shutdown(wait=False, cancel_futures=True)
+    
+    def generate_csv_parameters_parallel(self, base_prompt: str, parameters: list, count: int, model: str, **kwargs) -> Dict[str, Any]:
+        """
+        Fan-out variant of generate_csv_parameters for large row counts
+        
+        Accepts the same keyword arguments as iter_csv_parameters_parallel().
+        
+        Returns:
+            Dict with 'success', 'csv_data', 'row_count', 'errors', and optional 'error'
+        """
+        rows = []
+        errors = []
+        try:
+            for kind, payload in self.iter_csv_parameters_parallel(base_prompt, parameters, count, model, **kwargs):
+                if kind == 'rows':
+                    rows.extend(payload)
+                else:
+                    errors.append(payload)
+        except Exception as e:
+            return {'success': False, 'error': str(e)}
+        
+        if not rows:
+            return {'success': False, 'error': '; '.join(errors) or 'No rows generated', 'errors': errors}
+        
+        return {
+            'success': True,
+            'csv_data': format_csv_rows([list(parameters)] + rows[:count]),
+            'row_count': min(len(rows), count),
+            'errors': errors
+        }
+    
     def generate_parameter_values(
         self,
         parameter: str,
         count: int,
         model: str,
         provider: str = 'ollama',
-        instructions: str = None
+        instructions: str = None,
+        use_cache: bool = True
     ) -> Dict[str, Any]:
         """
         Generate values for a single parameter
@@ -238,42 +475,15 @@ class AIAssistant:
             model: Model name
             provider: 'ollama' or 'gemini'
             instructions: Custom instructions for value generation
+            use_cache: If False, bypass the response cache and always call the model
         
         Returns:
             Dict with 'success', 'values' (list), and optional 'error'
         """
-        # Build context for this parameter
-        context_parts = [f"Generate {count} diverse and creative values for the parameter '{parameter}'."]
-        
-        # Add parameter-specific hints
-        if parameter == 'width' or parameter == 'height':
-            context_parts.append("Use image dimensions like 512, 768, 1024, 1536, 2048 (multiples of 64). Consider various aspect ratios.")
-        elif parameter == 'steps':
-            context_parts.append("Use values between 4-20 (4 for fast generation, 8-12 balanced, 16-20 detailed).")
-        elif parameter == 'seed':
-            context_parts.append("Use random integers or -1 for random generation.")
-        elif parameter == 'file_prefix':
-            context_parts.append("Use descriptive file name prefixes that match the content (e.g., 'portrait', 'landscape', 'character', 'scene').")
-        elif parameter == 'subfolder':
-            context_parts.append("Use logical folder names for organization (e.g., 'portraits', 'landscapes', 'variations', 'tests').")
-        elif 'lora' in parameter.lower():
-            context_parts.append("Use boolean values: true, false, yes, no, 1, or 0.")
-        
-        # Add custom instructions if provided
-        if instructions:
-            context_parts.append(f"\nAdditional requirements: {instructions}")
-        
-        context_parts.append(f"\nOutput exactly {count} values, one per line. No numbering, no explanations, just the values.")
-        
-        instruction = "\n".join(context_parts)
+        instruction = self.build_parameter_values_instruction(parameter, count, instructions)
         
         try:
-            if provider == 'ollama':
-                result = self._call_ollama(instruction, model)
-            elif provider == 'gemini':
-                result = self._call_gemini(instruction, model)
-            else:
-                return {'success': False, 'error': f'Unknown provider: {provider}'}
+            result = self.complete(instruction, model, provider, use_cache=use_cache)
             
             if result.get('success'):
                 # Parse the result into individual values
@@ -288,7 +498,7 @@ class AIAssistant:
                     if cleaned:
                         cleaned_values.append(cleaned)
                 
-                return {'success': True, 'values': cleaned_values}
+                return {'success': True, 'values': cleaned_values, 'cached': result.get('cached', False)}
             else:
                 return result
         
@@ -382,12 +592,7 @@ class AIAssistant:
         )
         
         try:
-            if provider == 'ollama':
-                result = self._call_ollama(instruction, model)
-            elif provider == 'gemini':
-                result = self._call_gemini(instruction, model)
-            else:
-                return {'success': False, 'error': f'Unknown provider: {provider}'}
+            result = self.complete(instruction, model, provider)
             
             if result['success']:
                 # Rename key for clarity
@@ -400,93 +605,125 @@ class AIAssistant:
         except Exception as e:
             return {'success': False, 'error': str(e)}
     
-    def _call_ollama(self, prompt: str, model: str, stream: bool = False) -> Dict[str, Any]:
+    def complete(self, instruction: str, model: str, provider: str = 'ollama', use_cache: bool = True) -> Dict[str, Any]:
+        """
+        Run a fully rendered instruction through a provider, using the response cache
+        
+        Args:
+            instruction: Rendered instruction text
+            model: Model name
+            provider: 'ollama' or 'gemini'
+            use_cache: If False, skip the cache lookup (the fresh response is still stored)
+        
+        Returns:
+            Dict with 'success', 'optimized_prompt', 'cached', and optional 'error'
+        """
+        if provider not in ('ollama', 'gemini'):
+            return {'success': False, 'error': f'Unknown provider: {provider}'}
+        
+        key = self._cache_key(provider, model, instruction)
+        if use_cache:
+            entry = self.cache.get(key)
+            if entry is not None:
+                return {'success': True, 'optimized_prompt': entry['text'], 'cached': True}
+        
+        if provider == 'ollama':
+            result = self._call_ollama(instruction, model)
+        else:
+            result = self._call_gemini(instruction, model)
+        
+        if result.get('success'):
+            self.cache.set(key, result.get('optimized_prompt', ''))
+            result['cached'] = False
+        return result
+    
+    def stream_completion(self, instruction: str, model: str, use_cache: bool = True) -> Iterator[str]:
+        """
+        Stream an Ollama response, replaying cached chunks on a hit
+        
+        Only streams that run to completion are stored; stopped or failed
+        streams are never cached.
+        """
+        key = self._cache_key('ollama', model, instruction)
+        if use_cache:
+            entry = self.cache.get(key)
+            if entry is not None:
+                yield from entry['chunks']
+                return
+        
+        def store(chunks: List[str]):
+            self.cache.set(key, ''.join(chunks).strip(), chunks)
+        
+        yield from self._call_ollama(instruction, model, stream=True, on_complete=store)
+    
+    def _cache_key(self, provider: str, model: str, instruction: str) -> str:
+        options = OLLAMA_OPTIONS if provider == 'ollama' else GEMINI_GENERATION_CONFIG
+        return ResponseCache.make_key(provider, model, instruction, options)
+    
+    def _call_ollama(self, prompt: str, model: str, stream: bool = False, on_complete=None) -> Dict[str, Any]:
         """Call Ollama API"""
         data = {
             'model': model,
             'prompt': prompt,
             'stream': stream,
-            'options': {
-                'temperature': 0.7,
-                'top_p': 0.9
-            }
+            'options': dict(OLLAMA_OPTIONS),
+            'keep_alive': self.residency.keep_alive_for(model)
         }
+        url = f"{self.ollama_url}/api/generate"
         
-        req = urllib.request.Request(
-            f"{self.ollama_url}/api/generate",
-            data=json.dumps(data).encode('utf-8'),
-            headers={'Content-Type': 'application/json'},
-            method="POST"
-        )
+        if stream:
+            # Return generator for streaming
+            return self._stream_ollama(url, data, model, on_complete)
         
         try:
-            if stream:
-                # Return generator for streaming
-                return self._stream_ollama(req, model)
-            else:
-                with urllib.request.urlopen(req, timeout=120) as response:
-                    result = json.loads(response.read().decode())
-                    response_text = result.get('response', '').strip()
-                    
-                    # Unload model immediately
-                    self._unload_ollama_model(model)
-                    
-                    return {
-                        'success': True,
-                        'optimized_prompt': response_text
-                    }
-        except urllib.error.HTTPError as e:
-            error_msg = e.read().decode() if e.fp else str(e)
-            return {'success': False, 'error': f'Ollama HTTP error: {error_msg}'}
+            result = self.transport.post_json('ollama', url, data)
+            response_text = result.get('response', '').strip()
+            
+            # Model stays loaded for the keep_alive window sent above
+            self.residency.touch(model)
+            
+            return {
+                'success': True,
+                'optimized_prompt': response_text
+            }
+        except TransportHTTPError as e:
+            return {'success': False, 'error': f'Ollama HTTP error: {e.body}'}
         except Exception as e:
             return {'success': False, 'error': f'Ollama error: {str(e)}'}
     
-    def _stream_ollama(self, req, model: str):
-        """Stream responses from Ollama API"""
+    def _stream_ollama(self, url: str, data: Dict[str, Any], model: str, on_complete=None):
+        """Stream responses from Ollama API, calling on_complete(chunks) when Ollama reports done"""
         try:
-            with urllib.request.urlopen(req, timeout=120) as response:
-                full_response = ""
-                for line in response:
-                    line_text = line.decode('utf-8').strip()
-                    if line_text:
-                        try:
-                            chunk = json.loads(line_text)
-                            if 'response' in chunk:
-                                text = chunk['response']
-                                full_response += text
-                                yield text
-                            if chunk.get('done', False):
-                                break
-                        except json.JSONDecodeError:
-                            continue
-                
-                # Unload model after streaming completes
-                self._unload_ollama_model(model)
-                
+            chunks = []
+            finished = False
+            for line in self.transport.stream_lines('ollama', url, data):
+                line_text = line.decode('utf-8').strip()
+                if line_text:
+                    try:
+                        chunk = json.loads(line_text)
+                        if 'response' in chunk:
+                            text = chunk['response']
+                            chunks.append(text)
+                            yield text
+                        if chunk.get('done', False):
+                            finished = True
+                            break
+                    except json.JSONDecodeError:
+                        continue
+            
+            if finished and on_complete:
+                on_complete(chunks)
+            
+            self.residency.touch(model)
+            
+        except TransportHTTPError as e:
+            yield f"\n\n[Error: {e.body}]"
         except Exception as e:
             yield f"\n\n[Error: {str(e)}]"
-            self._unload_ollama_model(model)
     
     def _unload_ollama_model(self, model: str):
         """Unload Ollama model from memory immediately"""
-        try:
-            data = {
-                'model': model,
-                'keep_alive': 0  # Unload immediately
-            }
-            
-            req = urllib.request.Request(
-                f"{self.ollama_url}/api/generate",
-                data=json.dumps(data).encode('utf-8'),
-                headers={'Content-Type': 'application/json'},
-                method="POST"
-            )
-            
-            with urllib.request.urlopen(req, timeout=5) as response:
-                pass  # Just trigger the unload
-                
-        except Exception as e:
-            print(f"Warning: Could not unload model {model}: {e}")
+        self.residency.unload(model)
     
     def _call_gemini(self, prompt: str, model: str) -> Dict[str, Any]:
         """Call Google Gemini API"""
@@ -501,44 +738,31 @@ class AIAssistant:
                     'text': prompt
                 }]
             }],
-            'generationConfig': {
-                'temperature': 0.7,
-                'topP': 0.9,
-                'maxOutputTokens': 2048
-            }
+            'generationConfig': dict(GEMINI_GENERATION_CONFIG)
         }
         
-        req = urllib.request.Request(
-            url,
-            data=json.dumps(data).encode('utf-8'),
-            headers={'Content-Type': 'application/json'},
-            method="POST"
-        )
-        
         try:
-            with urllib.request.urlopen(req, timeout=30) as response:
-                result = json.loads(response.read().decode())
-                
-                # Extract text from response
-                candidates = result.get('candidates', [])
-                if not candidates:
-                    return {'success': False, 'error': 'No response from Gemini'}
-                
-                content = candidates[0].get('content', {})
-                parts = content.get('parts', [])
-                if not parts:
-                    return {'success': False, 'error': 'Empty response from Gemini'}
-                
-                response_text = parts[0].get('text', '').strip()
-                
-                return {
-                    'success': True,
-                    'optimized_prompt': response_text
-                }
-                
-        except urllib.error.HTTPError as e:
-            error_msg = e.read().decode() if e.fp else str(e)
-            return {'success': False, 'error': f'Gemini HTTP error: {error_msg}'}
+            result = self.transport.post_json('gemini', url, data)
+            
+            # Extract text from response
+            candidates = result.get('candidates', [])
+            if not candidates:
+                return {'success': False, 'error': 'No response from Gemini'}
+            
+            content = candidates[0].get('content', {})
+            parts = content.get('parts', [])
+            if not parts:
+                return {'success': False, 'error': 'Empty response from Gemini'}
+            
+            response_text = parts[0].get('text', '').strip()
+            
+            return {
+                'success': True,
+                'optimized_prompt': response_text
+            }
+        
+        except TransportHTTPError as e:
+            return {'success': False, 'error': f'Gemini HTTP error: {e.body}'}
         except Exception as e:
             return {'success': False, 'error': f'Gemini error: {str(e)}'}
 
@@ -548,7 +772,7 @@ if __name__ == '__main__':
     assistant = AIAssistant()
     
     # Test model discovery
-    print("Available models:", assistant.get_available_models())
+    print("Available models:", assistant.get_available_ollama_models() + assistant.get_available_gemini_models())
     
     # Test prompt optimization (requires Ollama running with a model)
     # result = assistant.optimize_prompt("a cat", "llama2", "ollama")
@@ -0,0 +1,203 @@
+"""
+Response Cache for AI Assistant
+Two-tier (memory LRU + bounded on-disk) cache for LLM responses
+"""
+
+import hashlib
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Optional, Dict, Any, List
+
+
+class ResponseCache:
+    """LRU memory cache backed by a bounded directory of JSON files"""
+
+    def __init__(
+        self,
+        cache_dir: Optional[str] = None,
+        max_memory_entries: int = 256,
+        max_disk_entries: int = 2000,
+        ttl_seconds: Optional[float] = 7 * 24 * 3600
+    ):
+        """
+        Initialize the response cache
+
+        Args:
+            cache_dir: Directory for the on-disk tier (None disables it)
+            max_memory_entries: Maximum number of entries kept in memory
+            max_disk_entries: Maximum number of entry files kept on disk
+            ttl_seconds: Entry lifetime in seconds (None for no expiry)
+        """
+        self.cache_dir = cache_dir
+        self.max_memory_entries = max_memory_entries
+        self.max_disk_entries = max_disk_entries
+        self.ttl_seconds = ttl_seconds
+        self._memory: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._disk_count: Optional[int] = None  # Counted lazily on first disk write
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def make_key(provider: str, model: str, instruction: str, options: Optional[Dict[str, Any]] = None) -> str:
+        """Build a cache key from everything that influences the response"""
+        payload = json.dumps(
+            [provider, model, instruction, options or {}],
+            sort_keys=True,
+            ensure_ascii=False
+        )
+        return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        """
+        Look up an entry, checking memory first and then disk
+
+        Returns:
+            Dict with 'text' and 'chunks', or None on a miss or expired entry
+        """
+        now = time.time()
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry is not None:
+                if self._is_expired(entry, now):
+                    del self._memory[key]
+                else:
+                    self._memory.move_to_end(key)
+                    self.hits += 1
+                    return entry
+
+        entry = self._read_disk(key)
+        with self._lock:
+            if entry is None or self._is_expired(entry, now):
+                self.misses += 1
+                return None
+            self._remember(key, entry)
+            self.hits += 1
+            return entry
+
+    def set(self, key: str, text: str, chunks: Optional[List[str]] = None):
+        """
+        Store a response in both tiers
+
+        Args:
+            key: Key from make_key()
+            text: Full response text
+            chunks: Streamed chunks in order (defaults to a single chunk)
+        """
+        entry = {
+            'text': text,
+            'chunks': chunks if chunks is not None else [text],
+            'created': time.time()
+        }
+        with self._lock:
+            self._remember(key, entry)
+        self._write_disk(key, entry)
+
+    def clear(self):
+        """Remove every entry from memory and disk"""
+        with self._lock:
+            self._memory.clear()
+            self._disk_count = 0
+        if not self.cache_dir or not os.path.isdir(self.cache_dir):
+            return
+        for path, _ in self._iter_disk_files():
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+
+    def stats(self) -> Dict[str, Any]:
+        """Get hit/miss counters and tier sizes"""
+        with self._lock:
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'memory_entries': len(self._memory),
+                'disk_entries': self._disk_count,
+                'ttl_seconds': self.ttl_seconds
+            }
+
+    def _is_expired(self, entry: Dict[str, Any], now: float) -> bool:
+        if self.ttl_seconds is None:
+            return False
+        return now - entry.get('created', 0) > self.ttl_seconds
+
+    def _remember(self, key: str, entry: Dict[str, Any]):
+        """Insert into the memory tier (caller holds the lock)"""
+        self._memory[key] = entry
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_memory_entries:
+            self._memory.popitem(last=False)
+
+    def _disk_path(self, key: str) -> str:
+        return os.path.join(self.cache_dir, key[:2], f"{key}.json")
+
+    def _read_disk(self, key: str) -> Optional[Dict[str, Any]]:
+        if not self.cache_dir:
+            return None
+        path = self._disk_path(key)
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return None
+        except Exception as e:
+            print(f"Warning: Discarding unreadable cache entry {path}: {e}")
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+            return None
+
+    def _write_disk(self, key: str, entry: Dict[str, Any]):
+        if not self.cache_dir:
+            return
+        path = self._disk_path(key)
+        try:
+            is_new = not os.path.exists(path)
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            tmp_path = f"{path}.{threading.get_ident()}.tmp"
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump(entry, f, ensure_ascii=False)
+            os.replace(tmp_path, path)
+        except Exception as e:
+            print(f"Warning: Could not write cache entry: {e}")
+            return
+
+        with self._lock:
+            if self._disk_count is None:
+                self._disk_count = sum(1 for _ in self._iter_disk_files())
+            elif is_new:
+                self._disk_count += 1
+            over_limit = self._disk_count > self.max_disk_entries
+        if over_limit:
+            self._prune_disk()
+
+    def _iter_disk_files(self):
+        """Yield (path, mtime) for every entry file on disk"""
+        for shard in os.scandir(self.cache_dir):
+            if not shard.is_dir():
+                continue
+            for item in os.scandir(shard.path):
+                if item.name.endswith('.json'):
+                    try:
+                        yield item.path, item.stat().st_mtime
+                    except OSError:
+                        continue
+
+    def _prune_disk(self):
+        """Evict the oldest files until the disk tier is back under 90% of its limit"""
+        files = sorted(self._iter_disk_files(), key=lambda f: f[1])
+        target = int(self.max_disk_entries * 0.9)
+        removed = 0
+        for path, _ in files[:max(0, len(files) - target)]:
+            try:
+                os.remove(path)
+                removed += 1
+            except OSError:
+                pass
+        with self._lock:
+            self._disk_count = len(files) - removed
@@ -76,6 +76,9 @@ value1b,value2b,value3b
 
 Now generate the CSV:"""
 
+# Appended to the custom requirements when a large CSV request is split into parallel chunks
+CSV_CHUNK_NOTE = """This is batch {index} of {total} generated in parallel. Explore a different part of the space than the other batches so the combined rows don't repeat each other."""
+
 # CSV Export Instructions Header
 CSV_EXPORT_INSTRUCTIONS = """# ComfyUI Batch Generation CSV Instructions
 
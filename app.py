@@ -2,16 +2,36 @@
 Flask Web UI for ComfyUI Workflow
 """
 
-from flask import Flask, render_template, request, jsonify, send_file, send_from_directory, Response, stream_with_context
-from comfyui_client import ComfyUIClient
-from ai_assistant import AIAssistant
+from flask import Flask, render_template, request, jsonify, send_file, send_from_directory, Response, stream_with_context, make_response
+from comfyui_client import ComfyUIClient, GenerationCancelled
+from comfyui_transport import ComfyUITransport, RetryPolicy, CircuitBreaker, TransportError
+from ai_assistant import AIAssistant, CSV_CHUNK_SIZE, format_csv_rows
+from ai_cache import ResponseCache
+from llm_transport import LLMTransport
+from batch_ingest import IngestRegistry, extract_parameters, iter_csv_records, iter_jsonl_records, ingest
+import sweeps
+from job_records import JobRecord, PARAM_FIELDS
+from input_store import InputStore
+from image_probe import probe_images
+from postprocess import PostProcessor
+from png_metadata import portable_metadata, reconcile
+from search_index import SearchIndex
+from perceptual_hash import SimilarityIndex, hash_files, DEFAULT_RADIUS
+from file_operations import FileTransaction, FileOperationError, resolve_item
+from zip_export import collect_files, stream_zip
+from scheduler import FairScheduler
+from pipelines import PipelineGraph, plan_pipeline
+from workflow_registry import WorkflowRegistry, WorkflowError
+from startup import StartupSequence, warm_imports
 import os
 import json
 import time
 import threading
+import multiprocessing
 from datetime import datetime
 from pathlib import Path
 import uuid
+from urllib.parse import quote
 
 app = Flask(__name__)
 app.config['SECRET_KEY'] = 'comfyui-webui-secret-key'
@@ -20,26 +40,115 @@ app.config['SECRET_KEY'] = 'comfyui-webui-secret-key'
 OUTPUT_DIR = Path("outputs")
 OUTPUT_DIR.mkdir(exist_ok=True)
 METADATA_FILE = OUTPUT_DIR / "metadata.json"
+OUTPUT_TRASH_DIR = OUTPUT_DIR / ".trash"  # Deleted files wait here until their metadata change is saved
 QUEUE_FILE = OUTPUT_DIR / "queue_state.json"
+COMFYUI_SERVER_ADDRESS = "127.0.0.1:8188"
+COMFYUI_INPUT_DIR = Path('..') / 'comfy.git' / 'app' / 'input'
+# 'local': ComfyUI reads COMFYUI_INPUT_DIR directly; 'upload': inputs are pushed through
+# ComfyUI's /upload/image (remote or multi-node setups); 'auto': local when that works
+COMFYUI_INPUT_MODE = 'auto'
+COMFYUI_UPLOAD_CACHE_FILE = Path("cache") / "comfyui_uploads.json"
+COMFYUI_REQUEST_TIMEOUT = 30  # Seconds per HTTP call to ComfyUI (polling for results, not the whole generation)
+# Idempotent ComfyUI calls (history, image download, upload) are retried on connection errors
+# with full-jitter exponential backoff: attempt n waits up to min(max_delay, base_delay * 2**n)
+COMFYUI_RETRY = {'attempts': 4, 'base_delay': 0.5, 'max_delay': 8.0}
+# After failure_threshold failed calls in a row, dispatch pauses and ComfyUI is probed every
+# reset_timeout seconds, doubling up to max_reset_timeout while it stays down
+COMFYUI_BREAKER = {'failure_threshold': 3, 'reset_timeout': 5.0, 'max_reset_timeout': 60.0}
+COMFYUI_REQUEUE_LIMIT = 5  # Times a job goes back to the queue after losing ComfyUI before it is failed
+WORKFLOWS_DIR = Path("workflows")  # <name>.json workflows with a <name>.map.json parameter-to-node mapping
+DEFAULT_WORKFLOW = 'Qwen_Full'  # Workflow of jobs that don't name one
+IMAGE_PROBE_WORKERS = 8  # Threads reading image headers when queueing an input folder
+INPUT_GC_MIN_AGE_SECONDS = 3600  # Unused stored inputs younger than this survive garbage collection
+AI_CACHE_DIR = Path("cache") / "ai_responses"
+AI_CACHE_TTL_SECONDS = 7 * 24 * 3600  # Cached LLM responses expire after a week
+MAX_PARALLEL_CSV_ROWS = 200  # Row limit for fan-out CSV generation (single calls stay capped at 50)
+OLLAMA_KEEP_ALIVE_SECONDS = 300  # Keep used Ollama models warm for 5 minutes while the image queue is idle
+AI_PROVIDER_SETTINGS = {
+    'ollama': {'timeout': 120, 'max_concurrency': 3},  # Match OLLAMA_NUM_PARALLEL on the Ollama side
+    'gemini': {'timeout': 30, 'max_concurrency': 4}
+}
+INGEST_CHUNK_SIZE = 500  # Jobs spliced into the queue per lock acquisition during CSV/JSONL ingestion
+POSTPROCESS_WORKERS = 2  # Worker processes for post-generation steps
+# Output subfolder -> post-processing steps (see postprocess.STEPS); the longest matching
+# folder wins and '' covers every other folder. Steps may be dicts with options,
+# e.g. {'step': 'thumbnail', 'size': 320}
+POSTPROCESS_STEPS = {
+    '': ['sha256', 'dhash']
+}
+POSTPROCESS_CACHE_DIR = Path("cache") / "postprocess"  # Thumbnails and transcodes, mirroring outputs/
+POSTPROCESS_METADATA_FIELDS = ('sha256', 'dhash')  # Step results copied into the image's metadata entry
+METADATA_FLUSH_DELAY_SECONDS = 2.0  # Post-processing results are batched into one metadata.json write
+SIMILAR_MAX_RADIUS = 16  # Largest Hamming distance accepted by /api/similar and /api/duplicates
+SEARCH_MAX_PER_PAGE = 200
+METADATA_SCAN_PROCESSES = 4  # Processes reading embedded PNG metadata when reindexing outputs/
+# Priority class -> share of the GPU while classes compete; jobs of one class are
+# shared fairly between submitters (browser sessions, or the 'submitter' field)
+QUEUE_PRIORITY_WEIGHTS = {
+    'interactive': 16,  # Default for single images from the Generate button
+    'normal': 4,  # Default for batches and input-folder batches
+    'bulk': 1  # Default for sweeps and CSV/JSONL ingestion
+}
+SUBMITTER_COOKIE = 'submitter_id'  # Identifies a browser for fair sharing of the queue
+LATENT_BATCH_SIZE = 4  # Max identical random-seed jobs generated in one ComfyUI execution (1 disables batching)
+LATENT_BATCH_MAX_PIXELS = 4 * 1024 * 1024  # Max total pixels of one batch, to bound VRAM (4 x 1024x1024)
+BATCH_MATCH_FIELDS = PARAM_FIELDS + ('prompt',)  # Jobs batched together must agree on all of these
+STARTUP_WAIT_SECONDS = 30  # Queue requests made while the saved queue is loading wait this long before a 503
+PRELOAD_MODULES = ('PIL.Image', 'psutil', 'subprocess')  # Imported in the background after startup instead of by the first request
 
 # Global queue and status
-generation_queue = []
+generation_queue = FairScheduler(QUEUE_PRIORITY_WEIGHTS)  # Queued jobs and sweeps, picked by priority class and submitter
+waiting_jobs = PipelineGraph()  # Pipeline jobs held back until the jobs they depend on finish
 completed_jobs = []  # Keep last 50 completed jobs
 MAX_COMPLETED_HISTORY = 50
 queue_lock = threading.Lock()
 active_generation = None
+active_batch = []  # Jobs generated in the active job's ComfyUI execution (the active job first)
 last_queue_empty_time = None  # Track when queue became empty
 timer_stopped = False  # Flag to prevent timer restart after unload
 UNLOAD_DELAY_SECONDS = 300  # Wait 300 seconds (5 minutes) after queue empty before unloading
-previous_use_image_mode = None  # Track previous job's use_image state to detect mode changes
+metadata_lock = threading.RLock()  # Serializes load/modify/save of metadata.json
+metadata_index_lock = threading.Lock()  # One reindex at a time
+pending_metadata_updates = {}  # Entry id -> fields waiting to be written to metadata.json
+metadata_update_lock = threading.Lock()
+metadata_flush_timer = None
+metadata_cache = None  # ((mtime_ns, size), entries) of the metadata.json last read or written
+metadata_cache_lock = threading.Lock()
+transport_requeues = {}  # Job id -> times it went back to the queue after losing ComfyUI
+job_prompts = {}  # Job id -> ComfyUI prompt_id of its last execution, until the job leaves the queue
+generation_cancel = threading.Event()  # Set to stop the active ComfyUI execution
+cancelled_job_ids = set()  # Jobs of the active batch whose cancellation was requested
+previous_generation_mode = None  # Previous job's (workflow, use_image), to detect model switches
+ingest_registry = IngestRegistry()  # Progress of recent CSV/JSONL ingestions
+input_store = InputStore(COMFYUI_INPUT_DIR)  # Deduplicated uploads, refcounted by queued jobs
+post_processor = PostProcessor(POSTPROCESS_STEPS, POSTPROCESS_CACHE_DIR, max_workers=POSTPROCESS_WORKERS)
+startup = StartupSequence()  # Queue/metadata loading and module preloading, run after the server is up
 
 # Initialize ComfyUI client and AI assistant
-comfyui_client = ComfyUIClient(server_address="127.0.0.1:8188")
-ai_assistant = AIAssistant(ollama_url="http://127.0.0.1:11434")
-
-
-def get_next_filename(prefix: str, subfolder: str = "", extension: str = "png") -> tuple:
-    """Generate next available filename with incremental index"""
+workflow_registry = WorkflowRegistry(WORKFLOWS_DIR, default=DEFAULT_WORKFLOW)
+comfyui_client = ComfyUIClient(
+    server_address=COMFYUI_SERVER_ADDRESS,
+    input_dir=str(COMFYUI_INPUT_DIR),
+    input_mode=COMFYUI_INPUT_MODE,
+    upload_cache_path=str(COMFYUI_UPLOAD_CACHE_FILE),
+    workflows=workflow_registry,
+    transport=ComfyUITransport(
+        COMFYUI_SERVER_ADDRESS,
+        timeout=COMFYUI_REQUEST_TIMEOUT,
+        retry=RetryPolicy(**COMFYUI_RETRY),
+        breaker=CircuitBreaker(**COMFYUI_BREAKER)
+    )
+)
+ai_assistant = AIAssistant(
+    ollama_url="http://127.0.0.1:11434",
+    cache=ResponseCache(cache_dir=str(AI_CACHE_DIR), ttl_seconds=AI_CACHE_TTL_SECONDS),
+    keep_alive_seconds=OLLAMA_KEEP_ALIVE_SECONDS,
+    transport=LLMTransport(AI_PROVIDER_SETTINGS)
+)
+
+
+def get_next_filename(prefix: str, subfolder: str = "", extension: str = "png", reserved=()) -> tuple:
+    """Generate next available filename with incremental index, skipping the reserved paths (not written yet)"""
     target_dir = OUTPUT_DIR / subfolder if subfolder else OUTPUT_DIR
     target_dir.mkdir(parents=True, exist_ok=True)
     
@@ -47,60 +156,70 @@ def get_next_filename(prefix: str, subfolder: str = "", extension: str = "png")
     while True:
         filename = f"{prefix}{index:04d}.{extension}"
         filepath = target_dir / filename
-        if not filepath.exists():
+        if not filepath.exists() and filepath not in reserved:
             relative_path = filepath.relative_to(OUTPUT_DIR)
             return str(relative_path), filepath
         index += 1
 
 
 def load_metadata():
-    """Load image metadata from file"""
-    if METADATA_FILE.exists():
-        with open(METADATA_FILE, 'r') as f:
-            return json.load(f)
-    return []
+    """Load image metadata from file
+
+    The file is parsed once and reused until it changes on disk. Callers get
+    their own list of entry copies, so they may modify and save it.
+    """
+    global metadata_cache
+    with metadata_cache_lock:
+        try:
+            stat = METADATA_FILE.stat()
+        except FileNotFoundError:
+            return []
+        key = (stat.st_mtime_ns, stat.st_size)
+        if metadata_cache is None or metadata_cache[0] != key:
+            with open(METADATA_FILE, 'r') as f:
+                metadata_cache = (key, json.load(f))
+        entries = metadata_cache[1]
+    return [dict(entry) for entry in entries]
 
 
 def save_metadata(metadata):
-    """Save image metadata to file"""
-    with open(METADATA_FILE, 'w') as f:
+    """Save image metadata to file (written to a temporary file first, so a failed save leaves the old one)"""
+    global metadata_cache
+    temp_file = METADATA_FILE.with_suffix('.json.tmp')
+    with open(temp_file, 'w') as f:
         json.dump(metadata, f, indent=2)
-
-
-def get_unique_filename(target_path: Path) -> Path:
-    """Get unique filename by appending (1), (2), etc. if file exists"""
-    if not target_path.exists():
-        return target_path
-    
-    stem = target_path.stem
-    suffix = target_path.suffix
-    parent = target_path.parent
-    index = 1
-    
-    while True:
-        new_name = f"{stem} ({index}){suffix}"
-        new_path = parent / new_name
-        if not new_path.exists():
-            return new_path
-        index += 1
-
-
-def update_metadata_path(old_path: str, new_path: str):
-    """Update metadata when a file is moved"""
-    metadata = load_metadata()
-    for entry in metadata:
-        if entry.get('path') == old_path:
-            entry['path'] = new_path
-            entry['filename'] = os.path.basename(new_path)
-            break
-    save_metadata(metadata)
-
-
-def delete_metadata_entry(file_path: str):
-    """Remove metadata entry when file is deleted"""
-    metadata = load_metadata()
-    metadata = [entry for entry in metadata if entry.get('path') != file_path]
-    save_metadata(metadata)
+    with metadata_cache_lock:
+        os.replace(temp_file, METADATA_FILE)
+        stat = METADATA_FILE.stat()
+        metadata_cache = ((stat.st_mtime_ns, stat.st_size), [dict(entry) for entry in metadata])
+
+
+def commit_file_transaction(transaction):
+    """
+    Apply planned moves/deletes and their metadata change as one unit
+
+    metadata.json is rewritten once for the whole batch. If a file operation
+    or the save fails, the files are put back and the error is raised. A
+    reindex running at the same time merges its results onto these changes
+    (see merge_reconciled), so it doesn't undo them.
+
+    Raises:
+        FileOperationError: If a file operation failed (already rolled back)
+    """
+    with metadata_lock:
+        transaction.apply()
+        try:
+            metadata, updated, removed = transaction.rewrite(load_metadata())
+            save_metadata(metadata)
+        except Exception:
+            transaction.rollback()
+            raise
+        for entry in updated:
+            search_index.add(entry)
+        for entry in removed:
+            search_index.remove(entry.get('id'))
+            similarity_index.remove(entry.get('id'))
+    transaction.finish()
 
 
 def load_queue_state():
@@ -109,32 +228,43 @@ def load_queue_state():
         try:
             with open(QUEUE_FILE, 'r') as f:
                 data = json.load(f)
-                return data.get('queue', []), data.get('completed', []), data.get('active')
+                queue = [JobRecord.from_dict(job) for job in data.get('queue', [])]
+                waiting = [JobRecord.from_dict(job) for job in data.get('waiting', [])]
+                return queue, waiting, data.get('completed', []), data.get('active')
         except Exception as e:
             print(f"Error loading queue state: {e}")
-    return [], [], None
+    return [], [], [], None
 
 
 def save_queue_state():
     """Save queue state to file"""
+    if not startup.is_ready('queue'):
+        return  # Don't replace the saved queue before it has been loaded
     try:
         with queue_lock:
-            data = {
-                'queue': generation_queue.copy(),
-                'active': active_generation.copy() if active_generation else None,
-                'completed': completed_jobs.copy()
-            }
+            queue = generation_queue.jobs()
+            queue.reverse()  # Stored newest first, like the queue view
+            waiting = waiting_jobs.jobs()
+            active = active_generation.copy() if active_generation else None
+            completed = completed_jobs.copy()
+        # Job records are converted to plain dicts outside the lock
+        data = {
+            'queue': [job.copy() for job in queue],
+            'waiting': [job.copy() for job in waiting],
+            'active': active,
+            'completed': [job.copy() for job in completed]
+        }
         with open(QUEUE_FILE, 'w') as f:
             json.dump(data, f, indent=2)
             f.flush()  # Ensure immediate write to disk
+        input_store.flush()  # Persist input reference counts alongside the queue
     except Exception as e:
         print(f"Error saving queue state: {e}")
 
 
-def add_metadata_entry(image_path, prompt, width, height, steps, seed, file_prefix, subfolder, cfg=1.0, shift=3.0, use_image=False, use_image_size=False, image_filename=None, mcnl_lora=False, snofs_lora=False, male_lora=False):
-    """Add a new metadata entry"""
-    metadata = load_metadata()
-    entry = {
+def build_metadata_entry(image_path, prompt, width, height, steps, seed, file_prefix, subfolder, cfg=1.0, shift=3.0, use_image=False, use_image_size=False, image_filename=None, mcnl_lora=False, snofs_lora=False, male_lora=False, workflow=None):
+    """Build the metadata entry for an image about to be generated (embedded in the PNG and indexed)"""
+    return {
         "id": str(uuid.uuid4()),
         "filename": os.path.basename(image_path),
         "path": str(image_path),
@@ -153,37 +283,329 @@ def add_metadata_entry(image_path, prompt, width, height, steps, seed, file_pref
         "file_prefix": file_prefix,
         "mcnl_lora": mcnl_lora,
         "snofs_lora": snofs_lora,
-        "male_lora": male_lora
+        "male_lora": male_lora,
+        "workflow": workflow
     }
-    metadata.append(entry)
-    save_metadata(metadata)
+
+
+# Prompt search over metadata entries, built from metadata.json on the first query
+search_index = SearchIndex(loader=load_metadata, root=OUTPUT_DIR)
+# Near-duplicate lookups over the perceptual hashes stored in metadata entries
+similarity_index = SimilarityIndex(loader=load_metadata)
+
+
+def add_metadata_entry(entry):
+    """Add a metadata entry for a written image, recording its mtime for index reconciliation"""
+    try:
+        entry['mtime'] = Path(entry['path']).stat().st_mtime
+    except OSError:
+        pass
+    with metadata_lock:
+        metadata = load_metadata()
+        metadata.append(entry)
+        save_metadata(metadata)
+    search_index.add(entry)
     return entry
 
 
+def merge_reconciled(current, snapshot, reconciled):
+    """
+    Apply what a reindex changed to the entries as they are now
+
+    The scan worked on a snapshot; entries added, moved, deleted or updated
+    (e.g. hashes) since then keep those changes. Of the scan's results, new
+    entries are added (unless an entry for their file appeared meanwhile, or
+    the file was moved or deleted by a file transaction since it was read),
+    fields it changed are applied where nobody else changed them, and pruned
+    entries are dropped unless they were moved in the meantime.
+
+    Args:
+        current: Entries loaded after the scan
+        snapshot: Copies of the entries the scan started from
+        reconciled: The scan's result
+
+    Returns:
+        The merged entries
+    """
+    before = {entry.get('id'): entry for entry in snapshot}
+    after = {entry.get('id'): entry for entry in reconciled}
+    merged = []
+    for entry in current:
+        entry_id = entry.get('id')
+        original = before.get(entry_id)
+        if original is None:
+            merged.append(entry)  # Added while the scan ran
+            continue
+        result = after.get(entry_id)
+        if result is None:
+            if entry.get('path') != original.get('path'):
+                merged.append(entry)  # Pruned by the scan, but moved since
+            continue
+        for key, value in result.items():
+            if original.get(key) != value and entry.get(key) == original.get(key):
+                entry[key] = value
+        merged.append(entry)
+    taken_ids = {entry.get('id') for entry in merged}
+    taken_paths = {str(Path(entry['path'])) for entry in merged if entry.get('path')}
+    for entry_id, entry in after.items():
+        if entry_id in before or entry_id in taken_ids or str(Path(entry['path'])) in taken_paths:
+            continue
+        if Path(entry['path']).exists():
+            merged.append(entry)
+    return merged
+
+
+def reindex_metadata(prune=False):
+    """Reconcile metadata.json with the PNGs under outputs/ (reads embedded metadata of changed files)"""
+    with metadata_index_lock:
+        started = time.time()
+        with metadata_lock:
+            snapshot = load_metadata()
+        scanned = [dict(entry) for entry in snapshot]  # reconcile() updates entries in place
+        entries, stats = reconcile(OUTPUT_DIR, scanned, processes=METADATA_SCAN_PROCESSES, prune=prune)
+        with metadata_lock:
+            # Moves, deletes, new outputs and hashes committed while the scan ran are kept
+            entries = merge_reconciled(load_metadata(), snapshot, entries)
+            save_metadata(entries)
+            search_index.rebuild(entries)
+            similarity_index.rebuild(entries)
+        stats['seconds'] = round(time.time() - started, 2)
+        print(f"Metadata index reconciled: {stats}")
+        return stats
+
+
+def queue_metadata_update(entry_id, fields):
+    """Merge fields into a metadata entry with the next batched write of metadata.json"""
+    global metadata_flush_timer
+    with metadata_update_lock:
+        pending_metadata_updates.setdefault(entry_id, {}).update(fields)
+        if metadata_flush_timer is None:
+            metadata_flush_timer = threading.Timer(METADATA_FLUSH_DELAY_SECONDS, flush_metadata_updates)
+            metadata_flush_timer.daemon = True
+            metadata_flush_timer.start()
+
+
+def flush_metadata_updates():
+    """Write all queued field updates to metadata.json at once"""
+    global metadata_flush_timer
+    with metadata_update_lock:
+        updates = dict(pending_metadata_updates)
+        pending_metadata_updates.clear()
+        metadata_flush_timer = None
+    if not updates:
+        return
+    with metadata_lock:
+        metadata = load_metadata()
+        for entry in metadata:
+            fields = updates.get(entry.get('id'))
+            if fields:
+                entry.update(fields)
+                search_index.add(entry)
+        save_metadata(metadata)
+
+
+def record_postprocess_results(job, results):
+    """Store hashes computed by post-processing with the job's metadata entry (pool callback thread)"""
+    fields = {key: results[key] for key in POSTPROCESS_METADATA_FIELDS if key in results}
+    if not fields or not job.get('metadata_id'):
+        return
+    if 'dhash' in fields:
+        similarity_index.add(job['metadata_id'], fields['dhash'])
+    queue_metadata_update(job['metadata_id'], fields)
+
+
+post_processor.on_result = record_postprocess_results
+
+
+def rehash_outputs():
+    """Compute perceptual hashes for metadata entries that have none (e.g. images from before hashing)"""
+    with metadata_index_lock:
+        started = time.time()
+        paths = {}
+        for entry in load_metadata():
+            if not entry.get('dhash') and entry.get('path') and os.path.exists(entry['path']):
+                paths[entry['path']] = entry['id']
+        hashes = {}
+        errors = 0
+        for path, value, error in hash_files(list(paths), processes=METADATA_SCAN_PROCESSES):
+            if error:
+                errors += 1
+                print(f"Warning: Could not hash {path}: {error}")
+            else:
+                hashes[paths[path]] = value
+        with metadata_lock:
+            metadata = load_metadata()
+            for entry in metadata:
+                if entry.get('id') in hashes:
+                    entry['dhash'] = hashes[entry['id']]
+                    similarity_index.add(entry['id'], entry['dhash'])
+            save_metadata(metadata)
+        return {'hashed': len(hashes), 'errors': errors, 'seconds': round(time.time() - started, 2)}
+
+
+def job_parameters(data, default_prefix='comfyui'):
+    """Normalize request data into generation parameters for a queue job
+
+    Raises:
+        ValueError: If the workflow is unknown or cannot apply the parameters
+    """
+    params = {
+        'prompt': data.get('prompt', ''),
+        'width': int(data.get('width', 1024)),
+        'height': int(data.get('height', 1024)),
+        'steps': int(data.get('steps', 4)),
+        'cfg': float(data.get('cfg', 1.0)),
+        'shift': float(data.get('shift', 3.0)),
+        'seed': data.get('seed'),
+        'use_image': data.get('use_image', False),
+        'use_image_size': data.get('use_image_size', False),
+        'image_filename': data.get('image_filename'),
+        'file_prefix': data.get('file_prefix', default_prefix),
+        'subfolder': data.get('subfolder', ''),
+        'mcnl_lora': data.get('mcnl_lora', False),
+        'snofs_lora': data.get('snofs_lora', False),
+        'male_lora': data.get('male_lora', False),
+        'workflow': data.get('workflow')
+    }
+    params['workflow'] = workflow_registry.check(params['workflow'], params)
+    return params
+
+
+def new_job(params, added_at=None, priority=None, submitter=None):
+    """Create a queued job record from generation parameters
+
+    Jobs queued together should pass one shared added_at timestamp and the
+    priority/submitter from queue_options().
+    """
+    input_store.retain(params.get('image_filename'))
+    job = JobRecord.create(params, added_at=added_at)
+    job.priority = priority
+    job.submitter = submitter
+    return job
+
+
+def queue_options(data, default_priority):
+    """Get the priority class and submitter for the jobs of a queue request
+
+    The submitter is the request's 'submitter' field, the X-Submitter header,
+    the browser's submitter cookie or else the client address.
+
+    Raises:
+        ValueError: If the priority class is unknown
+    """
+    priority = generation_queue.check_priority(data.get('priority'), default_priority)
+    submitter = (
+        data.get('submitter') or request.headers.get('X-Submitter')
+        or request.cookies.get(SUBMITTER_COOKIE) or request.remote_addr or ''
+    )
+    return {'priority': priority, 'submitter': str(submitter)[:100]}
+
+
+def release_job_inputs(jobs):
+    """Drop the input store references of jobs that left the queue"""
+    for job in jobs:
+        input_store.release(job.get('image_filename'))
+
+
+def pipeline_handoff(job):
+    """Prepare handing a finished job's output to the pipeline jobs that use it as input image
+
+    The output goes into the input store (hardlinked where possible, so not
+    copied) before the queue lock is taken.
+
+    Returns:
+        attach(dependent, job) callback for waiting_jobs.finish()
+    """
+    stored, error = None, None
+    if job['status'] == 'completed' and waiting_jobs.has_dependents(job['id']):
+        try:
+            stored = input_store.put_file(Path(job['output_path']))['filename']
+        except Exception as e:
+            error = e
+
+    def attach(dependent, parent):
+        if stored is None:
+            raise error or ValueError('No output file')
+        dependent['image_filename'] = stored
+        dependent['use_image'] = True
+        input_store.retain(stored)
+
+    return attach
+
+
+def can_share_batch(job, other):
+    """Whether a queued job can be generated in the same ComfyUI execution as job
+
+    Only jobs without a fixed seed qualify: one execution draws the noise for
+    every image from a single seed, so a batch cannot reproduce chosen seeds.
+    """
+    if other.get('seed') is not None or sweeps.is_sweep(other) or other.get('sweep_id'):
+        return False
+    return all(other.get(field) == job.get(field) for field in BATCH_MATCH_FIELDS)
+
+
+def batch_limit(job):
+    """Most jobs that can share an execution with job (its workflow must support batches)"""
+    try:
+        if not workflow_registry.get(job.get('workflow')).supports_batches:
+            return 1
+    except WorkflowError:
+        return 1  # Generating reports the error
+    return min(LATENT_BATCH_SIZE, LATENT_BATCH_MAX_PIXELS // max(1, job['width'] * job['height']))
+
+
 def process_queue():
     """Background thread to process the generation queue"""
-    global active_generation, generation_queue, completed_jobs, last_queue_empty_time, timer_stopped
+    global active_generation, active_batch, generation_queue, completed_jobs, last_queue_empty_time, timer_stopped
     
     while True:
         job = None
+        # While ComfyUI is unreachable nothing is dispatched; the breaker probes it now and then
+        backend_ready = not generation_queue or comfyui_client.transport.ready()
         
         with queue_lock:
-            if generation_queue and not active_generation:
-                job = generation_queue[-1]  # Take from end (oldest item)
+            if generation_queue and not active_generation and backend_ready:
+                job = generation_queue.next()  # Weighted fair pick across priority classes and submitters
+                batch = []
+                if sweeps.is_sweep(job):
+                    # Sweeps stay queued and hand out one concrete job at a time
+                    job = sweeps.next_job(job)
+                elif job.get('seed') is None:
+                    # Identical queued jobs with random seeds share one execution (one text encoding)
+                    batch = generation_queue.next_batch(job, batch_limit(job) - 1, lambda other: can_share_batch(job, other))
                 active_generation = job
-                job['status'] = 'generating'
+                active_batch = [job] + batch
+                generation_cancel.clear()
+                cancelled_job_ids.clear()
+                for batch_job in active_batch:
+                    batch_job['status'] = 'generating'
                 last_queue_empty_time = None  # Reset empty timer when processing
                 timer_stopped = False  # Allow timer to start again when queue becomes empty
         
         if job:
+            jobs = active_batch
+            # ComfyUI needs the VRAM now - release any warm Ollama models
+            ai_assistant.residency.set_image_queue_active(True)
+            
+            # A requeued job's earlier prompt may still be in ComfyUI; don't let it run twice
+            with queue_lock:
+                stale_prompts = {job_prompts.pop(batch_job['id']) for batch_job in jobs if batch_job['id'] in job_prompts}
+            for prompt_id in stale_prompts:
+                comfyui_client.cancel_prompt(prompt_id)
+            
+            def record_prompt(prompt_id):
+                with queue_lock:
+                    for batch_job in jobs:
+                        job_prompts[batch_job['id']] = prompt_id
+            
             try:
-                # Check if we're switching between text-to-image and image-to-image
-                global previous_use_image_mode
-                current_use_image = job.get('use_image', False)
+                # Check if we're switching workflows or between text-to-image and image-to-image
+                global previous_generation_mode
+                current_mode = (job.get('workflow') or DEFAULT_WORKFLOW, bool(job.get('use_image', False)))
                 
-                if previous_use_image_mode is not None and previous_use_image_mode != current_use_image:
-                    mode_change = "image-to-image to text-to-image" if previous_use_image_mode else "text-to-image to image-to-image"
-                    print(f"Mode change detected ({mode_change}). Unloading models...")
+                if previous_generation_mode is not None and previous_generation_mode != current_mode:
+                    describe = lambda mode: f"{mode[0]} {'image-to-image' if mode[1] else 'text-to-image'}"
+                    print(f"Mode change detected ({describe(previous_generation_mode)} to {describe(current_mode)}). Unloading models...")
                     try:
                         comfyui_client.unload_models()
                         comfyui_client.clear_cache()
@@ -192,12 +614,7 @@ def process_queue():
                         print(f"Warning: Error unloading models during mode switch: {e}")
                 
                 # Update previous mode for next comparison
-                previous_use_image_mode = current_use_image
-                
-                # Generate image with auto-incrementing filename
-                file_prefix = job.get('file_prefix', 'comfyui')
-                subfolder = job.get('subfolder', '')
-                relative_path, output_path = get_next_filename(file_prefix, subfolder)
+                previous_generation_mode = current_mode
                 
                 # Get the seed (generate if not provided)
                 seed = job.get('seed')
@@ -205,6 +622,38 @@ def process_queue():
                     import random
                     seed = random.randint(0, 2**32 - 1)
                 
+                # Auto-incrementing filenames; metadata is built up front so the
+                # parameters are embedded in each PNG as it is written
+                file_prefix = job.get('file_prefix', 'comfyui')
+                subfolder = job.get('subfolder', '')
+                outputs = []
+                for batch_index in range(len(jobs)):
+                    relative_path, output_path = get_next_filename(file_prefix, subfolder, reserved=[path for _, path, _ in outputs])
+                    metadata_entry = build_metadata_entry(
+                        str(output_path),
+                        job['prompt'],
+                        job['width'],
+                        job['height'],
+                        job['steps'],
+                        seed,
+                        file_prefix,
+                        subfolder,
+                        job.get('cfg', 1.0),
+                        job.get('shift', 3.0),
+                        job.get('use_image', False),
+                        job.get('use_image_size', False),
+                        job.get('image_filename'),
+                        job.get('mcnl_lora', False),
+                        job.get('snofs_lora', False),
+                        job.get('male_lora', False),
+                        job.get('workflow')
+                    )
+                    if len(jobs) > 1:
+                        # The image is item batch_index of a batch generated from seed
+                        metadata_entry['batch_index'] = batch_index
+                        metadata_entry['batch_size'] = len(jobs)
+                    outputs.append((relative_path, output_path, metadata_entry))
+                
                 comfyui_client.generate_image(
                     positive_prompt=job['prompt'],
                     width=job['width'],
@@ -219,53 +668,108 @@ def process_queue():
                     mcnl_lora=job.get('mcnl_lora', False),
                     snofs_lora=job.get('snofs_lora', False),
                     male_lora=job.get('male_lora', False),
-                    output_path=str(output_path),
-                    wait=True
-                )
-                
-                # Add metadata with actual seed used - process sequentially before next job
-                metadata_entry = add_metadata_entry(
-                    str(output_path),
-                    job['prompt'],
-                    job['width'],
-                    job['height'],
-                    job['steps'],
-                    seed,
-                    file_prefix,
-                    subfolder,
-                    job.get('cfg', 1.0),
-                    job.get('shift', 3.0),
-                    job.get('use_image', False),
-                    job.get('use_image_size', False),
-                    job.get('image_filename'),
-                    job.get('mcnl_lora', False),
-                    job.get('snofs_lora', False),
-                    job.get('male_lora', False)
+                    batch_size=len(jobs),
+                    workflow=job.get('workflow'),
+                    output_path=[str(output_path) for _, output_path, _ in outputs],
+                    png_metadata=[portable_metadata(entry) for _, _, entry in outputs],
+                    wait=True,
+                    cancel_event=generation_cancel,
+                    on_queued=record_prompt
                 )
                 
-                job['status'] = 'completed'
-                job['output_path'] = str(output_path)
-                job['relative_path'] = str(relative_path)
-                job['metadata_id'] = metadata_entry['id']
-                job['completed_at'] = datetime.now().isoformat()
-                job['refresh_folder'] = True
+                completed_at = datetime.now().isoformat()
+                for batch_job, (relative_path, output_path, metadata_entry) in zip(jobs, outputs):
+                    # Add metadata with actual seed used - process sequentially before next job
+                    add_metadata_entry(metadata_entry)
+                    
+                    batch_job['status'] = 'completed'
+                    batch_job['output_path'] = str(output_path)
+                    batch_job['relative_path'] = str(relative_path)
+                    batch_job['metadata_id'] = metadata_entry['id']
+                    batch_job['completed_at'] = completed_at
+                    batch_job['refresh_folder'] = True
+                    if len(jobs) > 1:
+                        batch_job['batch_index'] = metadata_entry['batch_index']
+                        batch_job['batch_size'] = len(jobs)
                 
+            except GenerationCancelled as e:
+                # Jobs batched with a cancelled one go back to the queue; an interrupt
+                # from ComfyUI itself (no job asked for) cancels the whole batch
+                with queue_lock:
+                    cancelled = [batch_job for batch_job in jobs if batch_job['id'] in cancelled_job_ids] or jobs
+                cancelled_ids = {batch_job['id'] for batch_job in cancelled}
+                cancelled_at = datetime.now().isoformat()
+                for batch_job in jobs:
+                    if batch_job['id'] in cancelled_ids:
+                        batch_job['status'] = 'cancelled'
+                        batch_job['cancelled_at'] = cancelled_at
+                    else:
+                        batch_job['status'] = 'queued'
+                print(f"{e}; cancelled {len(cancelled)} job(s), requeued {len(jobs) - len(cancelled)}")
+                jobs = cancelled
             except Exception as e:
-                job['status'] = 'failed'
-                job['error'] = str(e)
-                job['failed_at'] = datetime.now().isoformat()
+                # Losing ComfyUI (restart, network) is not the jobs' fault: they go back to the
+                # queue, and the breaker holds dispatch until ComfyUI answers again
+                if isinstance(e, TransportError) and transport_requeues.get(job['id'], 0) < COMFYUI_REQUEUE_LIMIT:
+                    print(f"Lost connection to ComfyUI ({e}); requeueing {len(jobs)} job(s)")
+                    for batch_job in jobs:
+                        transport_requeues[batch_job['id']] = transport_requeues.get(batch_job['id'], 0) + 1
+                        batch_job['status'] = 'queued'
+                        batch_job['transport_error'] = str(e)
+                    # Still queued (sweeps keep their cursor), so they are simply dispatched again
+                    with queue_lock:
+                        active_generation = None
+                        active_batch = []
+                    save_queue_state()
+                    continue
+                for batch_job in jobs:
+                    batch_job['status'] = 'failed'
+                    batch_job['error'] = str(e)
+                    batch_job['failed_at'] = datetime.now().isoformat()
+            
+            handoffs = []
+            for batch_job in jobs:
+                if batch_job['status'] == 'completed':
+                    # Hashing/thumbnails run in worker processes; don't wait for them
+                    post_processor.submit(batch_job)
+                handoffs.append(pipeline_handoff(batch_job))
             
             # Always process completion inside a critical section to ensure sequential batch processing
             with queue_lock:
-                if generation_queue and generation_queue[-1]['id'] == job['id']:
-                    generation_queue.pop()  # Remove from end
-                
-                # Add to completed jobs history
-                completed_jobs.insert(0, job)
-                if len(completed_jobs) > MAX_COMPLETED_HISTORY:
+                for batch_job, attach_input in zip(jobs, handoffs):
+                    transport_requeues.pop(batch_job['id'], None)
+                    job_prompts.pop(batch_job['id'], None)
+                    if batch_job['status'] == 'cancelled':
+                        # Its pipeline dependents are dropped with it (as when cancelling a queued job)
+                        release_job_inputs(waiting_jobs.cancel(batch_job['id']))
+                    finished_sweep = None
+                    if batch_job['id'] in generation_queue:
+                        release_job_inputs([generation_queue.remove(batch_job['id'])])
+                    elif batch_job.get('sweep_id') and batch_job['sweep_id'] in generation_queue:
+                        # A cancelled sweep is already gone from the queue; nothing to advance then
+                        sweep = generation_queue.get(batch_job['sweep_id'])
+                        if sweeps.record_result(sweep, batch_job):
+                            release_job_inputs([generation_queue.remove(sweep['id'])])
+                            sweep['status'] = 'completed' if sweep['failed'] < sweep['total'] else 'failed'
+                            sweep['completed_at'] = datetime.now().isoformat()
+                            finished_sweep = sweep
+                    
+                    # Pipeline jobs waiting for this one can run now, or never if it failed
+                    ready, failed_dependents = waiting_jobs.finish(batch_job, attach_input)
+                    generation_queue.extend(ready)
+                    release_job_inputs(failed_dependents)
+                    
+                    # Add to completed jobs history
+                    completed_jobs.insert(0, batch_job)
+                    if finished_sweep:
+                        completed_jobs.insert(0, finished_sweep)
+                    for failed in failed_dependents:
+                        completed_jobs.insert(0, failed)
+                while len(completed_jobs) > MAX_COMPLETED_HISTORY:
                     completed_jobs.pop()
                 
                 active_generation = None
+                active_batch = []
                 # Don't reset timer here - let it continue if queue is empty
             
             # Save queue state after job completes
@@ -276,6 +780,7 @@ def process_queue():
                 is_queue_empty = len(generation_queue) == 0 and active_generation is None
             
             if is_queue_empty:
+                ai_assistant.residency.set_image_queue_active(False)
                 current_time = time.time()
                 
                 if last_queue_empty_time is None and not timer_stopped:
@@ -298,23 +803,67 @@ def process_queue():
             time.sleep(0.5)
 
 
-# Load persisted queue state before starting queue processor
-print("Loading queue state...")
-loaded_queue, loaded_completed, loaded_active = load_queue_state()
-generation_queue = loaded_queue
-completed_jobs = loaded_completed
-# Don't restore active generation on startup - it should start fresh
-print(f"Loaded {len(generation_queue)} queued jobs and {len(completed_jobs)} completed jobs")
+def restore_queue():
+    """Startup step: load the persisted queue state, then start the queue processor"""
+    global completed_jobs
+    print("Loading queue state...")
+    loaded_queue, loaded_waiting, loaded_completed, loaded_active = load_queue_state()
+    with queue_lock:
+        generation_queue.extend(reversed(loaded_queue))  # Saved newest first
+        released, orphaned = waiting_jobs.restore(loaded_waiting, generation_queue.__contains__)
+        generation_queue.extend(released)
+        completed_jobs = orphaned + loaded_completed
+    for job in loaded_queue:
+        if job.get('status') == 'generating':
+            job['status'] = 'queued'  # Saved while generating; it runs again
+    input_store.reset_refs(job.get('image_filename') for job in loaded_queue + loaded_waiting)
+    # Don't restore active generation on startup - it should start fresh
+    print(f"Loaded {len(generation_queue)} queued jobs, {len(waiting_jobs)} waiting pipeline jobs and {len(completed_jobs)} completed jobs")
+
+    # Start queue processor thread
+    queue_thread = threading.Thread(target=process_queue, daemon=True)
+    queue_thread.start()
+
+
+def build_search_index():
+    """Startup step: build the search index from metadata.json
+
+    Without metadata.json, rebuild it from the parameters embedded in the
+    output PNGs (which also builds the search index).
+    """
+    if not METADATA_FILE.exists():
+        reindex_metadata()
+    else:
+        search_index.rebuild()
+
+
+# Worker processes (forkserver, or spawn on Windows) re-import this module; only the server runs the queue.
+# Importing stays cheap: loading state runs in the background and requests that need it wait for it.
+if multiprocessing.parent_process() is None:
+    startup.run('queue', restore_queue)
+    startup.run('metadata', load_metadata)  # Parsed once here instead of by the first browse
+    startup.run('search_index', build_search_index, after=('metadata',))
+    startup.run('modules', warm_imports(PRELOAD_MODULES))
 
-# Start queue processor thread
-queue_thread = threading.Thread(target=process_queue, daemon=True)
-queue_thread.start()
+    # Fetch AI model lists in the background so /api/ai/models never waits on a provider
+    ai_assistant.catalogue.start()
+
+
+@app.before_request
+def wait_for_queue_state():
+    """Hold queue requests until the saved queue is loaded (503 if that takes too long)"""
+    if request.path.startswith('/api/queue') and not startup.wait('queue', STARTUP_WAIT_SECONDS):
+        return jsonify({'success': False, 'error': 'Server is starting, the queue is not loaded yet', 'startup': startup.status()}), 503
 
 
 @app.route('/')
 def index():
     """Main page"""
-    return render_template('index.html')
+    response = make_response(render_template('index.html'))
+    if SUBMITTER_COOKIE not in request.cookies:
+        # Jobs queued from this browser share the queue fairly with other browsers
+        response.set_cookie(SUBMITTER_COOKIE, uuid.uuid4().hex, max_age=365 * 24 * 3600, samesite='Lax')
+    return response
 
 
 @app.route('/api/queue', methods=['POST'])
@@ -323,29 +872,15 @@ def add_to_queue():
     """Add a new generation job to the queue"""
     data = request.json
     
-    job = {
-        'id': str(uuid.uuid4()),
-        'prompt': data.get('prompt', ''),
-        'width': int(data.get('width', 1024)),
-        'height': int(data.get('height', 1024)),
-        'steps': int(data.get('steps', 4)),
-        'cfg': float(data.get('cfg', 1.0)),
-        'shift': float(data.get('shift', 3.0)),
-        'seed': data.get('seed'),
-        'use_image': data.get('use_image', False),
-        'use_image_size': data.get('use_image_size', False),
-        'image_filename': data.get('image_filename'),
-        'file_prefix': data.get('file_prefix', 'comfyui'),
-        'subfolder': data.get('subfolder', ''),
-        'mcnl_lora': data.get('mcnl_lora', False),
-        'snofs_lora': data.get('snofs_lora', False),
-        'male_lora': data.get('male_lora', False),
-        'status': 'queued',
-        'added_at': datetime.now().isoformat()
-    }
+    try:
+        options = queue_options(data, 'interactive')
+        params = job_parameters(data)
+    except ValueError as e:
+        return jsonify({'success': False, 'error': str(e)}), 400
+    job = new_job(params, **options)
     
     with queue_lock:
-        generation_queue.insert(0, job)  # Add to front of queue
+        generation_queue.add(job)
         timer_stopped = False  # Allow timer to start when this job completes
     
     save_queue_state()
@@ -362,33 +897,18 @@ def add_batch_to_queue():
     if not jobs_data:
         return jsonify({'success': False, 'error': 'No jobs provided'}), 400
     
-    queued_ids = []
+    try:
+        options = queue_options(data, 'normal')
+        params = [job_parameters(job_data, default_prefix='batch') for job_data in jobs_data]
+    except ValueError as e:
+        return jsonify({'success': False, 'error': str(e)}), 400
+    
+    added_at = datetime.now().isoformat()
+    jobs = [new_job(job_params, added_at, **options) for job_params in params]
+    queued_ids = [job['id'] for job in jobs]
     
     with queue_lock:
-        for job_data in jobs_data:
-            job = {
-                'id': str(uuid.uuid4()),
-                'prompt': job_data.get('prompt', ''),
-                'width': int(job_data.get('width', 1024)),
-                'height': int(job_data.get('height', 1024)),
-                'steps': int(job_data.get('steps', 4)),
-                'cfg': float(job_data.get('cfg', 1.0)),
-                'shift': float(job_data.get('shift', 3.0)),
-                'seed': job_data.get('seed'),
-                'use_image': job_data.get('use_image', False),
-                'use_image_size': job_data.get('use_image_size', False),
-                'image_filename': job_data.get('image_filename'),
-                'file_prefix': job_data.get('file_prefix', 'batch'),
-                'subfolder': job_data.get('subfolder', ''),
-                'mcnl_lora': job_data.get('mcnl_lora', False),
-                'snofs_lora': job_data.get('snofs_lora', False),
-                'male_lora': job_data.get('male_lora', False),
-                'status': 'queued',
-                'added_at': datetime.now().isoformat()
-            }
-            generation_queue.insert(0, job)  # Add to front of queue
-            queued_ids.append(job['id'])
-        
+        generation_queue.extend(jobs)
         timer_stopped = False  # Allow timer to start when jobs complete
     
     save_queue_state()
@@ -399,6 +919,171 @@ def add_batch_to_queue():
     })
 
 
+@app.route('/api/queue/sweep', methods=['POST'])
+def add_sweep_to_queue():
+    """Queue a parameter sweep that expands into one job per combination as it runs.
+
+    Body: the usual job parameters plus 'axes', mapping a job parameter or a [placeholder]
+    of the prompt to a list of values or a range {start, stop | count, step}, e.g.
+    {"prompt": "a [animal]", "axes": {"animal": ["cat", "dog"], "cfg": {"start": 1, "stop": 2, "step": 0.5}}}
+    """
+    global timer_stopped
+    data = request.json or {}
+
+    try:
+        options = queue_options(data, 'bulk')
+        sweep = new_job(sweeps.build_sweep(job_parameters(data, default_prefix='sweep'), data.get('axes')), **options)
+    except (ValueError, TypeError) as e:
+        return jsonify({'success': False, 'error': str(e)}), 400
+
+    with queue_lock:
+        generation_queue.add(sweep)
+        timer_stopped = False
+
+    save_queue_state()
+    print(f"Queued sweep {sweep['id']} with {sweep['total']} combinations")
+    return jsonify({'success': True, 'job_id': sweep['id'], 'total': sweep['total']})
+
+
+@app.route('/api/queue/pipeline', methods=['POST'])
+def add_pipeline_to_queue():
+    """Queue jobs that depend on each other, e.g. text-to-image followed by an image-to-image refine.
+
+    Body: {'steps': [...], 'priority', 'submitter'}. Each step holds the usual job parameters
+    plus an optional 'name', 'image_from' (a step whose output becomes its input image) and
+    'after' (steps that must finish first), e.g.
+    {"steps": [{"name": "base", "prompt": "a castle"},
+               {"name": "refine", "image_from": "base", "prompt": "a castle, detailed", "steps": 8}]}
+    A step is queued as soon as the steps it depends on complete; if one fails, its dependents fail too.
+    """
+    global timer_stopped
+    data = request.json or {}
+    jobs = {}
+
+    try:
+        options = queue_options(data, 'interactive')
+        steps = plan_pipeline(data.get('steps'))
+        pipeline_id = str(uuid.uuid4())
+        added_at = datetime.now().isoformat()
+        for step in steps:
+            job = new_job(job_parameters(step, default_prefix='pipeline'), added_at, **options)
+            job['pipeline_id'] = pipeline_id
+            job['pipeline_step'] = step['name']
+            if step['parents']:
+                job['depends_on'] = [jobs[parent]['id'] for parent in step['parents']]
+            if step.get('image_from') is not None:
+                job['image_from'] = jobs[str(step['image_from'])]['id']
+                job['use_image'] = True
+                workflow_registry.check(job['workflow'], {'use_image': True, 'image_filename': job['image_from']})
+            jobs[step['name']] = job
+    except (ValueError, TypeError) as e:
+        release_job_inputs(jobs.values())
+        return jsonify({'success': False, 'error': str(e)}), 400
+
+    with queue_lock:
+        # Steps are in dependency order, so parents are queued or waiting before their dependents
+        for job in jobs.values():
+            if job.get('depends_on'):
+                waiting_jobs.add(job, job['depends_on'])
+            else:
+                generation_queue.add(job)
+        timer_stopped = False
+
+    save_queue_state()
+    print(f"Queued pipeline {pipeline_id} with {len(jobs)} jobs")
+    return jsonify({
+        'success': True,
+        'pipeline_id': pipeline_id,
+        'job_ids': {name: job['id'] for name, job in jobs.items()}
+    })
+
+
+@app.route('/api/queue/ingest', methods=['POST'])
+def ingest_batch_to_queue():
+    """Stream a CSV or JSONL file into the queue, expanding a [param] prompt template per row.
+
+    The file is sent either as the multipart field 'file' (options as form fields) or as
+    the raw request body (options in the query string). Options: template, format
+    ('csv' or 'jsonl'), defaults (JSON object of job parameters), variable (comma-separated
+    job fields taken from the rows, default: every known column) and ingest_id (to poll
+    progress at /api/queue/ingest/<ingest_id> while the upload is processed).
+    """
+    is_multipart = request.mimetype == 'multipart/form-data'
+    options = request.form if is_multipart else request.args
+    template = (options.get('template') or '').strip()
+    if not template:
+        return jsonify({'success': False, 'error': 'Prompt template required'}), 400
+
+    if is_multipart:
+        upload = request.files.get('file')
+        if upload is None:
+            return jsonify({'success': False, 'error': 'No file provided'}), 400
+        stream, filename = upload.stream, upload.filename or ''
+    else:
+        stream, filename = request.stream, ''
+
+    data_format = (options.get('format') or '').lower()
+    if not data_format:
+        is_jsonl = filename.lower().endswith(('.jsonl', '.ndjson')) or request.mimetype == 'application/x-ndjson'
+        data_format = 'jsonl' if is_jsonl else 'csv'
+    if data_format not in ('csv', 'jsonl'):
+        return jsonify({'success': False, 'error': f'Unsupported format: {data_format}'}), 400
+
+    try:
+        scheduling = queue_options(options, 'bulk')
+    except ValueError as e:
+        return jsonify({'success': False, 'error': str(e)}), 400
+
+    variable = options.get('variable')
+    if variable is not None:
+        variable = [field.strip() for field in variable.split(',') if field.strip()]
+
+    progress = ingest_registry.create(options.get('ingest_id') or str(uuid.uuid4()))
+
+    def enqueue(chunk):
+        global timer_stopped
+        # Build the jobs outside the lock and queue them at once
+        added_at = datetime.now().isoformat()
+        jobs = [new_job(params, added_at, **scheduling) for params in chunk]
+        with queue_lock:
+            generation_queue.extend(jobs)
+            timer_stopped = False
+
+    try:
+        defaults = job_parameters(json.loads(options.get('defaults') or '{}'), default_prefix='batch')
+        if data_format == 'csv':
+            records = iter_csv_records(stream, required=extract_parameters(template))
+        else:
+            records = iter_jsonl_records(stream)
+        ingest(records, template, defaults, enqueue, progress, variable=variable, chunk_size=INGEST_CHUNK_SIZE)
+    except (ValueError, TypeError, AttributeError) as e:
+        progress.finish('failed', str(e))
+        status_code = 400
+    except Exception as e:
+        progress.finish('failed', str(e))
+        status_code = 500
+    else:
+        progress.finish('completed')
+        status_code = 200
+
+    if progress.queued:
+        save_queue_state()
+    result = progress.to_dict()
+    print(f"Ingested batch {progress.id}: {result['queued_count']} queued, {result['error_count']} rejected rows")
+    if status_code != 200:
+        return jsonify({'success': False, 'error': result['message'], **result}), status_code
+    return jsonify({'success': True, **result})
+
+
+@app.route('/api/queue/ingest/<ingest_id>', methods=['GET'])
+def get_ingest_progress(ingest_id):
+    """Get progress and row errors of a running or recent ingestion"""
+    progress = ingest_registry.get(ingest_id)
+    if progress is None:
+        return jsonify({'success': False, 'error': 'Ingestion not found'}), 404
+    return jsonify({'success': True, **progress.to_dict()})
+
+
 @app.route('/api/queue/image-batch', methods=['POST'])
 def add_image_batch_to_queue():
     """Queue all images from a selected input folder using same prompt/settings.
@@ -419,10 +1104,18 @@ def add_image_batch_to_queue():
 
     if not prompt:
         return jsonify({'success': False, 'error': 'Prompt required'}), 400
+    try:
+        options = queue_options(data, 'normal')
+        workflow = workflow_registry.check(data.get('workflow'), {
+            'use_image': True, 'use_image_size': True, 'image_filename': folder or '.',
+            'mcnl_lora': mcnl_lora, 'snofs_lora': snofs_lora, 'male_lora': male_lora
+        })
+    except ValueError as e:
+        return jsonify({'success': False, 'error': str(e)}), 400
 
     try:
         # Resolve ComfyUI input directory
-        comfyui_input_dir = Path('..') / 'comfy.git' / 'app' / 'input'
+        comfyui_input_dir = COMFYUI_INPUT_DIR
         if not comfyui_input_dir.exists():
             return jsonify({'success': False, 'error': 'ComfyUI input directory not found'}), 500
 
@@ -438,44 +1131,53 @@ def add_image_batch_to_queue():
         if not image_files:
             return jsonify({'success': False, 'error': 'No images found in selected folder'}), 400
 
+        # Read real dimensions from the image headers and drop files ComfyUI couldn't load
+        probed = probe_images(image_files, max_workers=IMAGE_PROBE_WORKERS)
+        rejected = [{'filename': file.name, 'error': error} for file, _, error in probed if error]
+        probed = [(file, info) for file, info, error in probed if not error]
+        for item in rejected:
+            print(f"Skipping unreadable input image {item['filename']}: {item['error']}")
+        if not probed:
+            return jsonify({'success': False, 'error': 'No readable images in selected folder', 'rejected': rejected}), 400
+
         queued_ids = []
         # If subfolder not provided, mirror input folder path under outputs
         if not subfolder:
             # Use the folder path relative to input root; normalize to posix style
             subfolder = folder.replace('\\', '/').strip('/')
 
-        with queue_lock:
-            for file in image_files:
-                # Build relative path from input root for image_filename
-                rel_path = str(file.relative_to(comfyui_input_dir))
-                job = {
-                    'id': str(uuid.uuid4()),
-                    'prompt': prompt,
-                    # Width/height will be ignored when use_image_size=True
-                    'width': 1024,
-                    'height': 1024,
-                    'steps': steps,
-                    'cfg': cfg,
-                    'shift': shift,
-                    'seed': seed,
-                    'use_image': True,
-                    'use_image_size': True,
-                    'image_filename': rel_path,
-                    'file_prefix': file_prefix,
-                    'subfolder': subfolder,
-                    'mcnl_lora': mcnl_lora,
-                    'snofs_lora': snofs_lora,
-                    'male_lora': male_lora,
-                    'status': 'queued',
-                    'added_at': datetime.now().isoformat()
-                }
-                generation_queue.insert(0, job)
-                queued_ids.append(job['id'])
+        added_at = datetime.now().isoformat()
+        jobs = []
+        for file, info in probed:
+            # Build relative path from input root for image_filename
+            rel_path = str(file.relative_to(comfyui_input_dir))
+            jobs.append(new_job({
+                'prompt': prompt,
+                # ComfyUI uses the image size (use_image_size=True); record it for ETAs and metadata
+                'width': info['width'],
+                'height': info['height'],
+                'steps': steps,
+                'cfg': cfg,
+                'shift': shift,
+                'seed': seed,
+                'use_image': True,
+                'use_image_size': True,
+                'image_filename': rel_path,
+                'file_prefix': file_prefix,
+                'subfolder': subfolder,
+                'mcnl_lora': mcnl_lora,
+                'snofs_lora': snofs_lora,
+                'male_lora': male_lora,
+                'workflow': workflow
+            }, added_at, **options))
 
+        with queue_lock:
+            generation_queue.extend(jobs)
+            queued_ids.extend(job['id'] for job in jobs)
             timer_stopped = False
 
         save_queue_state()
-        return jsonify({'success': True, 'queued_count': len(queued_ids), 'job_ids': queued_ids})
+        return jsonify({'success': True, 'queued_count': len(queued_ids), 'job_ids': queued_ids, 'rejected': rejected})
     except Exception as e:
         return jsonify({'success': False, 'error': str(e)}), 500
 
@@ -484,7 +1186,7 @@ def add_image_batch_to_queue():
 def reveal_browser():
     """List input folders that have corresponding output folders with images, and show images within a selected folder."""
     try:
-        comfyui_input_dir = Path('..') / 'comfy.git' / 'app' / 'input'
+        comfyui_input_dir = COMFYUI_INPUT_DIR
         if not comfyui_input_dir.exists():
             return jsonify({'success': False, 'error': 'ComfyUI input directory not found'}), 500
 
@@ -597,7 +1299,9 @@ def reveal_browser():
 def get_queue():
     """Get current queue status"""
     with queue_lock:
-        queue_copy = [job.copy() for job in generation_queue]
+        # Newest first: the last item runs next, pipeline jobs still waiting on others come before all
+        queue_copy = [job.copy() for job in reversed(waiting_jobs.jobs())]
+        queue_copy += [job.copy() for job in reversed(generation_queue.jobs())]
         active = active_generation.copy() if active_generation else None
         completed_copy = [job.copy() for job in completed_jobs]
     
@@ -610,24 +1314,46 @@ def get_queue():
 
 @app.route('/api/queue/<job_id>', methods=['DELETE'])
 def cancel_job(job_id):
-    """Cancel a queued job or remove a completed job"""
+    """
+    Cancel a job (with the pipeline jobs depending on it) or remove a completed job
+
+    A generating job (or the sweep it belongs to) is stopped in ComfyUI: the
+    queue processor interrupts or deletes its prompt and records it as cancelled.
+    """
     removed = False
     removed_type = None
+    dependents = []
+    stale_prompt = None
     
     with queue_lock:
-        # Check if it's the active job (don't allow removal)
-        if active_generation and active_generation.get('id') == job_id:
-            return jsonify({'success': False, 'error': 'Cannot remove active job'}), 400
+        # The active job, a job batched with it, or the sweep it comes from
+        interrupted = [batch_job['id'] for batch_job in active_batch if job_id in (batch_job['id'], batch_job.get('sweep_id'))]
+        if interrupted:
+            cancelled_job_ids.update(interrupted)
+            generation_cancel.set()
+            removed = True
+            removed_type = 'generating'
+            print(f"Cancelling generating job: {job_id}")
         
         # Try to remove from queued jobs
-        for i in range(len(generation_queue)):
-            if generation_queue[i]['id'] == job_id:
-                if generation_queue[i].get('status') == 'queued':
-                    generation_queue.pop(i)
-                    removed = True
-                    removed_type = 'queued'
-                    print(f"Removed queued job: {job_id}")
-                    break
+        queued = generation_queue.get(job_id)
+        if queued is not None and queued.get('status') == 'queued':
+            release_job_inputs([generation_queue.remove(job_id)])
+            # A job requeued after losing ComfyUI may still have a prompt there
+            stale_prompt = job_prompts.pop(job_id, None)
+            removed = True
+            removed_type = removed_type or 'queued'
+            print(f"Removed queued job: {job_id}")
+        elif job_id in waiting_jobs:
+            removed = True
+            removed_type = 'waiting'
+            print(f"Removed waiting job: {job_id}")
+        
+        if removed:
+            # Pipeline jobs that depend on it can never run
+            cancelled = waiting_jobs.cancel(job_id)
+            release_job_inputs(cancelled)
+            dependents = [job['id'] for job in cancelled if job['id'] != job_id]
         
         # If not found in queue, try completed jobs
         if not removed:
@@ -640,8 +1366,13 @@ def cancel_job(job_id):
                     break
     
     if removed:
+        if stale_prompt:
+            comfyui_client.cancel_prompt(stale_prompt)
         save_queue_state()
-        return jsonify({'success': True, 'message': f'{removed_type} job removed'})
+        if dependents:
+            print(f"Cancelled {len(dependents)} dependent pipeline jobs of {job_id}")
+        message = 'Generating job cancelled' if removed_type == 'generating' else f'{removed_type} job removed'
+        return jsonify({'success': True, 'message': message, 'status': removed_type, 'cancelled_dependents': dependents})
     
     return jsonify({'success': False, 'error': 'Job not found'}), 404
 
@@ -652,10 +1383,16 @@ def clear_queue():
     cleared_queued = 0
     
     with queue_lock:
-        cleared_queued = len(generation_queue)
-        generation_queue.clear()
-        # Keep completed_jobs intact to preserve history
+        # The generating job stays until it finishes; completed_jobs keeps the history
+        removed = generation_queue.clear(keep=[batch_job['id'] for batch_job in active_batch])
+        removed += waiting_jobs.clear()
+        release_job_inputs(removed)
+        cleared_queued = len(removed)
+        stale_prompts = [job_prompts.pop(job['id']) for job in removed if job['id'] in job_prompts]
     
+    # Prompts left in ComfyUI by jobs that were requeued after losing the connection
+    for prompt_id in stale_prompts:
+        comfyui_client.cancel_prompt(prompt_id)
     save_queue_state()
     print(f"Cleared {cleared_queued} queued jobs (preserved completed history)")
     return jsonify({
@@ -664,6 +1401,54 @@ def clear_queue():
     })
 
 
+@app.route('/api/queue/stats')
+def get_queue_stats():
+    """Get queue length, oldest wait and recent wait times (seconds) per priority class"""
+    with queue_lock:
+        stats = generation_queue.stats()
+    return jsonify({'success': True, **stats})
+
+
+@app.route('/api/queue/priority', methods=['POST'])
+def set_queue_priority():
+    """Move queued jobs to another priority class
+
+    Body: {'job_ids': [...] or 'job_id': ..., 'priority': 'interactive'|'normal'|'bulk'}
+    """
+    data = request.json or {}
+    job_ids = data.get('job_ids') or ([data['job_id']] if data.get('job_id') else [])
+    if not job_ids:
+        return jsonify({'success': False, 'error': 'No jobs specified'}), 400
+
+    updated = []
+    not_found = []
+    try:
+        priority = generation_queue.check_priority(data.get('priority'))
+        with queue_lock:
+            for job_id in job_ids:
+                job = generation_queue.get(job_id)
+                if job is not None and job.get('status') == 'queued':
+                    generation_queue.set_priority(job_id, priority)
+                elif job_id in waiting_jobs:
+                    waiting_jobs.get(job_id)['priority'] = priority  # Applies once it is queued
+                else:
+                    not_found.append(job_id)
+                    continue
+                updated.append(job_id)
+    except ValueError as e:
+        return jsonify({'success': False, 'error': str(e)}), 400
+
+    if updated:
+        save_queue_state()
+    return jsonify({'success': True, 'priority': priority, 'updated': updated, 'not_found': not_found})
+
+
+@app.route('/api/workflows', methods=['GET'])
+def list_workflows():
+    """List the workflows jobs can select with 'workflow', with their mapped parameters"""
+    return jsonify({'success': True, 'default': DEFAULT_WORKFLOW, 'workflows': workflow_registry.describe()})
+
+
 @app.route('/api/browse')
 def browse_folder():
     """Browse files and folders in a directory"""
@@ -676,7 +1461,7 @@ def browse_folder():
     # Get folders
     folders = []
     for item in current_dir.iterdir():
-        if item.is_dir():
+        if item.is_dir() and not item.name.startswith('.'):
             rel_path = str(item.relative_to(OUTPUT_DIR))
             folders.append({
                 'name': item.name,
@@ -705,6 +1490,112 @@ def browse_folder():
     })
 
 
+def browser_entry(entry):
+    """Add the fields the output browser expects to a metadata entry"""
+    entry['type'] = 'file'
+    try:
+        entry['relative_path'] = str(Path(entry['path']).relative_to(OUTPUT_DIR))
+    except (KeyError, ValueError):
+        entry['relative_path'] = entry.get('filename', '')
+    return entry
+
+
+@app.route('/api/search', methods=['GET'])
+def search_images():
+    """Full-text search over prompts, file prefixes and input image names.
+
+    Query args: q (terms, "phrases" and prefix* terms, all required), page (from 1), per_page.
+    """
+    query = (request.args.get('q') or '').strip()
+    if not query:
+        return jsonify({'success': False, 'error': 'Query required'}), 400
+    try:
+        page = max(1, int(request.args.get('page', 1)))
+        per_page = min(SEARCH_MAX_PER_PAGE, max(1, int(request.args.get('per_page', 50))))
+    except ValueError:
+        return jsonify({'success': False, 'error': 'page and per_page must be integers'}), 400
+
+    started = time.perf_counter()
+    found = search_index.search(query, offset=(page - 1) * per_page, limit=per_page)
+    for entry in found['results']:
+        browser_entry(entry)
+    return jsonify({
+        'success': True,
+        'query': query,
+        'total': found['total'],
+        'page': page,
+        'per_page': per_page,
+        'pages': (found['total'] + per_page - 1) // per_page,
+        'results': found['results'],
+        'took_ms': round((time.perf_counter() - started) * 1000, 2)
+    })
+
+
+def query_filters_from_args(args):
+    """Build /api/query filters from query-string arguments (field=v or v1,v2, field_min, field_max, since, folder)"""
+    filters = {}
+    for key, value in args.items():
+        if key in ('q', 'facets', 'sort', 'page', 'per_page') or value == '':
+            continue
+        if key == 'since':
+            filters.setdefault('timestamp', {})['since'] = value
+        elif key.endswith('_min') or key.endswith('_max'):
+            field, bound = key.rsplit('_', 1)
+            filters.setdefault(field, {})[bound] = value
+        elif key in ('folder', 'folder_recursive'):
+            filters[key] = value
+        else:
+            filters[key] = value.split(',') if ',' in value else value
+    return filters
+
+
+@app.route('/api/query', methods=['GET', 'POST'])
+def query_images():
+    """Filter images by generation parameters, with facet counts.
+
+    POST body: {filters: {field: value | [values] | {min, max} | {since}}, q, facets: [...], sort, page, per_page}.
+    GET uses query args instead (see query_filters_from_args). Fields: width, height, steps,
+    cfg, shift, seed, timestamp, use_image, mcnl_lora, snofs_lora, male_lora and folder.
+    """
+    if request.method == 'POST':
+        data = request.get_json(silent=True) or {}
+        filters = data.get('filters') or {}
+        facets = data.get('facets') or []
+    else:
+        data = request.args
+        filters = query_filters_from_args(request.args)
+        facets = [facet for facet in (request.args.get('facets') or '').split(',') if facet]
+    try:
+        page = max(1, int(data.get('page', 1)))
+        per_page = min(SEARCH_MAX_PER_PAGE, max(1, int(data.get('per_page', 50))))
+        if not isinstance(filters, dict) or not isinstance(facets, list):
+            raise ValueError('filters must be an object and facets a list')
+        started = time.perf_counter()
+        found = search_index.query(
+            filters,
+            text=data.get('q'),
+            facets=facets,
+            sort=data.get('sort') or None,
+            offset=(page - 1) * per_page,
+            limit=per_page
+        )
+    except ValueError as e:
+        return jsonify({'success': False, 'error': str(e)}), 400
+
+    for entry in found['results']:
+        browser_entry(entry)
+    return jsonify({
+        'success': True,
+        'total': found['total'],
+        'page': page,
+        'per_page': per_page,
+        'pages': (found['total'] + per_page - 1) // per_page,
+        'results': found['results'],
+        'facets': found['facets'],
+        'took_ms': round((time.perf_counter() - started) * 1000, 2)
+    })
+
+
 @app.route('/api/folder', methods=['POST'])
 def create_folder():
     """Create a new folder"""
@@ -750,32 +1641,161 @@ def upload_image():
     
     try:
         # Save to ComfyUI input directory (C:\pinokio\api\comfy.git\app\input)
-        comfyui_input_dir = Path('..') / 'comfy.git' / 'app' / 'input'
+        comfyui_input_dir = COMFYUI_INPUT_DIR
         
-        # Verify directory exists
-        if not comfyui_input_dir.exists():
+        # Verify directory exists (in upload mode it is only a local staging area)
+        if not comfyui_input_dir.exists() and not comfyui_client.uses_upload():
             return jsonify({
                 'success': False, 
                 'error': f'ComfyUI input directory not found at {comfyui_input_dir.absolute()}'
             }), 500
         
-        # Generate unique filename
-        timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
-        filename = f"upload_{timestamp}{file_ext}"
-        filepath = comfyui_input_dir / filename
-        
-        # Save file
-        file.save(str(filepath))
+        # Store by content hash; uploading the same image again reuses the stored file
+        stored = input_store.put_stream(file.stream, file_ext)
         
         return jsonify({
             'success': True,
-            'filename': filename,
-            'message': 'Image uploaded successfully'
+            'filename': stored['filename'],
+            'deduplicated': stored['deduplicated'],
+            'message': 'Image already uploaded' if stored['deduplicated'] else 'Image uploaded successfully'
         })
     except Exception as e:
         return jsonify({'success': False, 'error': str(e)}), 500
 
 
+@app.route('/api/inputs/store', methods=['GET'])
+def get_input_store_stats():
+    """Get size and reference counts of the deduplicated input store"""
+    return jsonify({'success': True, **input_store.stats()})
+
+
+@app.route('/api/inputs/gc', methods=['POST'])
+def collect_unused_inputs():
+    """Delete stored inputs that no queued job uses.
+
+    Body (optional): min_age_seconds (default INPUT_GC_MIN_AGE_SECONDS) and keep_history
+    (default true: keep inputs referenced by generated images' metadata).
+    """
+    data = request.get_json(silent=True) or {}
+    try:
+        min_age = float(data.get('min_age_seconds', INPUT_GC_MIN_AGE_SECONDS))
+        protected = set()
+        if data.get('keep_history', True):
+            protected = {entry.get('image_filename') for entry in load_metadata() if entry.get('image_filename')}
+        result = input_store.collect(min_age_seconds=min_age, protected=protected)
+        return jsonify({'success': True, **result})
+    except Exception as e:
+        return jsonify({'success': False, 'error': str(e)}), 500
+
+
+@app.route('/api/metadata/reindex', methods=['POST'])
+def reindex_metadata_route():
+    """Reconcile metadata.json with the output PNGs.
+
+    Body (optional): prune (default false: keep entries whose file is gone).
+    """
+    data = request.get_json(silent=True) or {}
+    if metadata_index_lock.locked():
+        return jsonify({'success': False, 'error': 'A reindex is already running'}), 409
+    try:
+        stats = reindex_metadata(prune=bool(data.get('prune', False)))
+        return jsonify({'success': True, **stats})
+    except Exception as e:
+        return jsonify({'success': False, 'error': str(e)}), 500
+
+
+def similarity_radius(args):
+    """Read and check the radius query argument"""
+    radius = int(args.get('radius', DEFAULT_RADIUS))
+    if not 0 <= radius <= SIMILAR_MAX_RADIUS:
+        raise ValueError(f'radius must be between 0 and {SIMILAR_MAX_RADIUS}')
+    return radius
+
+
+@app.route('/api/similar/<image_id>', methods=['GET'])
+def get_similar_images(image_id):
+    """Find near-duplicates of an image by perceptual hash.
+
+    Query args: radius (differing hash bits, default 6), limit (default 50).
+    """
+    try:
+        radius = similarity_radius(request.args)
+        limit = max(1, int(request.args.get('limit', 50)))
+    except ValueError as e:
+        return jsonify({'success': False, 'error': str(e)}), 400
+
+    matches = similarity_index.similar(image_id, radius)
+    if matches is None:
+        return jsonify({'success': False, 'error': 'Image not found or not hashed yet'}), 404
+    distances = dict((other, distance) for distance, other in matches[:limit])
+    results = [browser_entry(entry) for entry in search_index.get(distances)]
+    for entry in results:
+        entry['distance'] = distances[entry['id']]
+    return jsonify({'success': True, 'id': image_id, 'radius': radius, 'total': len(matches), 'results': results})
+
+
+@app.route('/api/duplicates', methods=['GET'])
+def get_folder_duplicates():
+    """Group near-duplicate images in an output folder, newest image of each group first.
+
+    Query args: path (folder relative to outputs/), radius (default 6).
+    """
+    subfolder = request.args.get('path', '')
+    try:
+        radius = similarity_radius(request.args)
+    except ValueError as e:
+        return jsonify({'success': False, 'error': str(e)}), 400
+
+    # Every file of the folder (the query builds the index first if needed)
+    found = search_index.query({'folder': subfolder, 'folder_recursive': False}, sort='-timestamp', limit=None)
+    entries = {entry['id']: entry for entry in found['results']}
+    groups = []
+    for group in similarity_index.collapse(list(entries), radius):
+        if group['duplicates']:
+            groups.append({
+                'representative': browser_entry(entries[group['id']]),
+                'duplicates': [dict(browser_entry(entries[other]), distance=distance) for distance, other in group['duplicates']]
+            })
+    return jsonify({
+        'success': True,
+        'current_path': subfolder,
+        'radius': radius,
+        'files': len(entries),
+        'duplicates': sum(len(group['duplicates']) for group in groups),
+        'groups': groups
+    })
+
+
+@app.route('/api/similar/rehash', methods=['POST'])
+def rehash_outputs_route():
+    """Compute perceptual hashes for images that have none"""
+    try:
+        import PIL  # noqa: F401
+    except ImportError:
+        return jsonify({'success': False, 'error': 'Pillow not installed'}), 500
+    if metadata_index_lock.locked():
+        return jsonify({'success': False, 'error': 'A reindex is already running'}), 409
+    try:
+        return jsonify({'success': True, **rehash_outputs()})
+    except Exception as e:
+        return jsonify({'success': False, 'error': str(e)}), 500
+
+
+@app.route('/api/postprocess', methods=['GET'])
+def get_postprocess_stats():
+    """Get post-processing pool size, backlog and outcome counts"""
+    return jsonify({'success': True, **post_processor.stats()})
+
+
+@app.route('/api/postprocess/<job_id>', methods=['GET'])
+def get_postprocess_status(job_id):
+    """Get the post-processing status and step results of a completed job"""
+    record = post_processor.get(job_id)
+    if record is None:
+        return jsonify({'success': False, 'error': 'No post-processing record for this job'}), 404
+    return jsonify({'success': True, **record})
+
+
 @app.route('/api/browse_images', methods=['GET'])
 def browse_images():
     """Browse images from input or output folders with subfolder support"""
@@ -785,7 +1805,7 @@ def browse_images():
     try:
         if folder == 'input':
             # List images and folders from ComfyUI input directory
-            comfyui_input_dir = Path('..') / 'comfy.git' / 'app' / 'input'
+            comfyui_input_dir = COMFYUI_INPUT_DIR
             
             if not comfyui_input_dir.exists():
                 return jsonify({'success': False, 'error': 'Input directory not found'}), 404
@@ -843,7 +1863,7 @@ def browse_images():
 def serve_input_image(filepath):
     """Serve images from ComfyUI input directory (supports subfolders)"""
     try:
-        comfyui_input_dir = Path('..') / 'comfy.git' / 'app' / 'input'
+        comfyui_input_dir = COMFYUI_INPUT_DIR
         # Resolve to absolute path
         absolute_dir = comfyui_input_dir.resolve()
         file_path = absolute_dir / filepath
@@ -893,33 +1913,18 @@ def copy_to_input():
             print(f"Source file not found: {source}")
             return jsonify({'success': False, 'error': f'Source file not found: {filename}'}), 404
         
-        # Destination: ComfyUI input directory (root level)
-        comfyui_input_dir = Path('..') / 'comfy.git' / 'app' / 'input'
-        
-        if not comfyui_input_dir.exists():
+        if not input_store.available() and not comfyui_client.uses_upload():
             return jsonify({'success': False, 'error': 'Input directory not found'}), 500
         
-        # Generate unique filename if file already exists (copy to root of input folder)
-        dest_filename = source.name
-        dest_path = comfyui_input_dir / dest_filename
-        
-        counter = 1
-        while dest_path.exists():
-            stem = source.stem
-            suffix = source.suffix
-            dest_filename = f"{stem}_{counter}{suffix}"
-            dest_path = comfyui_input_dir / dest_filename
-            counter += 1
-        
-        # Copy file
-        import shutil
-        shutil.copy2(source, dest_path)
+        # Hardlink/reflink into the input store (copy only as a fallback); repeats reuse the stored file
+        stored = input_store.put_file(source)
         
-        print(f"Copied {source} to {dest_path}")
+        print(f"Stored {source} as input {stored['filename']} ({stored['method']})")
         
         return jsonify({
             'success': True,
-            'filename': dest_filename,
+            'filename': stored['filename'],
+            'method': stored['method'],
             'message': 'Image copied to input folder'
         })
     except Exception as e:
@@ -941,38 +1946,28 @@ def move_items():
     if not target_dir.exists():
         return jsonify({'error': 'Target directory does not exist'}), 400
     
-    moved = []
+    # Plan every item first; files and metadata then change together
+    transaction = FileTransaction(OUTPUT_DIR, OUTPUT_TRASH_DIR, protected=[METADATA_FILE])
     errors = []
-    
     for item_path in items:
         try:
-            source = OUTPUT_DIR / item_path
-            if not source.exists():
-                errors.append(f"{item_path}: Not found")
-                continue
-            
-            # Determine target path with conflict resolution
-            target_path = target_dir / source.name
-            target_path = get_unique_filename(target_path)
-            
-            # Move the file/folder
-            import shutil
-            shutil.move(str(source), str(target_path))
-            
-            # Update metadata if it's a file
-            if source.is_file():
-                old_path = str(source)
-                new_path = str(target_path)
-                update_metadata_path(old_path, new_path)
-            
-            moved.append({
-                'from': item_path,
-                'to': str(target_path.relative_to(OUTPUT_DIR))
-            })
-            
-        except Exception as e:
+            transaction.move(item_path, target_dir)
+        except FileOperationError as e:
             errors.append(f"{item_path}: {str(e)}")
     
+    try:
+        commit_file_transaction(transaction)
+    except Exception as e:
+        return jsonify({
+            'success': False,
+            'moved': [],
+            'errors': errors + [f"Nothing was moved: {str(e)}"]
+        }), 500
+    
+    moved = [{
+        'from': str(source.relative_to(OUTPUT_DIR)),
+        'to': str(destination.relative_to(OUTPUT_DIR))
+    } for source, destination in transaction.moves]
     return jsonify({
         'success': len(errors) == 0,
         'moved': moved,
@@ -982,34 +1977,27 @@ def move_items():
 
 @app.route('/api/delete', methods=['POST'])
 def delete_items():
-    """Delete files and empty folders"""
+    """Delete files and folders (folders only when empty, or emptied by the same request)"""
     data = request.json
     items = data.get('items', [])
     
+    transaction = FileTransaction(OUTPUT_DIR, OUTPUT_TRASH_DIR, protected=[METADATA_FILE])
     deleted = []
     errors = []
+    for item_path, error in transaction.delete(items):
+        if error:
+            errors.append(f"{item_path}: {error}")
+        else:
+            deleted.append(item_path)
     
-    for item_path in items:
-        try:
-            target = OUTPUT_DIR / item_path
-            if not target.exists():
-                errors.append(f"{item_path}: Not found")
-                continue
-            
-            if target.is_file():
-                target.unlink()
-                delete_metadata_entry(str(target))
-                deleted.append(item_path)
-            elif target.is_dir():
-                # Only delete if empty
-                if not any(target.iterdir()):
-                    target.rmdir()
-                    deleted.append(item_path)
-                else:
-                    errors.append(f"{item_path}: Folder not empty")
-            
-        except Exception as e:
-            errors.append(f"{item_path}: {str(e)}")
+    try:
+        commit_file_transaction(transaction)
+    except Exception as e:
+        return jsonify({
+            'success': False,
+            'deleted': [],
+            'errors': errors + [f"Nothing was deleted: {str(e)}"]
+        }), 500
     
     return jsonify({
         'success': len(errors) == 0,
@@ -1018,6 +2006,60 @@ def delete_items():
     })
 
 
+@app.route('/api/export', methods=['GET', 'POST'])
+def export_items():
+    """Download files and folders as a ZIP archive streamed from disk.
+
+    Takes the same item list as /api/move, as JSON ({items, manifest}), form
+    fields or query args (repeated items). manifest=true adds manifest.jsonl
+    with the metadata entries of the exported images.
+    """
+    if request.is_json:
+        data = request.get_json(silent=True) or {}
+        items = data.get('items', [])
+        with_manifest = bool(data.get('manifest', False))
+    else:
+        values = request.values
+        items = values.getlist('items')
+        with_manifest = values.get('manifest', 'false').lower() in ('1', 'true', 'yes', 'on')
+    if not items:
+        return jsonify({'success': False, 'error': 'No items selected'}), 400
+
+    paths = []
+    errors = []
+    for item_path in items:
+        try:
+            paths.append(resolve_item(OUTPUT_DIR, item_path))
+        except FileOperationError as e:
+            errors.append(f"{item_path}: {str(e)}")
+    if errors:
+        return jsonify({'success': False, 'error': 'Some items cannot be exported', 'errors': errors}), 400
+
+    files = collect_files(paths, exclude=[METADATA_FILE])
+    if not files:
+        return jsonify({'success': False, 'error': 'No files to export'}), 400
+
+    manifest = None
+    if with_manifest:
+        archive_names = {str(path): arcname for arcname, path in files}
+        manifest = [
+            dict(entry, archive_path=archive_names[entry['path']])
+            for entry in load_metadata() if entry.get('path') in archive_names
+        ]
+
+    name = paths[0].name if len(paths) == 1 and paths[0].is_dir() else f"export-{datetime.now().strftime('%Y%m%d-%H%M%S')}"
+    fallback = name.encode('ascii', 'ignore').decode().replace('"', '') or 'export'
+    return Response(
+        stream_with_context(stream_zip(files, manifest)),
+        mimetype='application/zip',
+        headers={
+            # Plain ASCII fallback plus the UTF-8 name for browsers that support it
+            'Content-Disposition': f'attachment; filename="{fallback}.zip"; filename*=UTF-8\'\'{quote(name)}.zip',
+            'X-Export-Files': str(len(files))
+        }
+    )
+
+
 @app.route('/api/images/<image_id>')
 def get_image_metadata(image_id):
     """Get metadata for a specific image"""
@@ -1039,14 +2081,47 @@ def serve_image(filepath):
 
 # AI Assistant Endpoints
 
+def sse_ai_stream(instruction: str, model: str, use_cache: bool = True):
+    """Wrap an Ollama completion stream (live or replayed from cache) as SSE events"""
+    for chunk in ai_assistant.stream_completion(instruction, model, use_cache=use_cache):
+        yield f"data: {json.dumps({'text': chunk})}\n\n"
+    yield 'data: {"done": true}\n\n'
+
+
+@app.route('/api/ai/metrics', methods=['GET'])
+def get_ai_metrics():
+    """Get per-provider request counts, concurrency and latency"""
+    return jsonify({'success': True, 'metrics': ai_assistant.transport.metrics()})
+
+
+@app.route('/api/ai/cache', methods=['GET'])
+def get_ai_cache_stats():
+    """Get AI response cache statistics"""
+    return jsonify({'success': True, 'cache': ai_assistant.cache.stats()})
+
+
+@app.route('/api/ai/cache/clear', methods=['POST'])
+def clear_ai_cache():
+    """Remove all cached AI responses"""
+    try:
+        ai_assistant.cache.clear()
+        return jsonify({'success': True, 'message': 'AI response cache cleared'})
+    except Exception as e:
+        return jsonify({'success': False, 'error': str(e)}), 500
+
+
 @app.route('/api/ai/models', methods=['GET'])
 def get_ai_models():
-    """Get available AI models from Ollama and Gemini"""
+    """Get available AI models from Ollama and Gemini (answered from the in-memory catalogue)"""
     try:
-        models = ai_assistant.get_available_models()
+        if request.args.get('refresh'):
+            ai_assistant.catalogue.invalidate()
+        catalogue = ai_assistant.catalogue.snapshot()
         return jsonify({
             'success': True,
-            'models': models
+            'models': catalogue['models'],
+            'details': catalogue['details'],
+            'status': catalogue['status']
         })
     except Exception as e:
         return jsonify({
@@ -1055,6 +2130,26 @@ def get_ai_models():
         }), 500
 
 
+@app.route('/api/ai/warm', methods=['POST'])
+def warm_ai_model():
+    """Pre-load the selected Ollama model so the first request is fast"""
+    data = request.json or {}
+    model = data.get('model')
+    provider = data.get('provider', 'ollama')
+    
+    if provider != 'ollama' or not model:
+        return jsonify({'success': True, 'warming': False})
+    
+    warming = ai_assistant.residency.prewarm(model)
+    return jsonify({'success': True, 'warming': warming})
+
+
+@app.route('/api/ai/residency', methods=['GET'])
+def get_ai_residency():
+    """Get which Ollama models are kept warm and for how long"""
+    return jsonify({'success': True, 'residency': ai_assistant.residency.status()})
+
+
 @app.route('/api/ai/stop', methods=['POST'])
 def stop_ai_generation():
     """Stop AI generation and unload Ollama model"""
@@ -1091,30 +2186,17 @@ def optimize_prompt():
     use_instructions = data.get('use_instructions', True)
     stream = data.get('stream', False)
     is_batch = data.get('is_batch', False)
+    use_cache = not data.get('bypass_cache', False)
     
     if not prompt:
         return jsonify({'success': False, 'error': 'Prompt required'}), 400
     
     # Only Ollama supports streaming
     if stream and provider == 'ollama':
-        from ai_instructions import OPTIMIZE_PROMPT_INSTRUCTION, OPTIMIZE_BATCH_PROMPT_INSTRUCTION
-        if use_instructions:
-            if is_batch:
-                instruction = OPTIMIZE_BATCH_PROMPT_INSTRUCTION.format(prompt=prompt)
-            else:
-                instruction = OPTIMIZE_PROMPT_INSTRUCTION.format(prompt=prompt)
-        else:
-            instruction = prompt
-        
-        def generate():
-            generator = ai_assistant._call_ollama(instruction, model, stream=True)
-            for chunk in generator:
-                yield f"data: {json.dumps({'text': chunk})}\n\n"
-            yield "data: {\"done\": true}\n\n"
-        
-        return Response(stream_with_context(generate()), mimetype='text/event-stream')
+        instruction = ai_assistant.build_optimize_instruction(prompt, use_instructions, is_batch)
+        return Response(stream_with_context(sse_ai_stream(instruction, model, use_cache)), mimetype='text/event-stream')
     else:
-        result = ai_assistant.optimize_prompt(prompt, model, provider, use_instructions=use_instructions, is_batch=is_batch)
+        result = ai_assistant.optimize_prompt(prompt, model, provider, use_instructions=use_instructions, is_batch=is_batch, use_cache=use_cache)
         return jsonify(result)
 
 
@@ -1127,28 +2209,18 @@ def suggest_prompt_edit():
     model = data.get('model', 'llama2')
     provider = data.get('provider', 'ollama')
     stream = data.get('stream', False)
+    use_cache = not data.get('bypass_cache', False)
     
     if not prompt or not suggestion:
         return jsonify({'success': False, 'error': 'Prompt and suggestion required'}), 400
     
     # Only Ollama supports streaming
     if stream and provider == 'ollama':
-        from ai_instructions import EDIT_PROMPT_INSTRUCTION
-        instruction = EDIT_PROMPT_INSTRUCTION.format(prompt=prompt, suggestion=suggestion)
-        
-        def generate():
-            generator = ai_assistant._call_ollama(instruction, model, stream=True)
-            for chunk in generator:
-                yield f"data: {json.dumps({'text': chunk})}\n\n"
-            yield "data: {\"done\": true}\n\n"
-        
-        return Response(stream_with_context(generate()), mimetype='text/event-stream')
+        instruction = ai_assistant.build_edit_instruction(prompt, suggestion)
+        return Response(stream_with_context(sse_ai_stream(instruction, model, use_cache)), mimetype='text/event-stream')
     else:
-        result = ai_assistant.suggest_prompt_edit(prompt, suggestion, model, provider)
+        result = ai_assistant.suggest_prompt_edit(prompt, suggestion, model, provider, use_cache=use_cache)
         return jsonify(result)
-    
-    result = ai_assistant.suggest_prompt_edit(prompt, suggestion, model, provider)
-    return jsonify(result)
 
 
 @app.route('/api/ai/optimize-instructions', methods=['GET'])
@@ -1172,65 +2244,58 @@ def generate_csv_with_ai():
     custom_context = (data.get('custom_context') or '').strip()
     use_instructions = data.get('use_instructions', True)
     stream = data.get('stream', False)
+    use_cache = not data.get('bypass_cache', False)
+    # Fan out into concurrent chunked calls by default once a single call would be slow
+    parallel = data.get('parallel', count > CSV_CHUNK_SIZE)
     
     if not parameters:
         return jsonify({'success': False, 'error': 'Parameters required'}), 400
     
-    if count < 1 or count > 50:
-        return jsonify({'success': False, 'error': 'Count must be between 1 and 50'}), 400
+    max_count = MAX_PARALLEL_CSV_ROWS if parallel else 50
+    if count < 1 or count > max_count:
+        return jsonify({'success': False, 'error': f'Count must be between 1 and {max_count}'}), 400
     
     variable_parameters = data.get('variable_parameters', [])
     
-    # Only Ollama supports streaming
-    if stream and provider == 'ollama':
-        from ai_instructions import GENERATE_PARAMETERS_INSTRUCTION
-        
-        # Build context
-        context_parts = []
-        if base_prompt:
-            context_parts.append(f"Base Prompt Template: {base_prompt}")
-        
-        if variable_parameters:
-            param_hints = []
-            if 'width' in variable_parameters or 'height' in variable_parameters:
-                param_hints.append("- width/height: Use values like 512, 768, 1024, 1536, 2048 (multiples of 64)")
-            if 'steps' in variable_parameters:
-                param_hints.append("- steps: Use values between 4-20 (4 for fast, 8-12 balanced, 16-20 detailed)")
-            if 'seed' in variable_parameters:
-                param_hints.append("- seed: Use random integers or leave empty for random generation")
-            if 'file_prefix' in variable_parameters:
-                param_hints.append("- file_prefix: Use descriptive names matching content")
-            if 'subfolder' in variable_parameters:
-                param_hints.append("- subfolder: Use logical folder names for organization")
-            if any(lora in variable_parameters for lora in ['mcnl_lora', 'snofs_lora']):
-                param_hints.append("- LoRA parameters: Use true/false, yes/no, or 1/0")
+    if parallel:
+        options = {
+            'provider': provider,
+            'custom_context': custom_context,
+            'use_instructions': use_instructions,
+            'variable_parameters': variable_parameters,
+            'use_cache': use_cache
+        }
+        if stream:
+            def generate():
+                header = format_csv_rows([parameters]) + '\n'
+                yield f"data: {json.dumps({'text': header})}\n\n"
+                remaining = count
+                for kind, payload in ai_assistant.iter_csv_parameters_parallel(base_prompt, parameters, count, model, **options):
+                    if kind == 'rows':
+                        rows = payload[:remaining]
+                        if rows:
+                            remaining -= len(rows)
+                            text = format_csv_rows(rows) + '\n'
+                            yield f"data: {json.dumps({'text': text})}\n\n"
+                    else:
+                        yield f"data: {json.dumps({'warning': payload})}\n\n"
+                yield 'data: {"done": true}\n\n'
             
-            if param_hints:
-                context_parts.append("\\nVariable Parameter Guidelines:\\n" + "\\n".join(param_hints))
-        
-        if custom_context:
-            context_parts.append(f"\\nCustom Requirements: {custom_context}")
-        
-        context_info = "\n".join(context_parts) if context_parts else "Generate creative and diverse parameter values."
-        
-        if use_instructions:
-            headers = ",".join(parameters)
-            instruction = GENERATE_PARAMETERS_INSTRUCTION.format(
-                context_info=context_info,
-                count=count,
-                headers=headers
-            )
-        else:
-            headers = ",".join(parameters)
-            instruction = f"{context_info}\n\nGenerate {count} diverse CSV rows with these parameters: {headers}\n\nFirst row must be the headers, then {count} data rows."
-        
-        def generate():
-            generator = ai_assistant._call_ollama(instruction, model, stream=True)
-            for chunk in generator:
-                yield f"data: {json.dumps({'text': chunk})}\n\n"
-            yield 'data: {"done": true}\n\n'
+            return Response(stream_with_context(generate()), mimetype='text/event-stream')
         
-        return Response(stream_with_context(generate()), mimetype='text/event-stream')
+        return jsonify(ai_assistant.generate_csv_parameters_parallel(base_prompt, parameters, count, model, **options))
+    
+    # Only Ollama supports streaming
+    if stream and provider == 'ollama':
+        instruction = ai_assistant.build_csv_instruction(
+            base_prompt,
+            parameters,
+            count,
+            custom_context=custom_context,
+            use_instructions=use_instructions,
+            variable_parameters=variable_parameters
+        )
+        return Response(stream_with_context(sse_ai_stream(instruction, model, use_cache)), mimetype='text/event-stream')
     else:
         result = ai_assistant.generate_csv_parameters(
             base_prompt=base_prompt,
@@ -1240,7 +2305,8 @@ def generate_csv_with_ai():
             provider=provider,
             custom_context=custom_context,
             use_instructions=use_instructions,
-            variable_parameters=variable_parameters
+            variable_parameters=variable_parameters,
+            use_cache=use_cache
         )
         return jsonify(result)
 
@@ -1256,6 +2322,7 @@ def generate_parameter_values():
         provider = data.get('provider', 'ollama')
         instructions = data.get('instructions', '')
         stream = data.get('stream', False)
+        use_cache = not data.get('bypass_cache', False)
         
         if not parameter:
             return jsonify({'success': False, 'error': 'Parameter name is required'}), 400
@@ -1265,44 +2332,16 @@ def generate_parameter_values():
         
         # Only Ollama supports streaming
         if stream and provider == 'ollama':
-            # Build context for this parameter
-            context_parts = [f"Generate {count} diverse and creative values for the parameter '{parameter}'."]
-            
-            # Add parameter-specific hints
-            if parameter == 'width' or parameter == 'height':
-                context_parts.append("Use image dimensions like 512, 768, 1024, 1536, 2048 (multiples of 64). Consider various aspect ratios.")
-            elif parameter == 'steps':
-                context_parts.append("Use values between 4-20 (4 for fast generation, 8-12 balanced, 16-20 detailed).")
-            elif parameter == 'seed':
-                context_parts.append("Use random integers or -1 for random generation.")
-            elif parameter == 'file_prefix':
-                context_parts.append("Use descriptive file name prefixes that match the content (e.g., 'portrait', 'landscape', 'character', 'scene').")
-            elif parameter == 'subfolder':
-                context_parts.append("Use logical folder names for organization (e.g., 'portraits', 'landscapes', 'variations', 'tests').")
-            elif 'lora' in parameter.lower():
-                context_parts.append("Use boolean values: true, false, yes, no, 1, or 0.")
-            
-            if instructions:
-                context_parts.append(f"\nAdditional requirements: {instructions}")
-            
-            context_parts.append(f"\nOutput exactly {count} values, one per line. No numbering, no explanations, just the values.")
-            
-            instruction = "\n".join(context_parts)
-            
-            def generate():
-                generator = ai_assistant._call_ollama(instruction, model, stream=True)
-                for chunk in generator:
-                    yield f"data: {json.dumps({'text': chunk})}\n\n"
-                yield 'data: {"done": true}\n\n'
-            
-            return Response(stream_with_context(generate()), mimetype='text/event-stream')
+            instruction = ai_assistant.build_parameter_values_instruction(parameter, count, instructions)
+            return Response(stream_with_context(sse_ai_stream(instruction, model, use_cache)), mimetype='text/event-stream')
         else:
             result = ai_assistant.generate_parameter_values(
                 parameter=parameter,
                 count=count,
                 model=model,
                 provider=provider,
-                instructions=instructions
+                instructions=instructions,
+                use_cache=use_cache
             )
             
             return jsonify(result)
@@ -1336,7 +2375,7 @@ def unload_comfyui_models():
 
 @app.route('/api/comfyui/status', methods=['GET'])
 def get_comfyui_status():
-    """Get ComfyUI memory status"""
+    """Get ComfyUI memory status and connection health (circuit breaker state, retries)"""
     global last_queue_empty_time, UNLOAD_DELAY_SECONDS
     
     with queue_lock:
@@ -1344,6 +2383,8 @@ def get_comfyui_status():
         empty_time = last_queue_empty_time
     
     status = {
+        'input_mode': comfyui_client.input_mode,
+        'connection': comfyui_client.transport.status(),
         'queue_empty': is_queue_empty,
         'auto_unload_enabled': True,
         'unload_delay_seconds': UNLOAD_DELAY_SECONDS,
@@ -1363,6 +2404,16 @@ def get_comfyui_status():
     return jsonify(status)
 
 
+@app.route('/api/ready', methods=['GET'])
+def get_ready():
+    """Report whether background startup (queue, metadata, search index, module preloading) has finished
+
+    Returns 200 once every step is ready and 503 before, with the state and duration of each step.
+    """
+    status = startup.status()
+    return jsonify({'success': True, **status}), 200 if status['ready'] else 503
+
+
 @app.route('/api/hardware/stats', methods=['GET'])
 def get_hardware_stats():
     """Get current hardware usage statistics"""
@@ -1440,7 +2491,7 @@ def get_hardware_stats():
 
 def ensure_dummy_image():
     """Create a dummy image if permanent\violet.webp doesn't exist"""
-    comfyui_input_dir = Path('..') / 'comfy.git' / 'app' / 'input'
+    comfyui_input_dir = COMFYUI_INPUT_DIR
     permanent_dir = comfyui_input_dir / 'permanent'
     dummy_image_path = permanent_dir / 'violet.webp'
     
@@ -1482,8 +2533,8 @@ if __name__ == '__main__':
     print(f"ComfyUI Server: http://127.0.0.1:8188")
     print("=" * 60)
     
-    # Ensure dummy image exists
-    ensure_dummy_image()
+    # Ensure dummy image exists (in the background, PIL is slow to import)
+    startup.run('input_image', ensure_dummy_image, after=('modules',))
     
     print("=" * 60)
     app.run(host='0.0.0.0', port=4879, debug=False, threaded=True)
@@ -0,0 +1,321 @@
+"""
+Batch Ingestion
+Incremental parsing of CSV/JSONL batch uploads into queue jobs using a [param] prompt template
+"""
+
+import csv
+import json
+import re
+import threading
+from collections import OrderedDict
+from datetime import datetime
+from typing import Optional, Dict, Any, List, Iterable, Iterator, Tuple, Callable
+
+PARAM_PATTERN = re.compile(r'\[([^\]]+)\]')
+
+# Job fields a row may override, grouped by how their values are converted
+INT_FIELDS = ('width', 'height', 'steps', 'seed')
+FLOAT_FIELDS = ('cfg', 'shift')
+BOOL_FIELDS = ('mcnl_lora', 'snofs_lora', 'male_lora')
+TEXT_FIELDS = ('file_prefix', 'subfolder')
+JOB_FIELDS = INT_FIELDS + FLOAT_FIELDS + BOOL_FIELDS + TEXT_FIELDS
+
+# Accepted ranges, matching the limits of the batch form
+FIELD_LIMITS = {
+    'width': (64, 2048),
+    'height': (64, 2048),
+    'steps': (1, 100),
+    'cfg': (0.0, 20.0),
+    'shift': (0.0, 10.0),
+    'seed': (0, 2**64 - 1)
+}
+
+READ_CHUNK_BYTES = 64 * 1024
+
+
+def extract_parameters(template: str) -> List[str]:
+    """Get the unique [parameter] names in a prompt template, in order of appearance"""
+    parameters = []
+    for name in PARAM_PATTERN.findall(template):
+        if name not in parameters:
+            parameters.append(name)
+    return parameters
+
+
+def iter_lines(stream, encoding: str = 'utf-8') -> Iterator[str]:
+    """
+    Yield decoded lines (with line endings) from a binary stream without reading it all
+
+    Args:
+        stream: Object with a read(size) method returning bytes
+        encoding: Text encoding of the upload
+    """
+    pending = b''
+    first = True
+    while True:
+        block = stream.read(READ_CHUNK_BYTES)
+        if not block:
+            break
+        if first:
+            # Spreadsheet exports often start with a byte order mark
+            if block.startswith(b'\xef\xbb\xbf'):
+                block = block[3:]
+            first = False
+        pending += block
+        lines = pending.split(b'\n')
+        pending = lines.pop()
+        for line in lines:
+            yield line.decode(encoding, 'replace') + '\n'
+    if pending:
+        yield pending.decode(encoding, 'replace')
+
+
+def iter_csv_records(stream, required: Iterable[str] = ()) -> Iterator[Tuple[int, Dict[str, str]]]:
+    """
+    Parse a CSV upload row by row
+
+    Blank lines and lines starting with '#' are skipped, so annotated files
+    like example_batch_parameterized.csv can be uploaded as-is.
+
+    Args:
+        stream: Binary stream of the CSV file
+        required: Columns that must be present in the header
+
+    Yields:
+        (line_number, row) tuples with the row as a header -> value dict
+
+    Raises:
+        ValueError: If the file has no header or required columns are missing
+    """
+    line_number = 0
+
+    def data_lines():
+        nonlocal line_number
+        for line in iter_lines(stream):
+            line_number += 1
+            stripped = line.strip()
+            if stripped and not stripped.startswith('#'):
+                yield line
+
+    reader = csv.reader(data_lines())
+    header = next(reader, None)
+    if not header:
+        raise ValueError('CSV file is empty')
+    headers = [h.strip() for h in header]
+    missing = [name for name in required if name not in headers]
+    if missing:
+        raise ValueError(f"Missing CSV columns: {', '.join(missing)}")
+
+    for values in reader:
+        if len(values) != len(headers):
+            yield line_number, None
+            continue
+        yield line_number, {h: v.strip() for h, v in zip(headers, values)}
+
+
+def iter_jsonl_records(stream) -> Iterator[Tuple[int, Optional[Dict[str, Any]]]]:
+    """
+    Parse a JSON Lines upload object by object
+
+    Yields:
+        (line_number, row) tuples; row is None for lines that are not JSON objects
+    """
+    for line_number, line in enumerate(iter_lines(stream), start=1):
+        stripped = line.strip()
+        if not stripped:
+            continue
+        try:
+            row = json.loads(stripped)
+        except ValueError:
+            row = None
+        yield line_number, row if isinstance(row, dict) else None
+
+
+def convert_field(field: str, value: Any, default: Any) -> Any:
+    """Convert a row value for a job field, falling back to the default when empty"""
+    if field in BOOL_FIELDS:
+        if isinstance(value, bool):
+            return value
+        return str(value).strip().lower() in ('true', 'yes', '1')
+
+    if value is None or (isinstance(value, str) and not value.strip()):
+        # An empty seed means random, other empty values keep the default
+        return None if field == 'seed' else default
+
+    if field in TEXT_FIELDS:
+        return str(value).strip()
+
+    if field in INT_FIELDS:
+        if field == 'seed' and str(value).strip().lower() == 'random':
+            return None
+        try:
+            converted = int(float(value)) if isinstance(value, float) else int(str(value).strip())
+        except ValueError:
+            raise ValueError(f"{field} must be an integer, got {value!r}")
+    else:
+        try:
+            converted = float(value)
+        except (TypeError, ValueError):
+            raise ValueError(f"{field} must be a number, got {value!r}")
+
+    low, high = FIELD_LIMITS[field]
+    if not low <= converted <= high:
+        raise ValueError(f"{field} must be between {low} and {high}, got {converted}")
+    return converted
+
+
+def expand_row(
+    row: Dict[str, Any],
+    template: str,
+    parameters: List[str],
+    defaults: Dict[str, Any],
+    variable: Optional[Iterable[str]] = None
+) -> Dict[str, Any]:
+    """
+    Build the job parameters for one row
+
+    Args:
+        row: Parsed CSV/JSONL record
+        template: Prompt with [parameter] placeholders
+        parameters: Placeholders in the template (from extract_parameters)
+        defaults: Job parameters used when the row doesn't override them
+        variable: Job fields taken from the row (None for every known field present)
+
+    Returns:
+        Job parameter dict including the expanded 'prompt'
+
+    Raises:
+        ValueError: If a placeholder value is missing or a field is invalid
+    """
+    missing = [name for name in parameters if row.get(name) is None]
+    if missing:
+        raise ValueError(f"Missing values for: {', '.join(missing)}")
+
+    params = dict(defaults)
+    params['prompt'] = PARAM_PATTERN.sub(
+        lambda m: str(row[m.group(1)]) if m.group(1) in row else m.group(0),
+        template
+    )
+
+    fields = variable if variable is not None else JOB_FIELDS
+    for field in fields:
+        if field not in row or field not in JOB_FIELDS:
+            continue
+        # Image size wins over per-row dimensions, like in the browser batch
+        if params.get('use_image_size') and field in ('width', 'height'):
+            continue
+        params[field] = convert_field(field, row[field], params.get(field))
+    return params
+
+
+class IngestProgress:
+    """Progress and per-row errors of one ingestion, readable while it runs"""
+
+    def __init__(self, ingest_id: str, max_errors: int = 100):
+        self.id = ingest_id
+        self.max_errors = max_errors
+        self.status = 'running'
+        self.rows_read = 0
+        self.queued = 0
+        self.error_count = 0
+        self.errors: List[Dict[str, Any]] = []
+        self.message: Optional[str] = None
+        self.started_at = datetime.now().isoformat()
+        self.finished_at: Optional[str] = None
+        self._lock = threading.Lock()
+
+    def row_failed(self, line: int, error: str):
+        with self._lock:
+            self.error_count += 1
+            if len(self.errors) < self.max_errors:
+                self.errors.append({'line': line, 'error': error})
+
+    def finish(self, status: str, message: Optional[str] = None):
+        with self._lock:
+            self.status = status
+            self.message = message
+            self.finished_at = datetime.now().isoformat()
+
+    def to_dict(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                'ingest_id': self.id,
+                'status': self.status,
+                'rows_read': self.rows_read,
+                'queued_count': self.queued,
+                'error_count': self.error_count,
+                'errors': list(self.errors),
+                'errors_truncated': self.error_count > len(self.errors),
+                'message': self.message,
+                'started_at': self.started_at,
+                'finished_at': self.finished_at
+            }
+
+
+class IngestRegistry:
+    """Keeps the progress of recent ingestions so clients can poll them"""
+
+    def __init__(self, max_entries: int = 20):
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[str, IngestProgress]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def create(self, ingest_id: str) -> IngestProgress:
+        progress = IngestProgress(ingest_id)
+        with self._lock:
+            self._entries[ingest_id] = progress
+            self._entries.move_to_end(ingest_id)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        return progress
+
+    def get(self, ingest_id: str) -> Optional[IngestProgress]:
+        with self._lock:
+            return self._entries.get(ingest_id)
+
+
+def ingest(
+    records: Iterable[Tuple[int, Optional[Dict[str, Any]]]],
+    template: str,
+    defaults: Dict[str, Any],
+    enqueue: Callable[[List[Dict[str, Any]]], None],
+    progress: IngestProgress,
+    variable: Optional[Iterable[str]] = None,
+    chunk_size: int = 500
+):
+    """
+    Expand and enqueue records in bounded chunks
+
+    Invalid rows are reported on the progress object and skipped; valid rows
+    are handed to enqueue() chunk_size at a time, so the queue lock is only
+    held for one chunk at a time.
+
+    Args:
+        records: (line_number, row) tuples from iter_csv_records/iter_jsonl_records
+        template: Prompt with [parameter] placeholders
+        defaults: Job parameters used when a row doesn't override them
+        enqueue: Callable receiving a list of job parameter dicts in file order
+        progress: Progress object updated as rows are processed
+        variable: Job fields taken from rows (None for every known field present)
+        chunk_size: Rows per enqueue() call
+    """
+    parameters = extract_parameters(template)
+    variable = list(variable) if variable is not None else None
+    chunk = []
+    for line, row in records:
+        progress.rows_read += 1
+        if row is None:
+            progress.row_failed(line, 'Malformed row')
+            continue
+        try:
+            chunk.append(expand_row(row, template, parameters, defaults, variable))
+        except ValueError as e:
+            progress.row_failed(line, str(e))
+            continue
+        if len(chunk) >= chunk_size:
+            enqueue(chunk)
+            progress.queued += len(chunk)
+            chunk = []
+    if chunk:
+        enqueue(chunk)
+        progress.queued += len(chunk)
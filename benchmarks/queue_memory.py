@@ -0,0 +1,94 @@
+"""
+Queue memory benchmark
+Compares the memory held by a queue of plain job dicts with the same queue of JobRecords
+
+Usage: python benchmarks/queue_memory.py [job_count]
+"""
+
+import json
+import os
+import sys
+import tracemalloc
+import uuid
+from datetime import datetime
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from job_records import JobRecord  # noqa: E402
+
+SUBJECTS = ['cat', 'dog', 'bird', 'person', 'robot']
+CLOTHING = ['sweater', 'hat', 'scarf', 'jacket', 'armor']
+
+
+def batch_rows(count):
+    """Rows of a typical CSV batch: the prompt varies, the settings are shared"""
+    for i in range(count):
+        yield {
+            'prompt': f"A {SUBJECTS[i % 5]} wearing a {CLOTHING[i // 5 % 5]} in a garden, variation {i}",
+            'width': 1024,
+            'height': 1024,
+            'steps': 4,
+            'cfg': 1.0,
+            'shift': 3.0,
+            'seed': None,
+            'use_image': False,
+            'use_image_size': False,
+            'image_filename': None,
+            'file_prefix': 'batch',
+            'subfolder': 'experiments/garden',
+            'mcnl_lora': False,
+            'snofs_lora': True,
+            'male_lora': False,
+            'priority': 'normal',
+            'submitter': '127.0.0.1'
+        }
+
+
+def build_dicts(count):
+    # The job dicts add_batch_to_queue used to build
+    return [
+        {
+            'id': str(uuid.uuid4()),
+            **row,
+            'status': 'queued',
+            'added_at': datetime.now().isoformat()
+        }
+        for row in batch_rows(count)
+    ]
+
+
+def build_records(count):
+    added_at = datetime.now().isoformat()
+    return [JobRecord.create(row, added_at) for row in batch_rows(count)]
+
+
+def measure(build, count):
+    tracemalloc.start()
+    queue = build(count)
+    current, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return queue, current
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 100_000
+
+    dicts, dict_bytes = measure(build_dicts, count)
+    records, record_bytes = measure(build_records, count)
+
+    # Same JSON at the API boundary, apart from the per-job ids and timestamps
+    sample = dicts[0].copy()
+    converted = records[0].copy()
+    for key in ('id', 'added_at'):
+        sample.pop(key)
+        converted.pop(key)
+    assert json.dumps(sample, sort_keys=True) == json.dumps(converted, sort_keys=True)
+
+    print(f"{count} queued jobs")
+    print(f"  dicts:      {dict_bytes / 1024 / 1024:8.1f} MB ({dict_bytes / count:.0f} bytes/job)")
+    print(f"  JobRecords: {record_bytes / 1024 / 1024:8.1f} MB ({record_bytes / count:.0f} bytes/job)")
+    print(f"  reduction:  {(1 - record_bytes / dict_bytes) * 100:8.1f}%")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,132 @@
+"""
+Startup time-to-first-byte benchmark
+Starts the web server against a generated history (metadata.json and
+queue_state.json) and measures how long after launch it accepts connections,
+answers its first requests and reports /api/ready
+
+Usage: python benchmarks/startup_ttfb.py [metadata_entries] [queued_jobs] [runs]
+"""
+
+import http.client
+import json
+import os
+import shutil
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import uuid
+from datetime import datetime
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO_DIR)
+
+from benchmarks.queue_memory import batch_rows  # noqa: E402
+
+# Serves app.py like its __main__ block, on a given port
+RUNNER = """
+import sys
+sys.path.insert(0, sys.argv[1])
+import app
+app.app.run(host='127.0.0.1', port=int(sys.argv[2]), debug=False, threaded=True)
+"""
+TIMEOUT_SECONDS = 120
+
+
+def write_history(directory, entries, jobs):
+    """Write a metadata.json and queue_state.json the size of a long-running install"""
+    outputs = os.path.join(directory, 'outputs')
+    os.makedirs(outputs)
+    timestamp = datetime.now().isoformat()
+    metadata = []
+    for i, row in enumerate(batch_rows(entries)):
+        path = os.path.join('outputs', row['subfolder'], f"batch{i:06d}.png")
+        metadata.append({
+            'id': str(uuid.uuid4()), 'filename': os.path.basename(path), 'path': path,
+            'timestamp': timestamp, 'seed': i, **row
+        })
+    with open(os.path.join(outputs, 'metadata.json'), 'w') as f:
+        json.dump(metadata, f, indent=2)
+    queue = [{'id': str(uuid.uuid4()), **row, 'status': 'queued', 'added_at': timestamp} for row in batch_rows(jobs)]
+    with open(os.path.join(outputs, 'queue_state.json'), 'w') as f:
+        json.dump({'queue': queue, 'waiting': [], 'active': None, 'completed': []}, f, indent=2)
+    shutil.copytree(os.path.join(REPO_DIR, 'workflows'), os.path.join(directory, 'workflows'))
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def first_byte(port, path):
+    """Request a page; get the time its status line and headers arrived, and the status"""
+    connection = http.client.HTTPConnection('127.0.0.1', port, timeout=TIMEOUT_SECONDS)
+    try:
+        connection.request('GET', path)
+        response = connection.getresponse()
+        arrived = time.perf_counter()
+        response.read()
+        return arrived, response.status
+    finally:
+        connection.close()
+
+
+def run_once(directory):
+    """Launch the server and time the startup milestones (seconds from launch; pages requested in order)"""
+    port = free_port()
+    launched = time.perf_counter()
+    server = subprocess.Popen(
+        [sys.executable, '-c', RUNNER, REPO_DIR, str(port)],
+        cwd=directory, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+    )
+    try:
+        while True:
+            if time.perf_counter() - launched > TIMEOUT_SECONDS:
+                raise TimeoutError('Server did not start')
+            try:
+                socket.create_connection(('127.0.0.1', port), timeout=1).close()
+                break
+            except OSError:
+                time.sleep(0.01)
+        milestones = {'listening': time.perf_counter() - launched}
+        for path in ('/', '/api/browse', '/api/queue'):
+            milestones[f"ttfb {path}"] = first_byte(port, path)[0] - launched
+        started = time.perf_counter()
+        milestones['next /api/browse'] = first_byte(port, '/api/browse')[0] - started  # Duration, not from launch
+        while True:
+            arrived, status = first_byte(port, '/api/ready')
+            if status == 200:
+                break
+            if arrived - launched > TIMEOUT_SECONDS:
+                raise TimeoutError('Server did not become ready')
+            time.sleep(0.05)
+        milestones['ready'] = arrived - launched
+        return milestones
+    finally:
+        server.terminate()
+        server.wait()
+
+
+def main():
+    entries = int(sys.argv[1]) if len(sys.argv) > 1 else 50_000
+    jobs = int(sys.argv[2]) if len(sys.argv) > 2 else 20_000
+    runs = int(sys.argv[3]) if len(sys.argv) > 3 else 3
+
+    directory = tempfile.mkdtemp(prefix='startup_ttfb_')
+    try:
+        write_history(directory, entries, jobs)
+        results = [run_once(directory) for _ in range(runs)]
+    finally:
+        shutil.rmtree(directory, ignore_errors=True)
+
+    print(f"Startup with {entries} metadata entries and {jobs} queued jobs (median of {runs} runs, seconds from launch)")
+    print("  ('next /api/browse' is the duration of a second browse request)")
+    for milestone in results[0]:
+        print(f"  {milestone + ':':18} {statistics.median(result[milestone] for result in results):6.2f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -1,28 +1,209 @@
 """
 ComfyUI Workflow Client
-Interact with ComfyUI API to execute the Imaginer workflow
+Interact with ComfyUI API to execute the registered workflows
 """
 
+import hashlib
 import json
+import mimetypes
+import os
+import threading
 import urllib.request
 import urllib.parse
 import urllib.error
 import uuid
 import random
 import time
-from typing import Optional, Dict, Any
+from pathlib import Path
+from typing import Optional, Dict, Any, Tuple, List, Union, Callable
+
+from png_metadata import embed_metadata
+from workflow_registry import WorkflowRegistry
+from comfyui_transport import ComfyUITransport
+
+# Image ComfyUI loads when no input image is given (relative to the input directory)
+DEFAULT_INPUT_IMAGE = "permanent/violet.webp"
+UPLOAD_CHUNK_BYTES = 1024 * 1024
+UPLOAD_SUBFOLDER = "webui"
+LOCAL_HOSTS = ('127.0.0.1', 'localhost', '::1', '[::1]')
+
+
+class GenerationCancelled(Exception):
+    """A generation was cancelled (from the web UI, or interrupted in ComfyUI itself)"""
 
 
 class ComfyUIClient:
-    def __init__(self, server_address: str = "127.0.0.1:8188"):
+    def __init__(
+        self,
+        server_address: str = "127.0.0.1:8188",
+        input_dir: Optional[str] = None,
+        input_mode: str = "local",
+        upload_cache_path: Optional[str] = None,
+        workflows: Optional[WorkflowRegistry] = None,
+        transport: Optional[ComfyUITransport] = None
+    ):
         """
         Initialize ComfyUI client
         
         Args:
             server_address: ComfyUI server address (default: 127.0.0.1:8188)
+            input_dir: Local directory holding input images (ComfyUI's own input directory in local mode)
+            input_mode: 'local' (ComfyUI reads input_dir directly), 'upload' (push images through
+                        /upload/image) or 'auto' (local when input_dir exists and ComfyUI runs on this machine)
+            upload_cache_path: JSON file remembering uploaded images per server (None keeps them in memory)
+            workflows: Registry of the workflows jobs can run (default: the workflows folder)
+            transport: Retrying, circuit-breaking HTTP layer (default: one with standard settings)
         """
         self.server_address = server_address
         self.client_id = str(uuid.uuid4())
+        self.input_dir = Path(input_dir) if input_dir else None
+        if input_mode == 'auto':
+            # Decided once, so creating the local directory later doesn't flip the mode
+            host = server_address.rsplit(':', 1)[0]
+            shared_dir = self.input_dir is not None and self.input_dir.exists() and host in LOCAL_HOSTS
+            input_mode = 'local' if shared_dir else 'upload'
+        self.input_mode = input_mode
+        self.upload_cache_path = Path(upload_cache_path) if upload_cache_path else None
+        self._uploads: Optional[Dict[str, Dict[str, str]]] = None  # server -> content hash -> remote name
+        self._hashes: Dict[Tuple[str, int, int], str] = {}  # (path, size, mtime_ns) -> content hash
+        self._upload_lock = threading.Lock()
+        self.workflows = workflows or WorkflowRegistry(Path("workflows"))
+        self.transport = transport or ComfyUITransport(server_address)
+        
+    def uses_upload(self) -> bool:
+        """Whether input images are pushed to ComfyUI instead of read from a shared directory"""
+        return self.input_mode == 'upload'
+    
+    def upload_image(self, path: str, remote_name: Optional[str] = None, subfolder: str = UPLOAD_SUBFOLDER) -> str:
+        """
+        Upload an image to ComfyUI's input directory via /upload/image
+        
+        The multipart body is streamed from disk, so large images are never
+        held in memory.
+        
+        Args:
+            path: Local image file
+            remote_name: Filename on the server (defaults to the local name)
+            subfolder: Subfolder of ComfyUI's input directory
+            
+        Returns:
+            Image path relative to ComfyUI's input directory, as used by LoadImage
+        """
+        path = Path(path)
+        remote_name = remote_name or path.name
+        boundary = uuid.uuid4().hex
+        content_type = mimetypes.guess_type(remote_name)[0] or 'application/octet-stream'
+        
+        fields = b''
+        for name, value in (('type', 'input'), ('subfolder', subfolder), ('overwrite', 'true')):
+            fields += (
+                f'--{boundary}\r\nContent-Disposition: form-data; name="{name}"\r\n\r\n{value}\r\n'
+            ).encode('utf-8')
+        head = fields + (
+            f'--{boundary}\r\nContent-Disposition: form-data; name="image"; filename="{remote_name}"\r\n'
+            f'Content-Type: {content_type}\r\n\r\n'
+        ).encode('utf-8')
+        tail = f'\r\n--{boundary}--\r\n'.encode('utf-8')
+        size = path.stat().st_size
+        
+        def body():
+            yield head
+            with open(path, 'rb') as f:
+                for block in iter(lambda: f.read(UPLOAD_CHUNK_BYTES), b''):
+                    yield block
+            yield tail
+        
+        def make_request():
+            # A new body generator per attempt, so a retry streams the file again
+            return urllib.request.Request(
+                f"http://{self.server_address}/upload/image",
+                data=body(),
+                headers={
+                    'Content-Type': f'multipart/form-data; boundary={boundary}',
+                    'Content-Length': str(len(head) + size + len(tail))
+                },
+                method='POST'
+            )
+        
+        try:
+            # Same name with overwrite, so uploading twice is harmless
+            result = json.loads(self.transport.request(make_request, idempotent=True))
+        except urllib.error.URLError as e:
+            print(f"Error uploading image to ComfyUI: {e}")
+            raise
+        
+        name = result.get('name', remote_name)
+        return f"{result['subfolder']}/{name}" if result.get('subfolder') else name
+    
+    def resolve_input(self, image_filename: str, force_upload: bool = False) -> str:
+        """
+        Make an input image available to ComfyUI
+        
+        In local mode the path is used as-is. In upload mode the image is
+        uploaded once per content hash and server; later calls reuse the
+        remote copy.
+        
+        Args:
+            image_filename: Image path relative to the local input directory
+            force_upload: Upload again even if the server already has this content
+            
+        Returns:
+            Image path to put into the LoadImage node
+        """
+        if not self.uses_upload():
+            return image_filename
+        if self.input_dir is None:
+            raise ValueError("Upload mode needs a local input directory")
+        
+        local_path = self.input_dir / image_filename
+        stat = local_path.stat()
+        hash_key = (str(local_path.resolve()), stat.st_size, stat.st_mtime_ns)
+        content_hash = self._hashes.get(hash_key)
+        if content_hash is None:
+            digest = hashlib.sha256()
+            with open(local_path, 'rb') as f:
+                for block in iter(lambda: f.read(UPLOAD_CHUNK_BYTES), b''):
+                    digest.update(block)
+            content_hash = self._hashes[hash_key] = digest.hexdigest()
+        
+        with self._upload_lock:
+            uploads = self._load_uploads().setdefault(self.server_address, {})
+            remote = uploads.get(content_hash)
+        if remote and not force_upload:
+            return remote
+        
+        # Content-addressed remote name, so identical images share one file on the server
+        remote = self.upload_image(str(local_path), remote_name=f"{content_hash[:32]}{local_path.suffix.lower()}")
+        print(f"Uploaded input {image_filename} to ComfyUI as {remote}")
+        with self._upload_lock:
+            uploads[content_hash] = remote
+            self._save_uploads()
+        return remote
+    
+    def _load_uploads(self) -> Dict[str, Dict[str, str]]:
+        """Load the upload cache on first use (caller holds the upload lock)"""
+        if self._uploads is None:
+            self._uploads = {}
+            if self.upload_cache_path and self.upload_cache_path.exists():
+                try:
+                    with open(self.upload_cache_path, 'r') as f:
+                        self._uploads = json.load(f)
+                except Exception as e:
+                    print(f"Warning: Ignoring unreadable upload cache: {e}")
+        return self._uploads
+    
+    def _save_uploads(self):
+        """Persist the upload cache (caller holds the upload lock)"""
+        if not self.upload_cache_path:
+            return
+        try:
+            self.upload_cache_path.parent.mkdir(parents=True, exist_ok=True)
+            tmp_path = self.upload_cache_path.with_name(f"{self.upload_cache_path.name}.tmp")
+            with open(tmp_path, 'w') as f:
+                json.dump(self._uploads, f)
+            os.replace(tmp_path, self.upload_cache_path)
+        except OSError as e:
+            print(f"Warning: Could not save upload cache: {e}")
         
     def load_workflow(self, workflow_path: str = "workflows/Qwen_Full.json") -> Dict[str, Any]:
         """Load workflow from JSON file"""
@@ -49,8 +230,8 @@ class ComfyUIClient:
         )
         
         try:
-            response = urllib.request.urlopen(req)
-            return json.loads(response.read())
+            # Not idempotent: only retried when the connection was refused
+            return json.loads(self.transport.request(lambda: req, idempotent=False))
         except urllib.error.URLError as e:
             print(f"Error connecting to ComfyUI: {e}")
             raise
@@ -73,8 +254,7 @@ class ComfyUIClient:
         url = f"http://{self.server_address}/view?{url_values}"
         
         try:
-            with urllib.request.urlopen(url) as response:
-                return response.read()
+            return self.transport.request(lambda: url)
         except urllib.error.URLError as e:
             print(f"Error downloading image: {e}")
             raise
@@ -92,32 +272,120 @@ class ComfyUIClient:
         url = f"http://{self.server_address}/history/{prompt_id}"
         
         try:
-            with urllib.request.urlopen(url) as response:
-                return json.loads(response.read())
+            return json.loads(self.transport.request(lambda: url))
         except urllib.error.URLError as e:
             print(f"Error getting history: {e}")
             raise
     
-    def wait_for_completion(self, prompt_id: str, timeout: int = 300) -> Dict[str, Any]:
+    def get_prompt_queue(self) -> Dict[str, Any]:
+        """
+        Get ComfyUI's own queue
+        
+        Returns:
+            {'queue_running': [...], 'queue_pending': [...]}; each item is
+            [number, prompt_id, prompt, extra_data, outputs]
+        """
+        url = f"http://{self.server_address}/queue"
+        
+        try:
+            return json.loads(self.transport.request(lambda: url))
+        except urllib.error.URLError as e:
+            print(f"Error getting queue: {e}")
+            raise
+    
+    def delete_queued_prompts(self, prompt_ids: List[str]) -> bool:
+        """
+        Remove pending prompts from ComfyUI's queue (executing ones are not affected)
+        
+        Returns:
+            True if successful, False otherwise
+        """
+        data = json.dumps({"delete": list(prompt_ids)}).encode('utf-8')
+        
+        req = urllib.request.Request(
+            f"http://{self.server_address}/queue",
+            data=data,
+            headers={'Content-Type': 'application/json'},
+            method='POST'
+        )
+        
+        try:
+            self.transport.request(lambda: req)  # Deleting twice is harmless
+            return True
+        except urllib.error.URLError as e:
+            print(f"Error deleting queued prompts: {e}")
+            return False
+    
+    def cancel_prompt(self, prompt_id: str) -> Optional[str]:
+        """
+        Stop a prompt wherever it is in ComfyUI
+        
+        It is deleted from the pending queue first, so it can't start while
+        the running prompt is checked; if it is already executing, it is interrupted.
+        
+        Args:
+            prompt_id: The prompt ID to stop
+            
+        Returns:
+            'interrupted' if it was executing, 'deleted' if it was pending,
+            None if ComfyUI no longer had it (or could not be reached)
+        """
+        try:
+            queue = self.get_prompt_queue()
+            pending = any(item[1] == prompt_id for item in queue.get('queue_pending', []))
+            if pending:
+                self.delete_queued_prompts([prompt_id])
+                # It may have started in the meantime
+                queue = self.get_prompt_queue()
+            if any(item[1] == prompt_id for item in queue.get('queue_running', [])):
+                return 'interrupted' if self.interrupt_processing(prompt_id) else None
+            return 'deleted' if pending else None
+        except urllib.error.URLError as e:
+            print(f"Could not cancel prompt {prompt_id}: {e}")
+            return None
+    
+    def wait_for_completion(
+        self,
+        prompt_id: str,
+        timeout: int = 300,
+        cancel_event: Optional[threading.Event] = None,
+        poll_interval: float = 1.0
+    ) -> Dict[str, Any]:
         """
         Wait for a prompt to complete execution
         
         Args:
             prompt_id: The prompt ID to wait for
             timeout: Maximum time to wait in seconds
+            cancel_event: When set, the prompt is stopped in ComfyUI and waiting ends at once
+            poll_interval: Seconds between history polls
             
         Returns:
             History data when completed
+            
+        Raises:
+            GenerationCancelled: If cancel_event was set, or the prompt was interrupted in ComfyUI
+            TimeoutError: If the prompt did not finish in time
         """
         start_time = time.time()
+        cancel_event = cancel_event or threading.Event()
         
         while time.time() - start_time < timeout:
+            if cancel_event.is_set():
+                outcome = self.cancel_prompt(prompt_id)
+                print(f"Cancelled prompt {prompt_id} ({outcome or 'no longer in ComfyUI'})")
+                raise GenerationCancelled(f"Prompt {prompt_id} was cancelled")
+            
             history = self.get_history(prompt_id)
             
             if prompt_id in history:
-                return history[prompt_id]
+                entry = history[prompt_id]
+                messages = entry.get('status', {}).get('messages', [])
+                if any(message[0] == 'execution_interrupted' for message in messages):
+                    raise GenerationCancelled(f"Prompt {prompt_id} was interrupted in ComfyUI")
+                return entry
             
-            time.sleep(1)
+            cancel_event.wait(poll_interval)  # Wakes at once on cancellation
         
         raise TimeoutError(f"Workflow did not complete within {timeout} seconds")
     
@@ -136,13 +404,15 @@ class ComfyUIClient:
         image_filename: Optional[str] = None,
         mcnl_lora: bool = False,
         snofs_lora: bool = False,
-        male_lora: bool = False
+        male_lora: bool = False,
+        batch_size: int = 1,
+        workflow_name: Optional[str] = None
     ) -> Dict[str, Any]:
         """
-        Modify workflow parameters for Qwen_Full.json workflow
+        Modify workflow parameters through the workflow's node mapping
         
         Args:
-            workflow: The workflow dictionary
+            workflow: The workflow dictionary (not modified; untouched nodes are shared)
             positive_prompt: Positive prompt text
             width: Image width
             height: Image height
@@ -156,56 +426,38 @@ class ComfyUIClient:
             mcnl_lora: Enable MCNL LoRA
             snofs_lora: Enable Snofs LoRA
             male_lora: Enable Male LoRA
+            batch_size: Images sampled together from one latent batch (same
+                        prompt encoding, noise drawn from the one seed)
+            workflow_name: Registry workflow whose mapping applies (None for the default)
             
         Returns:
             Modified workflow
+            
+        Raises:
+            WorkflowError: If the workflow lacks an input a parameter needs
         """
-        # Create a copy to avoid modifying the original
-        modified = json.loads(json.dumps(workflow))
-        
-        # Update positive prompt (node 45)
-        if positive_prompt:
-            modified["45"]["inputs"]["value"] = positive_prompt
-        
-        # Update dimensions (nodes 32=width, 31=height)
-        if width is not None:
-            modified["32"]["inputs"]["value"] = width
-        if height is not None:
-            modified["31"]["inputs"]["value"] = height
-        
-        # Update sampling parameters
-        if steps is not None:
-            modified["36"]["inputs"]["value"] = steps
-        if cfg is not None:
-            modified["39"]["inputs"]["value"] = cfg
-        if shift is not None:
-            modified["40"]["inputs"]["value"] = shift
-        if seed is not None:
-            modified["35"]["inputs"]["value"] = seed
-        elif seed is None:
-            # Generate random seed
-            modified["35"]["inputs"]["value"] = random.randint(0, 2**32 - 1)
-        
-        # Update use_image (node 38)
-        modified["38"]["inputs"]["value"] = use_image
-        
-        # Update use_image_size (node 34)
-        modified["34"]["inputs"]["value"] = use_image_size
-        
-        # Update image filename (node 43). Some workflows require a valid image path
-        # even in text-to-image mode. Provide a fallback to a permanent dummy image
-        # to avoid Bad Request errors from ComfyUI when the path is missing.
-        if not image_filename:
-            # Default dummy image path relative to ComfyUI input root
-            image_filename = "permanent/violet.webp"
-        modified["43"]["inputs"]["image"] = image_filename
-        
-        # Update LoRA booleans (nodes 41=MCNL, 42=Snofs, 33=Male)
-        modified["41"]["inputs"]["value"] = mcnl_lora
-        modified["42"]["inputs"]["value"] = snofs_lora
-        modified["33"]["inputs"]["value"] = male_lora
-        
-        return modified
+        plan = self.workflows.get(workflow_name)
+        values = {
+            'prompt': positive_prompt or None,
+            'width': width,
+            'height': height,
+            'steps': steps,
+            'cfg': cfg,
+            'shift': shift,
+            'seed': seed if seed is not None else random.randint(0, 2**32 - 1),
+            'use_image': use_image,
+            'use_image_size': use_image_size,
+            'image_filename': image_filename,
+            'mcnl_lora': mcnl_lora,
+            'snofs_lora': snofs_lora,
+            'male_lora': male_lora
+        }
+        plan.check(values)
+        # Some workflows require a valid image path even in text-to-image mode. Provide
+        # a fallback to a permanent dummy image to avoid Bad Request errors from ComfyUI.
+        if plan.supports('image_filename') and not image_filename:
+            values['image_filename'] = DEFAULT_INPUT_IMAGE
+        return plan.build(values, batch_size=batch_size, template=workflow)
 
     def unload_models(self) -> None:
         """Call ComfyUI to unload models (free VRAM/RAM caches)."""
@@ -249,9 +501,14 @@ class ComfyUIClient:
         mcnl_lora: bool = False,
         snofs_lora: bool = False,
         male_lora: bool = False,
-        output_path: Optional[str] = None,
-        wait: bool = True
-    ) -> Optional[str]:
+        batch_size: int = 1,
+        workflow: Optional[str] = None,
+        output_path: Optional[Union[str, List[str]]] = None,
+        png_metadata: Optional[Union[Dict[str, Any], List[Dict[str, Any]]]] = None,
+        wait: bool = True,
+        cancel_event: Optional[threading.Event] = None,
+        on_queued: Optional[Callable[[str], None]] = None
+    ) -> Optional[Union[str, List[str]]]:
         """
         Generate an image using the workflow
         
@@ -269,16 +526,32 @@ class ComfyUIClient:
             mcnl_lora: Enable MCNL LoRA
             snofs_lora: Enable Snofs LoRA
             male_lora: Enable Male LoRA
-            output_path: Path to save the image (None to not save)
+            batch_size: Number of images generated in this one execution
+            workflow: Registry workflow to run (None for the default)
+            output_path: Path to save the image (None to not save), or a list
+                         of paths in batch order
+            png_metadata: Generation parameters embedded in the saved PNG (iTXt chunk),
+                          or a list matching output_path
             wait: Whether to wait for completion
+            cancel_event: When set, the generation is stopped in ComfyUI (see wait_for_completion)
+            on_queued: Called with the prompt_id once ComfyUI has accepted the prompt
             
         Returns:
-            Path to saved image if output_path provided and wait=True, else None
+            Path to saved image (or the list of paths) if output_path provided and wait=True, else None
+            
+        Raises:
+            GenerationCancelled: If cancel_event was set before the images were ready
         """
-        # Load and modify workflow
-        workflow = self.load_workflow()
+        plan = self.workflows.get(workflow)
+        
+        # Make sure ComfyUI can load the input image (uploads it in upload mode)
+        local_image = image_filename or DEFAULT_INPUT_IMAGE
+        if plan.supports('image_filename'):
+            image_filename = self.resolve_input(local_image)
+        
+        # Patch the cached template of the workflow
         modified_workflow = self.modify_workflow(
-            workflow,
+            plan.template,
             positive_prompt=positive_prompt,
             width=width,
             height=height,
@@ -291,44 +564,62 @@ class ComfyUIClient:
             image_filename=image_filename,
             mcnl_lora=mcnl_lora,
             snofs_lora=snofs_lora,
-            male_lora=male_lora
+            male_lora=male_lora,
+            batch_size=batch_size,
+            workflow_name=plan.name
         )
         
-        # Queue the prompt
-        response = self.queue_prompt(modified_workflow)
+        # Queue the prompt (unless cancelled while preparing)
+        if cancel_event is not None and cancel_event.is_set():
+            raise GenerationCancelled("Cancelled before the prompt was queued")
+        try:
+            response = self.queue_prompt(modified_workflow)
+        except urllib.error.HTTPError as e:
+            if e.code != 400 or not self.uses_upload() or not plan.supports('image_filename'):
+                raise
+            # The server may have lost a previously uploaded input (e.g. its input dir was cleaned)
+            print("ComfyUI rejected the prompt; uploading the input image again")
+            plan.set(modified_workflow, 'image_filename', self.resolve_input(local_image, force_upload=True))
+            response = self.queue_prompt(modified_workflow)
         prompt_id = response['prompt_id']
         print(f"Queued prompt: {prompt_id}")
+        if on_queued:
+            on_queued(prompt_id)
         
         if not wait:
             return None
         
         # Wait for completion
         print("Waiting for generation to complete...")
-        history = self.wait_for_completion(prompt_id)
+        history = self.wait_for_completion(prompt_id, cancel_event=cancel_event)
         
         # Get the output images
         outputs = history['outputs']
         
-        # Find SaveImage node output
-        for node_id, node_output in outputs.items():
-            if 'images' in node_output:
-                for image in node_output['images']:
-                    filename = image['filename']
-                    subfolder = image.get('subfolder', '')
-                    
-                    # Download image
-                    image_data = self.get_image(filename, subfolder)
-                    
-                    if output_path:
-                        # Save image
-                        with open(output_path, 'wb') as f:
-                            f.write(image_data)
-                        print(f"Image saved to: {output_path}")
-                        return output_path
-                    else:
-                        print(f"Image generated: {filename}")
-        
-        return None
+        # Find SaveImage node output (its images are in batch order)
+        images = next((node_output['images'] for node_output in outputs.values() if 'images' in node_output), [])
+        single = isinstance(output_path, str)
+        output_paths = [output_path] if single else output_path
+        metadata_list = [png_metadata] if isinstance(png_metadata, dict) else png_metadata or [None] * len(output_paths or [])
+        
+        if not output_paths:
+            for image in images:
+                print(f"Image generated: {image['filename']}")
+            return None
+        if len(images) < len(output_paths):
+            raise RuntimeError(f"ComfyUI returned {len(images)} images for a batch of {len(output_paths)}")
+        
+        for image, path, metadata in zip(images, output_paths, metadata_list):
+            # Download image
+            image_data = self.get_image(image['filename'], image.get('subfolder', ''))
+            if metadata:
+                image_data = embed_metadata(image_data, metadata)
+            # Save image
+            with open(path, 'wb') as f:
+                f.write(image_data)
+            print(f"Image saved to: {path}")
+        
+        return output_path if single else output_paths
     
     def unload_models(self) -> bool:
         """
@@ -349,16 +640,15 @@ class ComfyUIClient:
         )
         
         try:
-            with urllib.request.urlopen(req) as response:
-                response_text = response.read().decode('utf-8').strip()
-                # Some ComfyUI versions return empty response
-                if response_text:
-                    try:
-                        result = json.loads(response_text)
-                    except json.JSONDecodeError:
-                        pass  # Empty or non-JSON response is OK
-                print(f"Models unloaded and memory freed")
-                return True
+            response_text = self.transport.request(lambda: req, idempotent=False).decode('utf-8').strip()
+            # Some ComfyUI versions return empty response
+            if response_text:
+                try:
+                    result = json.loads(response_text)
+                except json.JSONDecodeError:
+                    pass  # Empty or non-JSON response is OK
+            print(f"Models unloaded and memory freed")
+            return True
         except urllib.error.URLError as e:
             print(f"Error unloading models: {e}")
             return False
@@ -382,35 +672,42 @@ class ComfyUIClient:
         )
         
         try:
-            with urllib.request.urlopen(req) as response:
-                response_text = response.read().decode('utf-8').strip()
-                # Some ComfyUI versions return empty response
-                if response_text:
-                    try:
-                        result = json.loads(response_text)
-                    except json.JSONDecodeError:
-                        pass  # Empty or non-JSON response is OK
-                print(f"Cache cleared")
-                return True
+            response_text = self.transport.request(lambda: req, idempotent=False).decode('utf-8').strip()
+            # Some ComfyUI versions return empty response
+            if response_text:
+                try:
+                    result = json.loads(response_text)
+                except json.JSONDecodeError:
+                    pass  # Empty or non-JSON response is OK
+            print(f"Cache cleared")
+            return True
         except urllib.error.URLError as e:
             print(f"Error clearing cache: {e}")
             return False
     
-    def interrupt_processing(self) -> bool:
+    def interrupt_processing(self, prompt_id: Optional[str] = None) -> bool:
         """
         Interrupt current processing (emergency stop)
         
+        Args:
+            prompt_id: Only interrupt if this prompt is executing (ComfyUI
+                       versions without targeted interrupts stop whatever runs)
+        
         Returns:
             True if successful, False otherwise
         """
         url = f"http://{self.server_address}/interrupt"
         
-        req = urllib.request.Request(url, method='POST')
+        if prompt_id:
+            data = json.dumps({"prompt_id": prompt_id}).encode('utf-8')
+            req = urllib.request.Request(url, data=data, headers={'Content-Type': 'application/json'}, method='POST')
+        else:
+            req = urllib.request.Request(url, method='POST')
         
         try:
-            with urllib.request.urlopen(req) as response:
-                print(f"Processing interrupted")
-                return True
+            self.transport.request(lambda: req, idempotent=False)
+            print(f"Processing interrupted")
+            return True
         except urllib.error.URLError as e:
             print(f"Error interrupting: {e}")
             return False
@@ -0,0 +1,251 @@
+"""
+ComfyUI Transport
+HTTP calls to ComfyUI with retries (jittered exponential backoff) and a
+circuit breaker that stops traffic while the server is unreachable
+"""
+
+import http.client
+import random
+import socket
+import threading
+import time
+import urllib.error
+import urllib.request
+from typing import Optional, Dict, Any, Callable, Iterator, Union
+
+
+class TransportError(urllib.error.URLError):
+    """
+    ComfyUI could not be reached (after retries), or the circuit breaker is open
+
+    A URLError, so existing handlers keep working; HTTP error responses are
+    not transport errors (the server answered).
+    """
+
+
+def is_transport_error(error: BaseException) -> bool:
+    """Whether an exception means the request did not get an answer from the server"""
+    if isinstance(error, urllib.error.HTTPError):
+        return False
+    return isinstance(error, (
+        urllib.error.URLError, ConnectionError, socket.timeout,
+        http.client.RemoteDisconnected, http.client.IncompleteRead, http.client.BadStatusLine
+    ))
+
+
+def _refused(error: BaseException) -> bool:
+    """Whether the connection was refused, i.e. the request never reached the server"""
+    reason = getattr(error, 'reason', error)
+    return isinstance(reason, ConnectionRefusedError)
+
+
+class RetryPolicy:
+    """Retry delays with full jitter: attempt n waits uniform(0, min(max_delay, base_delay * 2**n))"""
+
+    def __init__(self, attempts: int = 4, base_delay: float = 0.5, max_delay: float = 8.0):
+        """
+        Args:
+            attempts: Total tries per call (1 disables retries)
+            base_delay: Upper bound of the first delay in seconds
+            max_delay: Cap of the delay bound
+        """
+        self.attempts = max(1, attempts)
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+
+    def delays(self) -> Iterator[float]:
+        """Delays before the second, third, ... attempt"""
+        for attempt in range(self.attempts - 1):
+            yield random.uniform(0, min(self.max_delay, self.base_delay * 2 ** attempt))
+
+
+class CircuitBreaker:
+    """
+    Consecutive-failure breaker
+
+    closed: calls go through. After failure_threshold failed calls in a row
+    it opens: calls fail at once for reset_timeout seconds. Then it is
+    half-open and lets one probe through; success closes it, failure opens
+    it again with twice the timeout (up to max_reset_timeout).
+    """
+
+    def __init__(self, failure_threshold: int = 3, reset_timeout: float = 5.0, max_reset_timeout: float = 60.0):
+        self.failure_threshold = max(1, failure_threshold)
+        self.reset_timeout = reset_timeout
+        self.max_reset_timeout = max_reset_timeout
+        self.state = 'closed'
+        self.consecutive_failures = 0
+        self.opened_at: Optional[float] = None
+        self.current_timeout = reset_timeout
+        self.last_error: Optional[str] = None
+        self.last_failure_at: Optional[float] = None
+        self.opened = 0  # Times the breaker opened
+        self._probing = False
+        self._lock = threading.Lock()
+
+    def allow(self) -> bool:
+        """Whether a call may go out now (in half-open state only one at a time)"""
+        with self._lock:
+            if self.state == 'closed':
+                return True
+            if self.state == 'open' and time.monotonic() - self.opened_at >= self.current_timeout:
+                self.state = 'half_open'
+            if self.state == 'half_open' and not self._probing:
+                self._probing = True
+                return True
+            return False
+
+    def record_success(self):
+        with self._lock:
+            if self.state != 'closed':
+                print("ComfyUI reachable again; resuming")
+            self.state = 'closed'
+            self.consecutive_failures = 0
+            self.current_timeout = self.reset_timeout
+            self._probing = False
+
+    def record_failure(self, error: BaseException):
+        with self._lock:
+            self.consecutive_failures += 1
+            self.last_error = str(error)
+            self.last_failure_at = time.time()
+            if self.state == 'half_open':
+                self.current_timeout = min(self.max_reset_timeout, self.current_timeout * 2)
+                self._open()
+            elif self.state == 'closed' and self.consecutive_failures >= self.failure_threshold:
+                self.current_timeout = self.reset_timeout
+                self._open()
+                print(f"ComfyUI unreachable ({error}); pausing for {self.current_timeout:g}s")
+            self._probing = False
+
+    def retry_in(self) -> float:
+        """Seconds until the next probe is allowed (0 when calls go through)"""
+        with self._lock:
+            if self.state != 'open':
+                return 0.0
+            return max(0.0, self.current_timeout - (time.monotonic() - self.opened_at))
+
+    def _open(self):
+        self.state = 'open'
+        self.opened_at = time.monotonic()
+        self.opened += 1
+
+
+class ComfyUITransport:
+    """Sends requests to one ComfyUI server through a retry policy and a circuit breaker"""
+
+    def __init__(
+        self,
+        server_address: str,
+        timeout: float = 30,
+        retry: Optional[RetryPolicy] = None,
+        breaker: Optional[CircuitBreaker] = None
+    ):
+        """
+        Args:
+            server_address: host:port of ComfyUI
+            timeout: Socket timeout per request in seconds
+            retry: Retry policy (default RetryPolicy())
+            breaker: Circuit breaker (default CircuitBreaker())
+        """
+        self.server_address = server_address
+        self.timeout = timeout
+        self.retry = retry or RetryPolicy()
+        self.breaker = breaker or CircuitBreaker()
+        self.requests = 0
+        self.retries = 0
+        self.failures = 0
+        self._counter_lock = threading.Lock()
+
+    def url(self, path: str) -> str:
+        return f"http://{self.server_address}{path}"
+
+    def request(
+        self,
+        make_request: Callable[[], Union[str, urllib.request.Request]],
+        idempotent: bool = True,
+        timeout: Optional[float] = None
+    ) -> bytes:
+        """
+        Send a request and read the whole response body
+
+        Idempotent requests are retried on any transport error; others only
+        when the connection was refused, so a request the server may have
+        received is never sent twice.
+
+        Args:
+            make_request: Builds the URL or Request (called per attempt, so streamed bodies start over)
+            idempotent: Whether sending the request twice is harmless
+            timeout: Override the socket timeout
+
+        Returns:
+            The response body
+
+        Raises:
+            urllib.error.HTTPError: If ComfyUI answered with an error status
+            TransportError: If ComfyUI could not be reached or the breaker is open
+        """
+        if not self.breaker.allow():
+            raise TransportError(f"ComfyUI at {self.server_address} is unreachable (retrying in {self.breaker.retry_in():.0f}s)")
+        delays = self.retry.delays()
+        while True:
+            with self._counter_lock:
+                self.requests += 1
+            try:
+                with urllib.request.urlopen(make_request(), timeout=timeout or self.timeout) as response:
+                    body = response.read()
+            except Exception as e:
+                if not is_transport_error(e):
+                    self.breaker.record_success()  # E.g. an HTTP error status: the server is up, the request was bad
+                    raise
+                delay = next(delays, None) if idempotent or _refused(e) else None
+                if delay is None:
+                    with self._counter_lock:
+                        self.failures += 1
+                    self.breaker.record_failure(e)
+                    raise TransportError(getattr(e, 'reason', e)) from e
+                with self._counter_lock:
+                    self.retries += 1
+                time.sleep(delay)
+                continue
+            self.breaker.record_success()
+            return body
+
+    def ready(self, probe_path: str = '/system_stats') -> bool:
+        """
+        Whether work should be sent to ComfyUI now
+
+        While the breaker is open this is False; once its timeout has passed,
+        the first caller probes the server (one cheap request, no retries).
+        """
+        breaker = self.breaker
+        if breaker.state == 'closed':
+            return True
+        if not breaker.allow():
+            return False
+        try:
+            with urllib.request.urlopen(self.url(probe_path), timeout=self.timeout) as response:
+                response.read()
+        except urllib.error.HTTPError:
+            pass  # Answered, so reachable
+        except Exception as e:
+            breaker.record_failure(e)
+            return False
+        breaker.record_success()
+        return True
+
+    def status(self) -> Dict[str, Any]:
+        """Get the breaker state and call counters"""
+        breaker = self.breaker
+        return {
+            'state': breaker.state,
+            'reachable': breaker.state == 'closed',
+            'consecutive_failures': breaker.consecutive_failures,
+            'retry_in_seconds': round(breaker.retry_in(), 1),
+            'last_error': breaker.last_error,
+            'last_failure_at': breaker.last_failure_at,
+            'times_opened': breaker.opened,
+            'requests': self.requests,
+            'retries': self.retries,
+            'failures': self.failures
+        }
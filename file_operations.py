@@ -0,0 +1,244 @@
+"""
+File Operations
+Plans bulk moves and deletes under outputs/, applies them with rollback and
+rewrites the affected metadata entries in one pass
+"""
+
+import os
+import shutil
+import uuid
+from pathlib import Path
+from typing import Optional, Dict, Any, List, Tuple, Iterable
+
+
+class FileOperationError(ValueError):
+    """An item cannot be moved or deleted (not found, outside outputs/, ...)"""
+
+
+def resolve_item(root: Path, item_path: str, protected: Iterable[Path] = ()) -> Path:
+    """
+    Get the path of an item given relative to root
+
+    Raises:
+        FileOperationError: If the item does not exist, is outside root, is
+                            root itself or is one of the protected paths
+    """
+    path = Path(root) / item_path
+    resolved = path.resolve()
+    try:
+        resolved.relative_to(Path(root).resolve())
+    except ValueError:
+        raise FileOperationError('Outside the outputs folder')
+    if resolved == Path(root).resolve() or resolved in protected:
+        raise FileOperationError('Reserved by the application')
+    if not path.exists():
+        raise FileOperationError('Not found')
+    return path
+
+
+class FileTransaction:
+    """
+    A batch of moves and deletes that is applied completely or not at all
+
+    Items are checked when they are added; apply() then performs the file
+    operations in order and undoes the completed ones if any of them fails.
+    Deleted files are first moved to a staging folder on the same disk so
+    they can be restored, and only purged by finish() once the metadata
+    change is saved.
+    """
+
+    def __init__(self, root: Path, trash_dir: Path, protected: Iterable[Path] = ()):
+        """
+        Initialize the transaction
+
+        Args:
+            root: Outputs root; every item path is relative to it
+            trash_dir: Folder (inside root, so renames stay on one disk) for staged deletions
+            protected: Paths that may not be moved or deleted (e.g. the metadata file)
+        """
+        self.root = Path(root)
+        self.trash = Path(trash_dir) / uuid.uuid4().hex
+        self.protected = {Path(path).resolve() for path in protected} | {Path(trash_dir).resolve()}
+        self.moves: List[Tuple[Path, Path]] = []
+        self.deletes: List[Path] = []
+        self._folders = set()  # Move sources that are folders, for metadata prefix rewrites
+        self._reserved = set()  # Move targets claimed by earlier items of this batch
+        self._done: List[Tuple[str, Path, Optional[Path]]] = []  # (kind, path, staged or moved-to path)
+
+    def resolve(self, item_path: str) -> Path:
+        """Get the path of an item, refusing paths outside the root and protected ones"""
+        return resolve_item(self.root, item_path, self.protected)
+
+    def move(self, item_path: str, target_dir: Path) -> Optional[Path]:
+        """
+        Plan moving a file or folder into target_dir
+
+        Name conflicts get ' (1)', ' (2)', ... as in the browser. Items inside a
+        folder that is moved by the same batch travel with it.
+
+        Returns:
+            Destination path, or None when the item moves with a planned folder
+
+        Raises:
+            FileOperationError: If the item cannot be moved there
+        """
+        source = self.resolve(item_path)
+        target_dir = Path(target_dir)
+        if source.is_dir() and (target_dir.resolve() == source.resolve() or source.resolve() in target_dir.resolve().parents):
+            raise FileOperationError('Cannot move a folder into itself')
+        if source.parent.resolve() == target_dir.resolve():
+            raise FileOperationError('Already in the target folder')
+        if any(self._contains(folder, source) for folder, _ in self.moves):
+            return None
+        if any(self._contains(source, planned) for planned, _ in self.moves):
+            # A folder listed after some of its contents: they travel with it instead
+            inside = [(planned, destination) for planned, destination in self.moves if self._contains(source, planned)]
+            self.moves = [move for move in self.moves if move not in inside]
+            self._reserved.difference_update(destination for _, destination in inside)
+
+        destination = target_dir / source.name
+        index = 1
+        while destination.exists() or destination in self._reserved:
+            destination = target_dir / f"{source.stem} ({index}){source.suffix}"
+            index += 1
+        self._reserved.add(destination)
+        if source.is_dir():
+            self._folders.add(source)
+        self.moves.append((source, destination))
+        return destination
+
+    def delete(self, items: List[str]) -> List[Tuple[str, Optional[str]]]:
+        """
+        Plan deleting files and folders
+
+        A folder is only deleted if it is empty once the other items of the
+        batch are gone.
+
+        Returns:
+            (item_path, error) per item; error is None for planned deletions
+        """
+        resolved = {}
+        outcomes = []
+        for item_path in items:
+            try:
+                resolved[item_path] = self.resolve(item_path)
+            except FileOperationError as e:
+                outcomes.append((item_path, str(e)))
+        batch = set(resolved.values())
+        removable = {}
+
+        def can_remove(path: Path) -> bool:
+            if path not in removable:
+                removable[path] = path.is_file() or (
+                    path.is_dir() and all(child in batch and can_remove(child) for child in path.iterdir())
+                )
+            return removable[path]
+
+        for item_path, path in resolved.items():
+            if can_remove(path):
+                outcomes.append((item_path, None))
+            else:
+                outcomes.append((item_path, 'Folder not empty'))
+        planned = {path for path in batch if removable.get(path)}
+        # Files first, then folders from the deepest up
+        self.deletes = sorted(planned, key=lambda path: (path.is_dir(), -len(path.parts)))
+        return outcomes
+
+    def apply(self):
+        """
+        Perform the planned moves and deletes
+
+        Raises:
+            FileOperationError: If an operation failed; everything done so far has been undone
+        """
+        try:
+            for source, destination in self.moves:
+                shutil.move(str(source), str(destination))
+                self._done.append(('move', source, destination))
+            for path in self.deletes:
+                if path.is_dir():
+                    path.rmdir()
+                    self._done.append(('rmdir', path, None))
+                else:
+                    self.trash.mkdir(parents=True, exist_ok=True)
+                    staged = self.trash / str(len(self._done))
+                    os.rename(path, staged)
+                    self._done.append(('delete', path, staged))
+        except OSError as e:
+            failed = e.filename or ''
+            self.rollback()
+            raise FileOperationError(f"{failed}: {e.strerror or e}" if failed else str(e))
+
+    def rollback(self):
+        """Undo the completed operations, newest first"""
+        while self._done:
+            kind, path, other = self._done.pop()
+            try:
+                if kind == 'move':
+                    shutil.move(str(other), str(path))
+                elif kind == 'rmdir':
+                    path.mkdir()
+                else:
+                    os.rename(other, path)
+            except OSError as e:
+                print(f"Error rolling back {kind} of {path}: {e}")
+        self._remove_trash()
+
+    def finish(self):
+        """Purge staged deletions once the change is committed"""
+        self._done = []
+        self._remove_trash()
+
+    def rewrite(self, entries: List[Dict[str, Any]]) -> Tuple[List[Dict[str, Any]], List[Dict[str, Any]], List[Dict[str, Any]]]:
+        """
+        Apply the batch to metadata entries in one pass
+
+        Entries of moved files, and of every file under a moved folder, get
+        their new path, filename and subfolder; entries of deleted files are
+        dropped.
+
+        Returns:
+            (kept entries, updated entries, removed entries)
+        """
+        exact = {}
+        prefixes = []
+        for source, destination in self.moves:
+            if source in self._folders:
+                prefixes.append((str(source) + os.sep, str(destination) + os.sep))
+            else:
+                exact[str(source)] = str(destination)
+        deleted = {str(path) for path in self.deletes}
+
+        kept, updated, removed = [], [], []
+        for entry in entries:
+            path = entry.get('path', '')
+            if path in deleted:
+                removed.append(entry)
+                continue
+            new_path = exact.get(path)
+            if new_path is None:
+                for old_prefix, new_prefix in prefixes:
+                    if path.startswith(old_prefix):
+                        new_path = new_prefix + path[len(old_prefix):]
+                        break
+            if new_path is not None:
+                location = Path(new_path)
+                subfolder = location.parent.relative_to(self.root).as_posix()
+                entry['path'] = new_path
+                entry['filename'] = location.name
+                entry['subfolder'] = '' if subfolder == '.' else subfolder
+                updated.append(entry)
+            kept.append(entry)
+        return kept, updated, removed
+
+    @staticmethod
+    def _contains(folder: Path, path: Path) -> bool:
+        return folder in path.parents
+
+    def _remove_trash(self):
+        if self.trash.exists():
+            shutil.rmtree(self.trash, ignore_errors=True)
+            try:
+                self.trash.parent.rmdir()  # Only succeeds once no other transaction uses it
+            except OSError:
+                pass
@@ -0,0 +1,190 @@
+"""
+Image Probe
+Reads image dimensions from file headers (PNG, JPEG, WebP, BMP) without decoding pixels
+"""
+
+import os
+import struct
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Dict, Any, List, Iterable, Optional, Tuple
+
+HEADER_BYTES = 64
+JPEG_MAX_SCAN_BYTES = 4 * 1024 * 1024  # Give up on JPEGs whose frame header is not near the start
+EXIF_ORIENTATION_TAG = 0x0112
+TRANSPOSED_ORIENTATIONS = (5, 6, 7, 8)  # EXIF orientations that rotate by 90 degrees (width and height swap)
+
+
+class ImageProbeError(ValueError):
+    """Raised when a file is not a readable image of a supported format"""
+
+
+def _probe_png(f, header: bytes, size: int) -> Tuple[int, int]:
+    if len(header) < 24 or header[12:16] != b'IHDR':
+        raise ImageProbeError('PNG header is missing IHDR')
+    width, height = struct.unpack('>II', header[16:24])
+    # Walk the chunks (seeking over their data) up to IEND; running out of
+    # data before it means a truncated file. Bytes after IEND are ignored.
+    offset = 8
+    while offset + 8 <= size:
+        f.seek(offset)
+        length, kind = struct.unpack('>I4s', f.read(8))
+        offset += 12 + length
+        if offset > size:
+            break
+        if kind == b'IEND':
+            return width, height
+    raise ImageProbeError('PNG is truncated (no IEND chunk)')
+
+
+def _exif_orientation(segment: bytes) -> int:
+    """Get the Orientation tag from an APP1 segment (1 when it has none)"""
+    if not segment.startswith(b'Exif\0\0'):
+        return 1
+    tiff = segment[6:]
+    order = {b'II': '<', b'MM': '>'}.get(tiff[:2])
+    if order is None or len(tiff) < 8:
+        return 1
+    ifd, = struct.unpack(order + 'I', tiff[4:8])
+    if ifd + 2 > len(tiff):
+        return 1
+    count, = struct.unpack(order + 'H', tiff[ifd:ifd + 2])
+    for entry in range(ifd + 2, min(len(tiff) - 11, ifd + 2 + count * 12), 12):
+        tag, kind, _count = struct.unpack(order + 'HHI', tiff[entry:entry + 8])
+        if tag == EXIF_ORIENTATION_TAG and kind == 3:  # SHORT
+            return struct.unpack(order + 'H', tiff[entry + 8:entry + 10])[0]
+    return 1
+
+
+def _probe_jpeg(f, header: bytes, size: int) -> Tuple[int, int]:
+    # Dimensions as displayed: ComfyUI applies the EXIF orientation when loading
+    orientation = 1
+    f.seek(2)
+    while f.tell() < min(size, JPEG_MAX_SCAN_BYTES):
+        byte = f.read(1)
+        if byte != b'\xff':
+            raise ImageProbeError('JPEG marker structure is corrupt')
+        marker = f.read(1)
+        while marker == b'\xff':  # Fill bytes
+            marker = f.read(1)
+        if not marker:
+            break
+        code = marker[0]
+        if code == 0xD9 or code == 0xDA:
+            raise ImageProbeError('JPEG has no frame header before the image data')
+        if 0xD0 <= code <= 0xD7 or code == 0x01:
+            continue  # Standalone markers have no length
+        length_bytes = f.read(2)
+        if len(length_bytes) < 2:
+            break
+        length = struct.unpack('>H', length_bytes)[0]
+        # SOF0-SOF15 carry the dimensions (C4, C8 and CC are other tables)
+        if 0xC0 <= code <= 0xCF and code not in (0xC4, 0xC8, 0xCC):
+            frame = f.read(5)
+            if len(frame) < 5:
+                break
+            height, width = struct.unpack('>HH', frame[1:5])
+            if f.tell() + length - 7 > size:
+                break
+            if orientation in TRANSPOSED_ORIENTATIONS:
+                width, height = height, width
+            return width, height
+        if code == 0xE1 and orientation == 1:
+            orientation = _exif_orientation(f.read(length - 2))
+            continue
+        f.seek(length - 2, os.SEEK_CUR)
+    raise ImageProbeError('JPEG is truncated')
+
+
+def _probe_webp(f, header: bytes, size: int) -> Tuple[int, int]:
+    riff_size = struct.unpack('<I', header[4:8])[0]
+    if riff_size + 8 > size:
+        raise ImageProbeError('WebP is truncated')
+    chunk = header[12:16]
+    data = header[20:]
+    if chunk == b'VP8X' and len(data) >= 10:
+        width = int.from_bytes(data[4:7], 'little') + 1
+        height = int.from_bytes(data[7:10], 'little') + 1
+        return width, height
+    if chunk == b'VP8 ' and len(data) >= 10 and data[3:6] == b'\x9d\x01\x2a':
+        width, height = struct.unpack('<HH', data[6:10])
+        return width & 0x3FFF, height & 0x3FFF
+    if chunk == b'VP8L' and len(data) >= 5 and data[0] == 0x2F:
+        bits = int.from_bytes(data[1:5], 'little')
+        return (bits & 0x3FFF) + 1, ((bits >> 14) & 0x3FFF) + 1
+    raise ImageProbeError('Unsupported or corrupt WebP header')
+
+
+def _probe_bmp(f, header: bytes, size: int) -> Tuple[int, int]:
+    if len(header) < 26:
+        raise ImageProbeError('BMP header is truncated')
+    file_size, = struct.unpack('<I', header[2:6])
+    if file_size and file_size > size:
+        raise ImageProbeError('BMP is truncated')
+    dib_size, = struct.unpack('<I', header[14:18])
+    if dib_size == 12:
+        width, height = struct.unpack('<HH', header[18:22])
+    else:
+        width, height = struct.unpack('<ii', header[18:26])
+    return abs(width), abs(height)
+
+
+def probe_image(path) -> Dict[str, Any]:
+    """
+    Read an image's format and dimensions from its header
+
+    Args:
+        path: Image file path
+
+    Returns:
+        Dict with 'format', 'width' and 'height'
+
+    Raises:
+        ImageProbeError: If the file is unreadable, unsupported or corrupt
+    """
+    try:
+        size = os.path.getsize(path)
+        with open(path, 'rb') as f:
+            header = f.read(HEADER_BYTES)
+            if header.startswith(b'\x89PNG\r\n\x1a\n'):
+                image_format, (width, height) = 'png', _probe_png(f, header, size)
+            elif header.startswith(b'\xff\xd8'):
+                image_format, (width, height) = 'jpeg', _probe_jpeg(f, header, size)
+            elif header[:4] == b'RIFF' and header[8:12] == b'WEBP':
+                image_format, (width, height) = 'webp', _probe_webp(f, header, size)
+            elif header.startswith(b'BM'):
+                image_format, (width, height) = 'bmp', _probe_bmp(f, header, size)
+            else:
+                raise ImageProbeError('Not a PNG, JPEG, WebP or BMP file')
+    except OSError as e:
+        raise ImageProbeError(f"Unreadable file: {e}")
+    except struct.error:
+        raise ImageProbeError('Image header is truncated')
+
+    if width <= 0 or height <= 0:
+        raise ImageProbeError(f"Invalid image dimensions {width}x{height}")
+    return {'format': image_format, 'width': width, 'height': height}
+
+
+def probe_images(paths: Iterable, max_workers: int = 8) -> List[Tuple[Path, Optional[Dict[str, Any]], Optional[str]]]:
+    """
+    Probe many images concurrently
+
+    Args:
+        paths: Image file paths
+        max_workers: Thread pool size (header reads are I/O bound)
+
+    Returns:
+        (path, info, error) tuples in input order; info is None when error is set
+    """
+    def probe(path):
+        try:
+            return path, probe_image(path), None
+        except ImageProbeError as e:
+            return path, None, str(e)
+
+    paths = list(paths)
+    if len(paths) <= 1:
+        return [probe(path) for path in paths]
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        return list(executor.map(probe, paths))
@@ -0,0 +1,313 @@
+"""
+Input Image Store
+Content-addressed, deduplicating storage for images placed in the ComfyUI input directory
+"""
+
+import hashlib
+import json
+import os
+import shutil
+import threading
+import time
+import uuid
+from pathlib import Path
+from typing import Optional, Dict, Any, Iterable, Tuple
+
+HASH_CHUNK_BYTES = 1024 * 1024
+FICLONE = 0x40049409  # Linux ioctl for copy-on-write clones (btrfs, XFS, ...)
+
+
+def hash_file(path: Path) -> str:
+    """Get the SHA-256 of a file, reading it in chunks"""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(HASH_CHUNK_BYTES), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def _reflink(source: Path, target: Path) -> bool:
+    """Clone a file without copying its data where the filesystem supports it"""
+    try:
+        import fcntl
+    except ImportError:
+        return False  # Not available on Windows
+    try:
+        with open(source, 'rb') as src, open(target, 'wb') as dst:
+            fcntl.ioctl(dst.fileno(), FICLONE, src.fileno())
+        return True
+    except OSError:
+        try:
+            os.remove(target)
+        except OSError:
+            pass
+        return False
+
+
+def link_or_copy(source: Path, target: Path) -> str:
+    """
+    Place a file at target as cheaply as possible
+
+    Returns:
+        'hardlink', 'reflink' or 'copy'
+    """
+    try:
+        os.link(source, target)
+        return 'hardlink'
+    except OSError:
+        pass
+    if _reflink(source, target):
+        return 'reflink'
+    shutil.copy2(source, target)
+    return 'copy'
+
+
+class InputStore:
+    """Stores input images once per content hash and tracks how many queued jobs use each"""
+
+    def __init__(self, input_dir: Path, subdir: str = 'uploads'):
+        """
+        Initialize the store
+
+        Args:
+            input_dir: ComfyUI input directory
+            subdir: Folder inside the input directory holding stored files
+        """
+        self.input_dir = Path(input_dir)
+        self.subdir = subdir
+        self.store_dir = self.input_dir / subdir
+        self.index_path = self.store_dir / '.index.json'
+        self._entries: Optional[Dict[str, Dict[str, Any]]] = None  # hash -> entry, loaded lazily
+        self._by_name: Dict[str, str] = {}  # stored filename -> hash
+        self._hash_cache: Dict[Tuple[str, int, int], str] = {}  # (path, size, mtime_ns) -> hash
+        self._dirty = False
+        self._lock = threading.RLock()
+
+    def available(self) -> bool:
+        """Whether the ComfyUI input directory exists"""
+        return self.input_dir.exists()
+
+    def put_stream(self, stream, extension: str) -> Dict[str, Any]:
+        """
+        Store an uploaded file, hashing it while it is written to disk
+
+        Args:
+            stream: Binary stream with a read(size) method
+            extension: File extension including the dot (e.g. '.png')
+
+        Returns:
+            Dict with 'filename' (relative to the input dir), 'hash', 'size' and 'deduplicated'
+        """
+        self.store_dir.mkdir(parents=True, exist_ok=True)
+        tmp_path = self.store_dir / f".upload-{uuid.uuid4().hex}.tmp"
+        digest = hashlib.sha256()
+        size = 0
+        try:
+            with open(tmp_path, 'wb') as f:
+                for block in iter(lambda: stream.read(HASH_CHUNK_BYTES), b''):
+                    digest.update(block)
+                    f.write(block)
+                    size += len(block)
+            return self._commit(digest.hexdigest(), extension, size, tmp_path)
+        finally:
+            if tmp_path.exists():
+                os.remove(tmp_path)
+
+    def put_file(self, source: Path) -> Dict[str, Any]:
+        """
+        Store an existing file (e.g. a generated output) without copying its data when possible
+
+        Returns:
+            Dict with 'filename', 'hash', 'size', 'deduplicated' and 'method'
+        """
+        source = Path(source)
+        stat = source.stat()
+        cache_key = (str(source.resolve()), stat.st_size, stat.st_mtime_ns)
+        file_hash = self._hash_cache.get(cache_key) or hash_file(source)
+        self._hash_cache[cache_key] = file_hash
+
+        existing = self._existing(file_hash)
+        if existing:
+            return {**existing, 'method': 'existing'}
+
+        self.store_dir.mkdir(parents=True, exist_ok=True)
+        tmp_path = self.store_dir / f".link-{uuid.uuid4().hex}.tmp"
+        try:
+            method = link_or_copy(source, tmp_path)
+            result = self._commit(file_hash, source.suffix.lower(), stat.st_size, tmp_path)
+            return {**result, 'method': 'existing' if result['deduplicated'] else method}
+        finally:
+            if tmp_path.exists():
+                os.remove(tmp_path)
+
+    def retain(self, filename: Optional[str], count: int = 1):
+        """Record that queued jobs use a stored file (ignored for files outside the store)"""
+        self._adjust_refs(filename, count)
+
+    def release(self, filename: Optional[str], count: int = 1):
+        """Record that queued jobs no longer use a stored file"""
+        self._adjust_refs(filename, -count)
+
+    def reset_refs(self, filenames: Iterable[Optional[str]]):
+        """Recount references from the filenames of every queued job (used at startup)"""
+        with self._lock:
+            entries = self._load()
+            for entry in entries.values():
+                entry['refs'] = 0
+            for filename in filenames:
+                file_hash = self._by_name.get(self._normalize(filename)) if filename else None
+                if file_hash:
+                    entries[file_hash]['refs'] += 1
+            self._dirty = True
+
+    def collect(self, min_age_seconds: float = 3600, protected: Iterable[str] = ()) -> Dict[str, Any]:
+        """
+        Delete stored files that no queued job uses
+
+        Args:
+            min_age_seconds: Keep files used more recently than this (uploads not queued yet)
+            protected: Filenames to keep regardless (e.g. inputs referenced by image history)
+
+        Returns:
+            Dict with 'removed' count and 'freed_bytes'
+        """
+        protected = {self._normalize(name) for name in protected if name}
+        cutoff = time.time() - min_age_seconds
+        removed, freed = 0, 0
+        with self._lock:
+            entries = self._load()
+            for file_hash, entry in list(entries.items()):
+                if entry['refs'] > 0 or entry['last_used'] > cutoff or entry['filename'] in protected:
+                    continue
+                try:
+                    os.remove(self.input_dir / entry['filename'])
+                except FileNotFoundError:
+                    pass
+                except OSError as e:
+                    print(f"Warning: Could not remove stored input {entry['filename']}: {e}")
+                    continue
+                del entries[file_hash]
+                self._by_name.pop(entry['filename'], None)
+                removed += 1
+                freed += entry['size']
+            if removed:
+                self._dirty = True
+        self.flush()
+        if removed:
+            print(f"Input store: removed {removed} unused inputs ({freed / 1024 / 1024:.1f} MB)")
+        return {'removed': removed, 'freed_bytes': freed}
+
+    def stats(self) -> Dict[str, Any]:
+        """Get entry counts and total size of the store"""
+        with self._lock:
+            entries = self._load()
+            return {
+                'entries': len(entries),
+                'referenced': sum(1 for entry in entries.values() if entry['refs'] > 0),
+                'total_bytes': sum(entry['size'] for entry in entries.values()),
+                'store_dir': str(self.store_dir)
+            }
+
+    def flush(self):
+        """Write the index if it changed"""
+        with self._lock:
+            if not self._dirty or self._entries is None or not self.store_dir.exists():
+                return
+            data = json.dumps(self._entries)
+            self._dirty = False
+        tmp_path = self.index_path.with_name(f"{self.index_path.name}.{threading.get_ident()}.tmp")
+        try:
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                f.write(data)
+            os.replace(tmp_path, self.index_path)
+        except OSError as e:
+            print(f"Warning: Could not save input store index: {e}")
+
+    def _commit(self, file_hash: str, extension: str, size: int, tmp_path: Path) -> Dict[str, Any]:
+        """Move a fully written temp file into place, or drop it if the content is already stored"""
+        with self._lock:
+            existing = self._existing(file_hash)
+            if existing:
+                return existing
+            filename = f"{self.subdir}/{file_hash[:32]}{extension.lower()}"
+            os.replace(tmp_path, self.input_dir / filename)
+            now = time.time()
+            self._load()[file_hash] = {
+                'filename': filename,
+                'size': size,
+                'refs': 0,
+                'created': now,
+                'last_used': now
+            }
+            self._by_name[filename] = file_hash
+            self._dirty = True
+        self.flush()
+        return {'filename': filename, 'hash': file_hash, 'size': size, 'deduplicated': False}
+
+    def _existing(self, file_hash: str) -> Optional[Dict[str, Any]]:
+        """Get a stored entry for this hash if its file is still on disk"""
+        with self._lock:
+            entries = self._load()
+            entry = entries.get(file_hash)
+            if entry is None:
+                return None
+            if not (self.input_dir / entry['filename']).exists():
+                # Removed behind our back; store it again
+                del entries[file_hash]
+                self._by_name.pop(entry['filename'], None)
+                self._dirty = True
+                return None
+            entry['last_used'] = time.time()
+            self._dirty = True
+            return {'filename': entry['filename'], 'hash': file_hash, 'size': entry['size'], 'deduplicated': True}
+
+    def _adjust_refs(self, filename: Optional[str], delta: int):
+        if not filename:
+            return
+        with self._lock:
+            self._load()
+            file_hash = self._by_name.get(self._normalize(filename))
+            if file_hash is None:
+                return
+            entry = self._entries[file_hash]
+            entry['refs'] = max(0, entry['refs'] + delta)
+            entry['last_used'] = time.time()
+            self._dirty = True
+
+    @staticmethod
+    def _normalize(filename: str) -> str:
+        return filename.replace('\\', '/')
+
+    def _load(self) -> Dict[str, Dict[str, Any]]:
+        """Load the index on first use, adopting stored files that are missing from it (caller holds the lock)"""
+        if self._entries is not None:
+            return self._entries
+
+        entries = {}
+        if self.index_path.exists():
+            try:
+                with open(self.index_path, 'r', encoding='utf-8') as f:
+                    entries = json.load(f)
+            except Exception as e:
+                print(f"Warning: Rebuilding unreadable input store index: {e}")
+                entries = {}
+
+        known = {entry['filename'] for entry in entries.values()}
+        if self.store_dir.exists():
+            for item in self.store_dir.iterdir():
+                filename = f"{self.subdir}/{item.name}"
+                if item.name.startswith('.') or not item.is_file() or filename in known:
+                    continue
+                stat = item.stat()
+                entries[hash_file(item)] = {
+                    'filename': filename,
+                    'size': stat.st_size,
+                    'refs': 0,
+                    'created': stat.st_mtime,
+                    'last_used': stat.st_mtime
+                }
+                self._dirty = True
+
+        self._entries = entries
+        self._by_name = {entry['filename']: file_hash for file_hash, entry in entries.items()}
+        return entries
@@ -0,0 +1,241 @@
+"""
+Job Records
+Compact queue job representation: slotted records with interned strings, shared
+parameter blocks and enum status codes, readable and writable like the job dicts
+they replace
+"""
+
+import sys
+import threading
+import uuid
+import weakref
+from collections.abc import MutableMapping
+from datetime import datetime
+from enum import IntEnum
+from typing import Optional, Dict, Any, Iterator
+
+# Generation parameters kept in the shared block, in job dict order
+PARAM_FIELDS = (
+    'width', 'height', 'steps', 'cfg', 'shift',
+    'use_image', 'use_image_size', 'image_filename', 'file_prefix', 'subfolder',
+    'mcnl_lora', 'snofs_lora', 'male_lora', 'workflow'
+)
+
+# Key order of a job dict at the API boundary (extra keys follow)
+JOB_KEYS = (
+    'id', 'prompt', 'width', 'height', 'steps', 'cfg', 'shift', 'seed',
+    'use_image', 'use_image_size', 'image_filename', 'file_prefix', 'subfolder',
+    'mcnl_lora', 'snofs_lora', 'male_lora', 'workflow', 'status', 'added_at', 'priority', 'submitter'
+)
+
+_STRING_FIELDS = ('image_filename', 'file_prefix', 'subfolder', 'workflow')
+
+
+class JobStatus(IntEnum):
+    """Job lifecycle states; serialized as their lowercase name"""
+    QUEUED = 0
+    GENERATING = 1
+    COMPLETED = 2
+    FAILED = 3
+    WAITING = 4  # Held back until the jobs it depends on finish
+    CANCELLED = 5  # Stopped by the user while generating
+
+    @property
+    def label(self) -> str:
+        return self.name.lower()
+
+    @classmethod
+    def from_label(cls, label: str) -> 'JobStatus':
+        try:
+            return cls[label.upper()]
+        except (KeyError, AttributeError):
+            raise ValueError(f"Unknown job status: {label!r}")
+
+
+def intern_text(value):
+    """Intern strings so identical values across jobs share one object"""
+    return sys.intern(value) if type(value) is str else value
+
+
+class JobParams:
+    """Immutable block of generation parameters shared by every job that uses the same values"""
+
+    __slots__ = PARAM_FIELDS + ('__weakref__',)
+
+    _blocks = weakref.WeakValueDictionary()
+    _blocks_lock = threading.Lock()
+
+    @classmethod
+    def shared(cls, params: Dict[str, Any]) -> 'JobParams':
+        """
+        Get the block for these parameter values, reusing an existing one when possible
+
+        Args:
+            params: Dict with the PARAM_FIELDS keys (missing keys become None)
+        """
+        values = tuple(params.get(field) for field in PARAM_FIELDS)
+        # Include the types so 1 and True (equal and same hash) don't share a block
+        key = tuple((type(value), value) for value in values)
+        with cls._blocks_lock:
+            block = cls._blocks.get(key)
+            if block is None:
+                block = object.__new__(cls)
+                for field, value in zip(PARAM_FIELDS, values):
+                    object.__setattr__(block, field, intern_text(value) if field in _STRING_FIELDS else value)
+                cls._blocks[key] = block
+            return block
+
+    def replace(self, field: str, value: Any) -> 'JobParams':
+        """Get the block with one value changed"""
+        params = {name: getattr(self, name) for name in PARAM_FIELDS}
+        params[field] = value
+        return JobParams.shared(params)
+
+    def __setattr__(self, name, value):
+        raise AttributeError('JobParams blocks are shared and immutable')
+
+
+class JobRecord(MutableMapping):
+    """
+    A queued job that behaves like the job dict it replaces
+
+    Per-job values (id, prompt, seed, status, timestamp, priority, submitter)
+    live in slots; the remaining generation parameters come from a shared
+    JobParams block. Keys added later in the job's life (output_path, error,
+    ...) go to a small overflow dict that is only created when needed.
+    """
+
+    __slots__ = ('id', 'prompt', 'seed', 'params', '_status', 'added_at', 'priority', 'submitter', '_extra')
+
+    def __init__(
+        self,
+        job_id: str,
+        params: JobParams,
+        prompt: str = '',
+        seed: Optional[int] = None,
+        status: JobStatus = JobStatus.QUEUED,
+        added_at: Optional[str] = None,
+        priority: Optional[str] = None,
+        submitter: Optional[str] = None,
+        extra: Optional[Dict[str, Any]] = None
+    ):
+        self.id = job_id
+        self.params = params
+        self.prompt = intern_text(prompt)
+        self.seed = seed
+        self._status = status
+        self.added_at = added_at
+        self.priority = intern_text(priority)
+        self.submitter = intern_text(submitter)
+        self._extra = extra or None
+
+    @classmethod
+    def create(cls, params: Dict[str, Any], added_at: Optional[str] = None) -> 'JobRecord':
+        """
+        Create a queued job from generation parameters
+
+        Args:
+            params: Parameters as built by job_parameters() (may carry extra keys)
+            added_at: Shared timestamp for jobs queued together (defaults to now)
+        """
+        job = cls.from_dict(params)
+        job.id = str(uuid.uuid4())
+        job._status = JobStatus.QUEUED
+        job.added_at = intern_text(added_at or datetime.now().isoformat())
+        return job
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> 'JobRecord':
+        """Build a record from a job dict (e.g. loaded from queue_state.json)"""
+        extra = {key: value for key, value in data.items() if key not in JOB_KEYS}
+        status = data.get('status', 'queued')
+        return cls(
+            data.get('id'),
+            JobParams.shared(data),
+            prompt=data.get('prompt', ''),
+            seed=data.get('seed'),
+            status=status if isinstance(status, JobStatus) else JobStatus.from_label(status),
+            added_at=intern_text(data.get('added_at')),
+            priority=data.get('priority'),
+            submitter=data.get('submitter'),
+            extra=extra
+        )
+
+    @property
+    def status(self) -> JobStatus:
+        return self._status
+
+    def to_dict(self) -> Dict[str, Any]:
+        """Get the job as a plain dict (same keys and values as the original job dicts)"""
+        params = self.params
+        data = {
+            'id': self.id,
+            'prompt': self.prompt,
+            'width': params.width,
+            'height': params.height,
+            'steps': params.steps,
+            'cfg': params.cfg,
+            'shift': params.shift,
+            'seed': self.seed,
+            'use_image': params.use_image,
+            'use_image_size': params.use_image_size,
+            'image_filename': params.image_filename,
+            'file_prefix': params.file_prefix,
+            'subfolder': params.subfolder,
+            'mcnl_lora': params.mcnl_lora,
+            'snofs_lora': params.snofs_lora,
+            'male_lora': params.male_lora,
+            'workflow': params.workflow,
+            'status': self._status.label,
+            'added_at': self.added_at,
+            'priority': self.priority,
+            'submitter': self.submitter
+        }
+        if self._extra:
+            data.update(self._extra)
+        return data
+
+    def copy(self) -> Dict[str, Any]:
+        """Snapshot as a plain dict, like dict.copy() on the old job dicts"""
+        return self.to_dict()
+
+    def __getitem__(self, key: str) -> Any:
+        if key in PARAM_FIELDS:
+            return getattr(self.params, key)
+        if key == 'status':
+            return self._status.label
+        if key in ('id', 'prompt', 'seed', 'added_at', 'priority', 'submitter'):
+            return getattr(self, key)
+        if self._extra is not None and key in self._extra:
+            return self._extra[key]
+        raise KeyError(key)
+
+    def __setitem__(self, key: str, value: Any):
+        if key in PARAM_FIELDS:
+            self.params = self.params.replace(key, value)
+        elif key == 'status':
+            self._status = value if isinstance(value, JobStatus) else JobStatus.from_label(value)
+        elif key in ('prompt', 'added_at', 'priority', 'submitter'):
+            setattr(self, key, intern_text(value))
+        elif key in ('id', 'seed'):
+            setattr(self, key, value)
+        else:
+            if self._extra is None:
+                self._extra = {}
+            self._extra[key] = value
+
+    def __delitem__(self, key: str):
+        if self._extra is None or key not in self._extra:
+            raise KeyError(key)
+        del self._extra[key]
+
+    def __iter__(self) -> Iterator[str]:
+        yield from JOB_KEYS
+        if self._extra:
+            yield from list(self._extra)
+
+    def __len__(self) -> int:
+        return len(JOB_KEYS) + (len(self._extra) if self._extra else 0)
+
+    def __repr__(self) -> str:
+        return f"JobRecord(id={self.id!r}, status={self._status.label!r}, prompt={self.prompt[:40]!r})"
@@ -0,0 +1,290 @@
+"""
+LLM Transport
+Shared HTTP layer for AI providers: keep-alive connection pooling, per-provider
+concurrency limits, coalescing of identical in-flight requests and latency metrics
+"""
+
+import hashlib
+import http.client
+import json
+import threading
+import time
+import urllib.parse
+from collections import deque
+from typing import Optional, Dict, Any, Iterator, Tuple
+
+
+class TransportHTTPError(Exception):
+    """Raised when a provider answers with an HTTP error status"""
+
+    def __init__(self, status: int, body: str):
+        super().__init__(f"HTTP {status}: {body}")
+        self.status = status
+        self.body = body
+
+
+class _InFlight:
+    """Result slot shared by every caller of one coalesced request"""
+
+    def __init__(self):
+        self.event = threading.Event()
+        self.result = None
+        self.error: Optional[BaseException] = None
+
+
+class _ProviderState:
+    def __init__(self, timeout: float, max_concurrency: int):
+        self.timeout = timeout
+        self.semaphore = threading.BoundedSemaphore(max_concurrency)
+        self.max_concurrency = max_concurrency
+        self.requests = 0
+        self.errors = 0
+        self.coalesced = 0
+        self.in_flight = 0
+        self.latencies = deque(maxlen=500)  # Recent request durations in seconds
+
+
+class LLMTransport:
+    """Pooled, concurrency-limited HTTP client shared by all AI provider calls"""
+
+    # Connection errors that mean a pooled keep-alive socket went stale
+    _STALE_ERRORS = (http.client.RemoteDisconnected, http.client.BadStatusLine, BrokenPipeError, ConnectionResetError)
+
+    def __init__(self, providers: Optional[Dict[str, Dict[str, Any]]] = None, max_idle_per_host: int = 4):
+        """
+        Initialize the transport
+
+        Args:
+            providers: Per-provider settings, e.g. {'ollama': {'timeout': 120, 'max_concurrency': 3}}
+            max_idle_per_host: Idle keep-alive connections kept per host
+        """
+        self.max_idle_per_host = max_idle_per_host
+        self._providers: Dict[str, _ProviderState] = {}
+        self._idle: Dict[Tuple[str, str, int], list] = {}
+        self._in_flight: Dict[str, _InFlight] = {}
+        self._lock = threading.Lock()
+        for name, settings in (providers or {}).items():
+            self.configure(name, **settings)
+
+    def configure(self, provider: str, timeout: float = 60, max_concurrency: int = 2):
+        """Set (or replace) the timeout and concurrency limit for a provider"""
+        with self._lock:
+            self._providers[provider] = _ProviderState(timeout, max_concurrency)
+
+    def post_json(
+        self,
+        provider: str,
+        url: str,
+        payload: Dict[str, Any],
+        timeout: Optional[float] = None,
+        coalesce: bool = True,
+        limit: bool = True
+    ) -> Dict[str, Any]:
+        """
+        POST a JSON body and return the decoded JSON response
+
+        Args:
+            provider: Provider name used for limits and metrics
+            url: Full request URL
+            payload: JSON-serializable request body
+            timeout: Override the provider timeout
+            coalesce: Share one upstream call between identical concurrent requests
+            limit: Whether to wait for a slot in the provider's concurrency limit
+
+        Raises:
+            TransportHTTPError: For HTTP error statuses
+        """
+        body = json.dumps(payload, sort_keys=True).encode('utf-8')
+        if not coalesce:
+            return self._request_json(provider, 'POST', url, body, timeout, limit)
+
+        key = hashlib.sha256(url.encode('utf-8') + b'\0' + body).hexdigest()
+        with self._lock:
+            slot = self._in_flight.get(key)
+            is_leader = slot is None
+            if is_leader:
+                slot = self._in_flight[key] = _InFlight()
+            else:
+                self._state(provider).coalesced += 1
+
+        if not is_leader:
+            slot.event.wait()
+            if slot.error is not None:
+                raise slot.error
+            return slot.result
+
+        try:
+            slot.result = self._request_json(provider, 'POST', url, body, timeout, limit)
+            return slot.result
+        except BaseException as e:
+            slot.error = e
+            raise
+        finally:
+            with self._lock:
+                self._in_flight.pop(key, None)
+            slot.event.set()
+
+    def get_json(self, provider: str, url: str, timeout: Optional[float] = None, limit: bool = False) -> Dict[str, Any]:
+        """GET a URL and return the decoded JSON response"""
+        return self._request_json(provider, 'GET', url, None, timeout, limit)
+
+    def stream_lines(self, provider: str, url: str, payload: Dict[str, Any], timeout: Optional[float] = None) -> Iterator[bytes]:
+        """
+        POST a JSON body and yield the response line by line
+
+        The provider slot is held until the stream is exhausted or closed.
+        """
+        state = self._state(provider)
+        body = json.dumps(payload).encode('utf-8')
+        state.semaphore.acquire()
+        start = time.time()
+        self._begin(state)
+        conn = None
+        completed = False
+        try:
+            conn, response = self._send('POST', url, body, timeout or state.timeout)
+            if response.status >= 400:
+                raise TransportHTTPError(response.status, response.read().decode('utf-8', 'replace'))
+            for line in response:
+                yield line
+            completed = True
+        except GeneratorExit:
+            raise
+        except BaseException:
+            with self._lock:
+                state.errors += 1
+            raise
+        finally:
+            if conn is not None:
+                if completed:
+                    self._release(url, conn)
+                else:
+                    conn.close()
+            self._finish(state, start)
+            state.semaphore.release()
+
+    def metrics(self) -> Dict[str, Any]:
+        """Get per-provider request counts and latency percentiles (milliseconds)"""
+        with self._lock:
+            result = {}
+            for name, state in self._providers.items():
+                latencies = sorted(state.latencies)
+                result[name] = {
+                    'requests': state.requests,
+                    'errors': state.errors,
+                    'coalesced': state.coalesced,
+                    'in_flight': state.in_flight,
+                    'max_concurrency': state.max_concurrency,
+                    'timeout_seconds': state.timeout,
+                    'latency_ms': {
+                        'avg': round(sum(latencies) / len(latencies) * 1000, 1) if latencies else None,
+                        'p50': self._percentile_ms(latencies, 0.50),
+                        'p95': self._percentile_ms(latencies, 0.95),
+                        'max': round(latencies[-1] * 1000, 1) if latencies else None
+                    }
+                }
+            result['idle_connections'] = sum(len(conns) for conns in self._idle.values())
+            return result
+
+    @staticmethod
+    def _percentile_ms(latencies, fraction: float) -> Optional[float]:
+        if not latencies:
+            return None
+        index = min(len(latencies) - 1, int(round(fraction * (len(latencies) - 1))))
+        return round(latencies[index] * 1000, 1)
+
+    def _state(self, provider: str) -> _ProviderState:
+        state = self._providers.get(provider)
+        if state is None:
+            # Unknown providers get defaults rather than failing the call
+            self.configure(provider)
+            state = self._providers[provider]
+        return state
+
+    def _begin(self, state: _ProviderState):
+        with self._lock:
+            state.requests += 1
+            state.in_flight += 1
+
+    def _finish(self, state: _ProviderState, start: float):
+        with self._lock:
+            state.in_flight -= 1
+            state.latencies.append(time.time() - start)
+
+    def _request_json(self, provider: str, method: str, url: str, body: Optional[bytes], timeout: Optional[float], limit: bool) -> Dict[str, Any]:
+        state = self._state(provider)
+        if limit:
+            state.semaphore.acquire()
+        start = time.time()
+        self._begin(state)
+        try:
+            conn, response = self._send(method, url, body, timeout or state.timeout)
+            try:
+                data = response.read()
+            except BaseException:
+                conn.close()
+                raise
+            self._release(url, conn)
+            if response.status >= 400:
+                raise TransportHTTPError(response.status, data.decode('utf-8', 'replace'))
+            text = data.decode('utf-8').strip()
+            return json.loads(text) if text else {}
+        except BaseException:
+            with self._lock:
+                state.errors += 1
+            raise
+        finally:
+            self._finish(state, start)
+            if limit:
+                state.semaphore.release()
+
+    def _send(self, method: str, url: str, body: Optional[bytes], timeout: float):
+        """Send a request on a pooled connection, retrying once if the socket was stale"""
+        parsed = urllib.parse.urlsplit(url)
+        path = parsed.path or '/'
+        if parsed.query:
+            path = f"{path}?{parsed.query}"
+        headers = {'Content-Type': 'application/json'} if body is not None else {}
+
+        for attempt in range(2):
+            conn, reused = self._acquire(parsed, timeout)
+            try:
+                conn.request(method, path, body=body, headers=headers)
+                return conn, conn.getresponse()
+            except self._STALE_ERRORS:
+                conn.close()
+                if not reused or attempt:
+                    raise
+            except BaseException:
+                conn.close()
+                raise
+
+    def _host_key(self, parsed) -> Tuple[str, str, int]:
+        port = parsed.port or (443 if parsed.scheme == 'https' else 80)
+        return parsed.scheme, parsed.hostname, port
+
+    def _acquire(self, parsed, timeout: float):
+        key = self._host_key(parsed)
+        with self._lock:
+            idle = self._idle.get(key)
+            conn = idle.pop() if idle else None
+        if conn is not None:
+            conn.timeout = timeout
+            if conn.sock is not None:
+                conn.sock.settimeout(timeout)
+            return conn, True
+        scheme, host, port = key
+        conn_class = http.client.HTTPSConnection if scheme == 'https' else http.client.HTTPConnection
+        return conn_class(host, port, timeout=timeout), False
+
+    def _release(self, url: str, conn: http.client.HTTPConnection):
+        """Return a connection whose response was fully read to the idle pool"""
+        if conn.sock is None:
+            return  # Server asked to close the connection
+        key = self._host_key(urllib.parse.urlsplit(url))
+        with self._lock:
+            idle = self._idle.setdefault(key, [])
+            if len(idle) < self.max_idle_per_host:
+                idle.append(conn)
+                return
+        conn.close()
@@ -0,0 +1,338 @@
+"""
+Metadata Columns
+Columnar copies of the generation parameters with sorted indexes, for
+range/equality filters and facet counts without scanning metadata dicts
+"""
+
+import bisect
+import math
+from array import array
+from collections import Counter
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+from typing import Optional, Dict, Any, List, Iterable, Tuple
+
+NUMERIC_FIELDS = ('width', 'height', 'steps', 'cfg', 'shift', 'seed', 'timestamp')
+BOOL_FIELDS = ('use_image', 'mcnl_lora', 'snofs_lora', 'male_lora')
+COLUMN_FIELDS = NUMERIC_FIELDS + BOOL_FIELDS
+FILTER_FIELDS = COLUMN_FIELDS + ('folder',)
+FACET_FIELDS = ('width', 'height', 'steps', 'cfg', 'shift', 'date', 'folder') + BOOL_FIELDS
+MAX_FACET_VALUES = 50
+MISSING = math.nan
+DAY_SECONDS = 86400
+
+
+def timestamp_value(value: Any) -> float:
+    """
+    Convert an ISO timestamp (as stored in metadata) to seconds
+
+    Naive local times are read as if they were UTC, so whole days line up
+    with local calendar days without timezone lookups.
+    """
+    moment = datetime.fromisoformat(str(value))
+    if moment.tzinfo is not None:
+        moment = moment.astimezone().replace(tzinfo=None)
+    return moment.replace(tzinfo=timezone.utc).timestamp()
+
+
+def _column_value(field: str, value: Any) -> float:
+    if value is None or value == '':
+        return MISSING
+    try:
+        if field == 'timestamp':
+            return timestamp_value(value)
+        return float(value)
+    except (TypeError, ValueError):
+        return MISSING
+
+
+def _normalize_folder(folder: Any) -> str:
+    return str(folder or '').replace('\\', '/').strip('/')
+
+
+def _filter_bound(field: str, value: Any) -> float:
+    """Convert a filter bound from the API (numbers, booleans, ISO dates) to a column value"""
+    if field in BOOL_FIELDS:
+        if isinstance(value, str):
+            return 1.0 if value.strip().lower() in ('true', 'yes', '1', 'on') else 0.0
+        return 1.0 if value else 0.0
+    if field == 'timestamp':
+        try:
+            return timestamp_value(value)
+        except ValueError:
+            raise ValueError(f"timestamp bounds must be ISO dates, got {value!r}")
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        raise ValueError(f"{field} filter must be numeric, got {value!r}")
+
+
+def parse_since(value: str) -> float:
+    """Convert a relative age like '7d', '12h' or '30m' to a timestamp lower bound"""
+    text = str(value).strip().lower()
+    units = {'d': 'days', 'h': 'hours', 'm': 'minutes', 'w': 'weeks'}
+    try:
+        amount = float(text[:-1])
+        unit = units[text[-1]]
+    except (KeyError, ValueError, IndexError):
+        raise ValueError(f"since must look like 7d, 12h, 30m or 2w, got {value!r}")
+    moment = datetime.now() - timedelta(**{unit: amount})
+    return moment.replace(tzinfo=timezone.utc).timestamp()
+
+
+def normalize_filters(filters: Dict[str, Any]) -> List[Tuple[str, str, Any]]:
+    """
+    Validate API filters
+
+    Args:
+        filters: Field -> value (equality), [values] (any of), or {'min', 'max'}
+                 (inclusive range); 'timestamp' also accepts {'since': '7d'};
+                 'folder' matches a folder and its subfolders unless
+                 'folder_recursive' is false
+
+    Returns:
+        ('range', field, (low, high)), ('in', field, [values]) or
+        ('folder', folder, recursive) tuples
+
+    Raises:
+        ValueError: For unknown fields or invalid values
+    """
+    normalized = []
+    recursive = filters.get('folder_recursive', True)
+    if isinstance(recursive, str):
+        recursive = recursive.strip().lower() not in ('false', '0', 'no')
+    for field, spec in filters.items():
+        if field == 'folder_recursive' or spec is None:
+            continue
+        if field not in FILTER_FIELDS:
+            raise ValueError(f"Unknown filter field: {field}")
+        if field == 'folder':
+            normalized.append(('folder', _normalize_folder(spec), bool(recursive)))
+        elif isinstance(spec, dict):
+            unknown = set(spec) - {'min', 'max', 'since'}
+            if unknown:
+                raise ValueError(f"Unknown range keys for {field}: {', '.join(sorted(unknown))}")
+            low = _filter_bound(field, spec['min']) if spec.get('min') is not None else -math.inf
+            high = _filter_bound(field, spec['max']) if spec.get('max') is not None else math.inf
+            if spec.get('since') is not None:
+                if field != 'timestamp':
+                    raise ValueError("'since' only applies to timestamp")
+                low = max(low, parse_since(spec['since']))
+            if field == 'timestamp' and isinstance(spec.get('max'), str) and len(spec['max']) == 10:
+                high += DAY_SECONDS - 1e-6  # A bare date includes that whole day
+            normalized.append(('range', field, (low, high)))
+        elif isinstance(spec, list):
+            if not spec:
+                raise ValueError(f"{field} filter has no values")
+            normalized.append(('in', field, sorted({_filter_bound(field, value) for value in spec})))
+        else:
+            value = _filter_bound(field, spec)
+            normalized.append(('range', field, (value, value)))
+    return normalized
+
+
+class ColumnStore:
+    """
+    Per-field columns indexed by document number, plus a sorted
+    (value, document) index per field and document lists per folder
+
+    Document numbers come from the owner (SearchIndex) and only grow.
+    """
+
+    def __init__(self, root: Optional[Path] = None):
+        """
+        Initialize the store
+
+        Args:
+            root: Outputs root; an entry's folder is its path's parent relative
+                  to it (falling back to the entry's subfolder)
+        """
+        self.root = Path(root) if root is not None else None
+        self.columns: Dict[str, array] = {field: array('d') for field in COLUMN_FIELDS}
+        self._sorted: Dict[str, Tuple[array, array]] = {field: (array('d'), array('I')) for field in COLUMN_FIELDS}
+        self._folder_ids: Dict[str, int] = {}
+        self.folder_names: List[str] = []
+        self.folder_column = array('I')
+        self._folder_docs: List[array] = []
+        self._bulk = False
+
+    def begin_bulk(self):
+        """Defer sorted-index maintenance while many documents are added (see end_bulk)"""
+        self._bulk = True
+
+    def end_bulk(self):
+        """Build the sorted indexes for everything added since begin_bulk with one sort per field"""
+        self._bulk = False
+        for field in COLUMN_FIELDS:
+            column = self.columns[field]
+            present = [number for number, value in enumerate(column) if not math.isnan(value)]
+            present.sort(key=column.__getitem__)  # Stable, so equal values stay in document order
+            self._sorted[field] = (array('d', map(column.__getitem__, present)), array('I', present))
+
+    def add(self, number: int, entry: Dict[str, Any]):
+        """Append a document (number must be the next document number)"""
+        for field in COLUMN_FIELDS:
+            value = _column_value(field, entry.get(field))
+            self.columns[field].append(value)
+            if not self._bulk and not math.isnan(value):
+                values, docs = self._sorted[field]
+                position = bisect.bisect_right(values, value)
+                values.insert(position, value)
+                docs.insert(position, number)
+
+        folder = self._folder_of(entry)
+        folder_id = self._folder_ids.get(folder)
+        if folder_id is None:
+            folder_id = len(self.folder_names)
+            self._folder_ids[folder] = folder_id
+            self.folder_names.append(folder)
+            self._folder_docs.append(array('I'))
+        self.folder_column.append(folder_id)
+        self._folder_docs[folder_id].append(number)
+
+    def _folder_of(self, entry: Dict[str, Any]) -> str:
+        if self.root is not None and entry.get('path'):
+            try:
+                return _normalize_folder(Path(entry['path']).parent.relative_to(self.root).as_posix().lstrip('.'))
+            except ValueError:
+                pass
+        return _normalize_folder(entry.get('subfolder'))
+
+    def remove(self, number: int):
+        """Drop a document from the indexes (its column slots become missing)"""
+        for field in COLUMN_FIELDS:
+            column = self.columns[field]
+            value = column[number]
+            if math.isnan(value):
+                continue
+            values, docs = self._sorted[field]
+            low = bisect.bisect_left(values, value)
+            high = bisect.bisect_right(values, value)
+            # Equal values are ordered by document number
+            position = low + bisect.bisect_left(docs[low:high], number)
+            if position < high and docs[position] == number:
+                del values[position]
+                del docs[position]
+            column[number] = MISSING
+
+        folder_docs = self._folder_docs[self.folder_column[number]]
+        position = bisect.bisect_left(folder_docs, number)
+        if position < len(folder_docs) and folder_docs[position] == number:
+            del folder_docs[position]
+
+    def match(self, filters: List[Tuple[str, str, Any]], candidates: Optional[Iterable[int]] = None) -> List[int]:
+        """
+        Document numbers passing every filter
+
+        The most selective filter (sized with binary searches) produces the
+        starting documents; the others are checked against the columns.
+
+        Args:
+            filters: Output of normalize_filters()
+            candidates: Restrict to these documents (e.g. text search matches)
+
+        Returns:
+            Matching document numbers in ascending order
+        """
+        plans = [self._plan(kind, field, spec) for kind, field, spec in filters]
+        plans.sort(key=lambda plan: plan[0])
+        if candidates is not None:
+            numbers = sorted(candidates)
+        elif plans:
+            numbers = sorted(plans.pop(0)[1]())
+        else:
+            return []
+        for _size, _docs, test in plans:
+            numbers = [number for number in numbers if test(number)]
+        return numbers
+
+    def facets(self, numbers: List[int], fields: Iterable[str]) -> Dict[str, List[Dict[str, Any]]]:
+        """
+        Count values of each facet field over the given documents
+
+        Returns:
+            Field -> [{'value', 'count'}] with the most common values first
+        """
+        result = {}
+        for field in fields:
+            if field not in FACET_FIELDS:
+                raise ValueError(f"Unknown facet field: {field}")
+            if field == 'folder':
+                names = self.folder_names
+                column = self.folder_column
+                counts = Counter(names[folder_id] for folder_id in map(column.__getitem__, numbers))
+            elif field == 'date':
+                column = self.columns['timestamp']
+                days = Counter(int(value // DAY_SECONDS) for value in map(column.__getitem__, numbers) if not math.isnan(value))
+                counts = Counter({
+                    datetime.fromtimestamp(day * DAY_SECONDS, timezone.utc).date().isoformat(): count
+                    for day, count in days.items()
+                })
+            else:
+                column = self.columns[field]
+                raw = Counter(map(column.__getitem__, numbers))
+                counts = Counter()
+                for value, count in raw.items():
+                    if math.isnan(value):
+                        continue
+                    if field in BOOL_FIELDS:
+                        value = bool(value)
+                    elif value.is_integer() and field in ('width', 'height', 'steps'):
+                        value = int(value)
+                    counts[value] += count
+            if field == 'date':
+                ordered = sorted(counts.items(), reverse=True)[:MAX_FACET_VALUES]  # Most recent days
+            else:
+                ordered = counts.most_common(MAX_FACET_VALUES)
+            result[field] = [{'value': value, 'count': count} for value, count in ordered]
+        return result
+
+    def sort_key(self, field: str):
+        """Key function ordering documents by a column (missing values last when descending)"""
+        if field not in COLUMN_FIELDS:
+            raise ValueError(f"Cannot sort by {field}")
+        column = self.columns[field]
+
+        def key(number):
+            value = column[number]
+            return -math.inf if math.isnan(value) else value
+        return key
+
+    def _plan(self, kind: str, field: str, spec: Any):
+        """(estimated size, produce documents, test one document) for a filter"""
+        if kind == 'folder':
+            return self._folder_plan(field, spec)  # ('folder', folder, recursive)
+
+        values, docs = self._sorted[field]
+        column = self.columns[field]
+        if kind == 'in':
+            spans = [(bisect.bisect_left(values, value), bisect.bisect_right(values, value)) for value in spec]
+            allowed = set(spec)
+
+            def produce():
+                found = array('I')
+                for low, high in spans:
+                    found.extend(docs[low:high])
+                return found
+            return sum(high - low for low, high in spans), produce, lambda number: column[number] in allowed
+
+        low_value, high_value = spec
+        low = bisect.bisect_left(values, low_value)
+        high = bisect.bisect_right(values, high_value)
+        return high - low, lambda: docs[low:high], lambda number: low_value <= column[number] <= high_value
+
+    def _folder_plan(self, folder: str, recursive: bool):
+        prefix = folder + '/'
+        folder_ids = {
+            folder_id for name, folder_id in self._folder_ids.items()
+            if name == folder or (recursive and (not folder or name.startswith(prefix)))
+        }
+        column = self.folder_column
+
+        def produce():
+            found = array('I')
+            for folder_id in folder_ids:
+                found.extend(self._folder_docs[folder_id])
+            return found
+        size = sum(len(self._folder_docs[folder_id]) for folder_id in folder_ids)
+        return size, produce, lambda number: column[number] in folder_ids
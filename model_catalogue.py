@@ -0,0 +1,149 @@
+"""
+AI Model Catalogue
+Background-refreshed list of available models per provider with
+stale-while-revalidate reads and negative caching of unreachable providers
+"""
+
+import threading
+import time
+from typing import Callable, Dict, Any, List, Optional
+
+
+class ModelCatalogue:
+    """In-memory model list that is refreshed in the background, never on the request path"""
+
+    def __init__(
+        self,
+        fetchers: Dict[str, Callable[[], List[Dict[str, Any]]]],
+        refresh_interval: float = 60,
+        failure_backoff: float = 15,
+        max_failure_backoff: float = 300
+    ):
+        """
+        Initialize the catalogue
+
+        Args:
+            fetchers: Provider name -> callable returning a list of model dicts (each with a 'name');
+                      the callable raises when the provider is unreachable
+            refresh_interval: Seconds before a successful listing is considered stale
+            failure_backoff: Seconds to wait before retrying an unreachable provider
+            max_failure_backoff: Upper bound for the doubling retry delay
+        """
+        self.fetchers = fetchers
+        self.refresh_interval = refresh_interval
+        self.failure_backoff = failure_backoff
+        self.max_failure_backoff = max_failure_backoff
+        self._entries: Dict[str, Dict[str, Any]] = {
+            provider: {
+                'models': [],
+                'fetched_at': None,
+                'error': None,
+                'failures': 0,
+                'retry_at': 0.0,
+                'invalidated': False,
+                'refreshing': False
+            }
+            for provider in fetchers
+        }
+        self._lock = threading.Lock()
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self):
+        """Fetch every provider now and keep refreshing in a daemon thread"""
+        if self._thread is not None:
+            return
+        self._thread = threading.Thread(target=self._refresh_loop, daemon=True)
+        self._thread.start()
+
+    def snapshot(self) -> Dict[str, Any]:
+        """
+        Get the current catalogue without blocking
+
+        Stale providers are revalidated in the background; the last known
+        listing is returned meanwhile.
+
+        Returns:
+            Dict with 'models' (provider -> names), 'details' (provider -> model dicts)
+            and 'status' (provider -> freshness info)
+        """
+        now = time.time()
+        models, details, status = {}, {}, {}
+        due = []
+        with self._lock:
+            for provider, entry in self._entries.items():
+                fetched_at = entry['fetched_at']
+                stale = (
+                    fetched_at is None
+                    or now - fetched_at > self.refresh_interval
+                    or entry['error'] is not None
+                    or entry['invalidated']
+                )
+                if stale and not entry['refreshing'] and now >= entry['retry_at']:
+                    entry['refreshing'] = True
+                    due.append(provider)
+                models[provider] = [m['name'] for m in entry['models']]
+                details[provider] = list(entry['models'])
+                status[provider] = {
+                    'loaded': fetched_at is not None,
+                    'stale': stale,
+                    'age_seconds': round(now - fetched_at, 1) if fetched_at is not None else None,
+                    'error': entry['error'],
+                    'retry_in_seconds': max(0, round(entry['retry_at'] - now, 1)) if entry['error'] else 0
+                }
+        for provider in due:
+            threading.Thread(target=self._refresh, args=(provider,), daemon=True).start()
+        return {'models': models, 'details': details, 'status': status}
+
+    def invalidate(self, provider: Optional[str] = None):
+        """Mark one or all providers stale so the next read revalidates them (ignores backoff)"""
+        with self._lock:
+            for name, entry in self._entries.items():
+                if provider is None or name == provider:
+                    entry['invalidated'] = True
+                    entry['retry_at'] = 0.0
+
+    def refresh_now(self, provider: str):
+        """Fetch one provider synchronously (used by the background loop)"""
+        with self._lock:
+            entry = self._entries[provider]
+            if entry['refreshing']:
+                return
+            entry['refreshing'] = True
+        self._refresh(provider)
+
+    def _refresh(self, provider: str):
+        try:
+            models = self.fetchers[provider]()
+        except Exception as e:
+            with self._lock:
+                entry = self._entries[provider]
+                entry['failures'] += 1
+                delay = min(self.max_failure_backoff, self.failure_backoff * 2 ** (entry['failures'] - 1))
+                entry['retry_at'] = time.time() + delay
+                entry['error'] = str(e)
+                entry['refreshing'] = False
+            print(f"Model catalogue: {provider} unreachable, retrying in {delay:.0f}s ({e})")
+            return
+
+        with self._lock:
+            entry = self._entries[provider]
+            entry['models'] = models
+            entry['fetched_at'] = time.time()
+            entry['error'] = None
+            entry['failures'] = 0
+            entry['retry_at'] = 0.0
+            entry['invalidated'] = False
+            entry['refreshing'] = False
+
+    def _refresh_loop(self):
+        while True:
+            now = time.time()
+            for provider in list(self.fetchers):
+                with self._lock:
+                    entry = self._entries[provider]
+                    fetched_at = entry['fetched_at']
+                    expired = fetched_at is None or now - fetched_at >= self.refresh_interval or entry['invalidated']
+                    due = expired and now >= entry['retry_at']
+                if due:
+                    self.refresh_now(provider)
+            time.sleep(1)
@@ -0,0 +1,151 @@
+"""
+Ollama Model Residency
+Keeps recently used Ollama models warm and releases them when ComfyUI needs the memory
+"""
+
+import threading
+import time
+from typing import Optional, Dict, Any, Union
+from llm_transport import LLMTransport
+
+
+class OllamaResidency:
+    """Tracks which Ollama models are resident and decides their keep_alive"""
+
+    def __init__(
+        self,
+        ollama_url: str = "http://127.0.0.1:11434",
+        keep_alive_seconds: int = 300,
+        transport: Optional[LLMTransport] = None
+    ):
+        """
+        Initialize the residency manager
+
+        Args:
+            ollama_url: Ollama server URL
+            keep_alive_seconds: How long a model stays loaded after its last use (0 unloads immediately)
+            transport: Shared HTTP transport (a private one is created if omitted)
+        """
+        self.ollama_url = ollama_url
+        self.keep_alive_seconds = keep_alive_seconds
+        self.transport = transport if transport is not None else LLMTransport()
+        self._warm: Dict[str, float] = {}  # model -> time of last use
+        self._image_queue_active = False
+        self._lock = threading.Lock()
+
+    def keep_alive_for(self, model: str) -> Union[int, str]:
+        """
+        Get the keep_alive value to send with a request for this model
+
+        While the image queue is running the model is released right after
+        the request, so the LLM never holds VRAM the diffusion model needs.
+        """
+        with self._lock:
+            if self._image_queue_active or self.keep_alive_seconds <= 0:
+                return 0
+            return f"{self.keep_alive_seconds}s"
+
+    def touch(self, model: str):
+        """Record that a model was just used with keep_alive_for()"""
+        with self._lock:
+            if self._image_queue_active or self.keep_alive_seconds <= 0:
+                self._warm.pop(model, None)
+            else:
+                self._warm[model] = time.time()
+
+    def prewarm(self, model: str) -> bool:
+        """
+        Load a model in the background so the first request doesn't pay the load time
+
+        Returns:
+            True if a warm-up was started, False if skipped
+        """
+        with self._lock:
+            if self._image_queue_active or self.keep_alive_seconds <= 0:
+                return False
+            last_used = self._warm.get(model)
+            if last_used is not None and time.time() - last_used < self.keep_alive_seconds:
+                return False
+            # Mark as warm up front so repeated panel opens don't stack requests
+            self._warm[model] = time.time()
+
+        threading.Thread(target=self._load, args=(model,), daemon=True).start()
+        return True
+
+    def unload(self, model: str):
+        """Unload a model from Ollama immediately"""
+        with self._lock:
+            self._warm.pop(model, None)
+        self._post_generate({'model': model, 'keep_alive': 0}, timeout=5)
+
+    def release_all(self) -> int:
+        """
+        Unload every model we believe is still resident
+
+        Returns:
+            Number of models unloaded
+        """
+        with self._lock:
+            models = list(self._resident_models())
+            self._warm.clear()
+        for model in models:
+            self._post_generate({'model': model, 'keep_alive': 0}, timeout=5)
+        if models:
+            print(f"Released Ollama models for ComfyUI: {', '.join(models)}")
+        return len(models)
+
+    def set_image_queue_active(self, active: bool):
+        """
+        Coordinate with the image queue
+
+        When the queue starts working, resident LLMs are unloaded so ComfyUI
+        gets the VRAM; while it runs, LLM requests unload right after use.
+        """
+        with self._lock:
+            changed = active != self._image_queue_active
+            self._image_queue_active = active
+        if changed and active:
+            self.release_all()
+
+    def status(self) -> Dict[str, Any]:
+        """Get resident models and their remaining keep-alive time"""
+        now = time.time()
+        with self._lock:
+            models = [
+                {
+                    'model': model,
+                    'expires_in_seconds': max(0, int(self._warm[model] + self.keep_alive_seconds - now))
+                }
+                for model in self._resident_models(now)
+            ]
+            return {
+                'keep_alive_seconds': self.keep_alive_seconds,
+                'image_queue_active': self._image_queue_active,
+                'models': models
+            }
+
+    def _resident_models(self, now: float = None):
+        """Models whose keep-alive window has not elapsed (caller holds the lock)"""
+        now = now if now is not None else time.time()
+        for model, last_used in list(self._warm.items()):
+            if now - last_used < self.keep_alive_seconds:
+                yield model
+            else:
+                # Ollama has unloaded it on its own by now
+                del self._warm[model]
+
+    def _load(self, model: str):
+        # A generate request without a prompt only loads the model
+        if not self._post_generate({'model': model, 'keep_alive': self.keep_alive_for(model)}, timeout=120):
+            with self._lock:
+                self._warm.pop(model, None)
+
+    def _post_generate(self, data: Dict[str, Any], timeout: float) -> bool:
+        try:
+            # Load/unload requests bypass the concurrency limit so they never queue behind generations
+            self.transport.post_json('ollama', f"{self.ollama_url}/api/generate", data, timeout=timeout, limit=False)
+            return True
+        except Exception as e:
+            action = 'unload' if data.get('keep_alive') == 0 else 'load'
+            print(f"Warning: Could not {action} model {data.get('model')}: {e}")
+            return False
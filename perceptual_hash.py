@@ -0,0 +1,230 @@
+"""
+Perceptual Hash
+64-bit difference hashes (dHash) of images and a BK-tree for finding
+near-duplicates within a Hamming radius
+"""
+
+import threading
+from typing import Optional, Dict, Any, List, Callable, Iterable, Tuple
+
+from postprocess import process_context
+
+HASH_SIZE = 8  # 8x8 gradient bits = 64-bit hash
+DEFAULT_RADIUS = 6  # Bits that may differ for two images to count as near-duplicates
+INLINE_HASH_LIMIT = 16  # Hash this many files or fewer without starting a pool
+
+if hasattr(int, 'bit_count'):
+    def hamming(a: int, b: int) -> int:
+        return (a ^ b).bit_count()
+else:  # Python < 3.10
+    def hamming(a: int, b: int) -> int:
+        return bin(a ^ b).count('1')
+
+
+def dhash(path, size: int = HASH_SIZE) -> str:
+    """
+    Compute the difference hash of an image (requires Pillow; uses NumPy when installed)
+
+    The image is reduced to (size + 1) x size grayscale pixels and each bit
+    records whether a pixel is brighter than its right neighbour.
+
+    Returns:
+        Hash as a hex string (16 characters for the default size)
+    """
+    from PIL import Image
+    with Image.open(path) as img:
+        img.draft('L', (size * 8, size * 8))  # Lets JPEG decode at reduced size
+        small = img.convert('L').resize((size + 1, size), Image.BILINEAR, reducing_gap=2.0)
+    try:
+        import numpy as np
+    except ImportError:
+        pixels = list(small.getdata())
+        value = 0
+        for row in range(size):
+            offset = row * (size + 1)
+            for col in range(size):
+                value = (value << 1) | (pixels[offset + col + 1] > pixels[offset + col])
+    else:
+        pixels = np.asarray(small, dtype=np.int16)
+        bits = (pixels[:, 1:] > pixels[:, :-1]).flatten()
+        value = int.from_bytes(np.packbits(bits).tobytes(), 'big')
+    return f"{value:0{size * size // 4}x}"
+
+
+def _hash_file(path: str) -> Tuple[str, Optional[str], Optional[str]]:
+    """Worker: hash one file as (path, hash, error)"""
+    try:
+        return path, dhash(path), None
+    except (OSError, ValueError) as e:
+        return path, None, str(e)
+
+
+def hash_files(paths: List[str], processes: int = 4) -> List[Tuple[str, Optional[str], Optional[str]]]:
+    """Hash many images, in a process pool when there are enough of them"""
+    if len(paths) <= INLINE_HASH_LIMIT or processes <= 1:
+        return [_hash_file(path) for path in paths]
+    chunksize = max(1, min(64, len(paths) // (processes * 4)))
+    with process_context().Pool(processes) as pool:
+        return list(pool.imap_unordered(_hash_file, paths, chunksize=chunksize))
+
+
+class BKTree:
+    """
+    Metric tree over integer hashes with Hamming distance
+
+    Each node holds one hash, the ids sharing it and children keyed by their
+    distance to the node. A radius query only descends into children whose
+    key lies within radius of the query's distance to the node.
+    """
+
+    def __init__(self):
+        self._root: Optional[list] = None  # [hash, ids, {distance: child}]
+        self._nodes: Dict[int, list] = {}  # hash -> node, for direct updates
+        self.size = 0
+
+    def add(self, value: int, item_id: str):
+        node = self._nodes.get(value)
+        if node is not None:
+            node[1].append(item_id)
+            self.size += 1
+            return
+        new = [value, [item_id], {}]
+        self._nodes[value] = new
+        self.size += 1
+        if self._root is None:
+            self._root = new
+            return
+        node = self._root
+        while True:
+            distance = hamming(value, node[0])
+            child = node[2].get(distance)
+            if child is None:
+                node[2][distance] = new
+                return
+            node = child
+
+    def remove(self, value: int, item_id: str):
+        """Drop an id; its node stays in place to route searches"""
+        node = self._nodes.get(value)
+        if node is not None and item_id in node[1]:
+            node[1].remove(item_id)
+            self.size -= 1
+
+    def search(self, value: int, radius: int) -> List[Tuple[int, str]]:
+        """Get (distance, id) pairs within radius, nearest first"""
+        found = []
+        stack = [self._root] if self._root is not None else []
+        while stack:
+            node = stack.pop()
+            distance = hamming(value, node[0])
+            if distance <= radius:
+                found.extend((distance, item_id) for item_id in node[1])
+            low, high = distance - radius, distance + radius
+            stack.extend(child for key, child in node[2].items() if low <= key <= high)
+        found.sort()
+        return found
+
+
+class SimilarityIndex:
+    """Near-duplicate lookups over the 'dhash' values of metadata entries"""
+
+    def __init__(self, loader: Callable[[], Iterable[Dict[str, Any]]]):
+        """
+        Initialize the index
+
+        Args:
+            loader: Returns all metadata entries; called to build the tree on first use
+        """
+        self.loader = loader
+        self._lock = threading.RLock()
+        self._tree: Optional[BKTree] = None
+        self._hashes: Dict[str, int] = {}  # Entry id -> hash
+
+    def rebuild(self, entries: Optional[Iterable[Dict[str, Any]]] = None):
+        with self._lock:
+            self._tree = BKTree()
+            self._hashes = {}
+            for entry in (self.loader() if entries is None else entries):
+                if entry.get('dhash') and entry.get('id'):
+                    self._insert(entry['id'], entry['dhash'])
+
+    def add(self, entry_id: str, hash_hex: str):
+        """Add or replace the hash of an entry"""
+        with self._lock:
+            if self._tree is None:
+                return  # Loaded with everything else on first use
+            self.remove(entry_id)
+            self._insert(entry_id, hash_hex)
+
+    def remove(self, entry_id: str):
+        with self._lock:
+            value = self._hashes.pop(entry_id, None)
+            if value is not None and self._tree is not None:
+                self._tree.remove(value, entry_id)
+
+    def hash_of(self, entry_id: str) -> Optional[int]:
+        with self._lock:
+            self._ensure_built()
+            return self._hashes.get(entry_id)
+
+    def similar(self, entry_id: str, radius: int = DEFAULT_RADIUS) -> Optional[List[Tuple[int, str]]]:
+        """
+        Get entries whose hash is within radius of this entry's hash
+
+        Returns:
+            (distance, id) pairs nearest first, excluding the entry itself,
+            or None if the entry has no hash
+        """
+        with self._lock:
+            self._ensure_built()
+            value = self._hashes.get(entry_id)
+            if value is None:
+                return None
+            return [(distance, other) for distance, other in self._tree.search(value, radius) if other != entry_id]
+
+    def collapse(self, entry_ids: List[str], radius: int = DEFAULT_RADIUS) -> List[Dict[str, Any]]:
+        """
+        Group near-duplicates among the given entries
+
+        Entries are taken in order (e.g. newest first); each one that is not
+        yet grouped becomes the representative of a group holding every
+        ungrouped entry within radius of it.
+
+        Returns:
+            [{'id', 'duplicates': [(distance, id), ...]}] in input order;
+            entries without a hash form their own group
+        """
+        members = set(entry_ids)
+        grouped = set()
+        groups = []
+        with self._lock:
+            self._ensure_built()
+            for entry_id in entry_ids:
+                if entry_id in grouped:
+                    continue
+                grouped.add(entry_id)
+                duplicates = []
+                value = self._hashes.get(entry_id)
+                if value is not None:
+                    for distance, other in self._tree.search(value, radius):
+                        if other in members and other not in grouped:
+                            grouped.add(other)
+                            duplicates.append((distance, other))
+                groups.append({'id': entry_id, 'duplicates': duplicates})
+        return groups
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {'built': self._tree is not None, 'hashed': len(self._hashes)}
+
+    def _ensure_built(self):
+        if self._tree is None:
+            self.rebuild()
+
+    def _insert(self, entry_id: str, hash_hex: str):
+        try:
+            value = int(hash_hex, 16)
+        except (TypeError, ValueError):
+            return
+        self._hashes[entry_id] = value
+        self._tree.add(value, entry_id)
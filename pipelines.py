@@ -0,0 +1,260 @@
+"""
+Job Pipelines
+Validates declarative job graphs and holds dependent jobs back until the jobs
+they depend on have finished
+"""
+
+from collections import deque
+from datetime import datetime
+from typing import Optional, Dict, Any, List, Tuple, Callable, Iterable
+
+MAX_PIPELINE_STEPS = 64
+
+
+def plan_pipeline(steps: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """
+    Validate pipeline steps and put them in dependency order
+
+    Each step is a dict of job parameters plus an optional 'name' (default
+    'step<n>'), 'image_from' (name of the step whose output becomes this
+    step's input image) and 'after' (names of steps that must finish first).
+
+    Args:
+        steps: Steps as sent by the client
+
+    Returns:
+        The steps in an order where every step follows the steps it depends
+        on, each with 'name' and 'parents' (names, image_from first) set
+
+    Raises:
+        ValueError: If a step is malformed, refers to an unknown step or the
+                    dependencies contain a cycle
+    """
+    if not isinstance(steps, list) or not steps:
+        raise ValueError('A pipeline needs a list of steps')
+    if len(steps) > MAX_PIPELINE_STEPS:
+        raise ValueError(f"A pipeline has at most {MAX_PIPELINE_STEPS} steps")
+
+    planned = {}
+    for position, step in enumerate(steps):
+        if not isinstance(step, dict):
+            raise ValueError(f"Step {position + 1} must be an object")
+        name = str(step.get('name') or f"step{position + 1}")
+        if name in planned:
+            raise ValueError(f"Duplicate step name '{name}'")
+        after = step.get('after') or []
+        if isinstance(after, str):
+            after = [after]
+        image_from = step.get('image_from')
+        if image_from is not None and step.get('image_filename'):
+            raise ValueError(f"Step '{name}' sets both image_filename and image_from")
+        parents = [str(image_from)] if image_from is not None else []
+        parents += [str(parent) for parent in after if str(parent) not in parents]
+        planned[name] = {**step, 'name': name, 'parents': parents}
+
+    for name, step in planned.items():
+        for parent in step['parents']:
+            if parent == name:
+                raise ValueError(f"Step '{name}' depends on itself")
+            if parent not in planned:
+                raise ValueError(f"Step '{name}' depends on unknown step '{parent}'")
+
+    # Kahn's algorithm, keeping the client's order among independent steps
+    remaining = {name: len(step['parents']) for name, step in planned.items()}
+    children = {name: [] for name in planned}
+    for name, step in planned.items():
+        for parent in step['parents']:
+            children[parent].append(name)
+    ready = deque(name for name, count in remaining.items() if count == 0)
+    order = []
+    while ready:
+        name = ready.popleft()
+        order.append(planned[name])
+        for child in children[name]:
+            remaining[child] -= 1
+            if remaining[child] == 0:
+                ready.append(child)
+    if len(order) < len(planned):
+        cycle = [name for name, count in remaining.items() if count > 0]
+        raise ValueError(f"Pipeline steps depend on each other in a cycle: {', '.join(cycle)}")
+    return order
+
+
+class PipelineGraph:
+    """
+    Jobs waiting for other jobs to finish
+
+    A waiting job carries 'depends_on' (parent job ids) and optionally
+    'image_from' (the parent whose output becomes its input image). finish()
+    releases the dependents of a job once all their parents are done, or
+    fails them, and everything that depends on them, when a parent failed.
+    Not thread-safe: callers hold the queue lock.
+    """
+
+    def __init__(self):
+        self._waiting: Dict[str, Any] = {}  # Job id -> job, in the order they were added
+        self._blocked: Dict[str, set] = {}  # Job id -> ids of parents that have not finished
+        self._dependents: Dict[str, List[str]] = {}  # Parent id -> waiting job ids
+
+    def __len__(self) -> int:
+        return len(self._waiting)
+
+    def __contains__(self, job_id: str) -> bool:
+        return job_id in self._waiting
+
+    def get(self, job_id: str) -> Optional[Dict[str, Any]]:
+        return self._waiting.get(job_id)
+
+    def jobs(self) -> List[Dict[str, Any]]:
+        """Get the waiting jobs, oldest first"""
+        return list(self._waiting.values())
+
+    def has_dependents(self, job_id: str) -> bool:
+        return bool(self._dependents.get(job_id))
+
+    def add(self, job: Dict[str, Any], pending: Iterable[str]):
+        """
+        Hold a job back until the given parents have finished
+
+        Args:
+            job: Job with 'depends_on' set
+            pending: Ids of its parents that are still queued or waiting
+        """
+        job['status'] = 'waiting'
+        self._waiting[job['id']] = job
+        self._blocked[job['id']] = set(pending)
+        for parent in self._blocked[job['id']]:
+            self._dependents.setdefault(parent, []).append(job['id'])
+
+    def restore(self, jobs: Iterable[Dict[str, Any]], is_queued: Callable[[str], bool]) -> Tuple[List[Dict[str, Any]], List[Dict[str, Any]]]:
+        """
+        Re-add waiting jobs loaded from the saved queue state
+
+        Parents that are no longer queued or waiting count as finished.
+
+        Args:
+            jobs: Waiting jobs, parents before their dependents
+            is_queued: Whether a job id is in the queue
+
+        Returns:
+            (jobs ready to queue, jobs that lost the parent providing their input image, marked failed)
+        """
+        ready, failed = [], []
+        failed_ids = set()
+        for job in jobs:
+            parents = job.get('depends_on') or []
+            pending = [parent for parent in parents if parent in self._waiting or is_queued(parent)]
+            image_from = job.get('image_from')
+            failed_parent = next((parent for parent in parents if parent in failed_ids), None)
+            if failed_parent:
+                self._mark_failed(job, f"Depends on job {failed_parent}, which failed")
+            elif image_from and image_from not in pending and not job.get('image_filename'):
+                self._mark_failed(job, f"Job {image_from} that provides its input image is gone")
+            if job.get('status') == 'failed':
+                failed_ids.add(job['id'])
+                failed.append(job)
+            elif pending:
+                self.add(job, pending)
+            else:
+                job['status'] = 'queued'
+                ready.append(job)
+        return ready, failed
+
+    def finish(self, job: Dict[str, Any], attach_input: Callable[[Dict[str, Any], Dict[str, Any]], None]) -> Tuple[List[Dict[str, Any]], List[Dict[str, Any]]]:
+        """
+        Update the dependents of a job that has left the queue
+
+        Args:
+            job: The completed or failed job
+            attach_input: Called as attach_input(dependent, job) to hand the
+                          output to dependents with image_from set to this job;
+                          if it raises, the dependent fails
+
+        Returns:
+            (jobs ready to queue, jobs failed because of this job)
+        """
+        ready, failed = [], []
+        for child_id in self._dependents.pop(job['id'], []):
+            child = self._waiting.get(child_id)
+            if child is None:
+                continue  # Cancelled or failed through another parent
+            if job.get('status') != 'completed':
+                failed.extend(self._fail(child_id, f"Depends on job {job['id']}, which failed"))
+                continue
+            if child.get('image_from') == job['id']:
+                try:
+                    attach_input(child, job)
+                except Exception as e:
+                    failed.extend(self._fail(child_id, f"Could not hand over the output of job {job['id']}: {e}"))
+                    continue
+            blocked = self._blocked[child_id]
+            blocked.discard(job['id'])
+            if not blocked:
+                child = self._pop(child_id)
+                child['status'] = 'queued'
+                ready.append(child)
+        return ready, failed
+
+    def cancel(self, job_id: str) -> List[Dict[str, Any]]:
+        """
+        Remove a job's dependents (and the job itself if it is waiting), recursively
+
+        Returns:
+            The removed jobs
+        """
+        removed = []
+        if job_id in self._waiting:
+            removed.append(self._pop(job_id))
+        for descendant in self._descendants(job_id):
+            removed.append(self._pop(descendant))
+        self._dependents.pop(job_id, None)
+        return removed
+
+    def clear(self) -> List[Dict[str, Any]]:
+        """Remove every waiting job"""
+        removed = list(self._waiting.values())
+        self._waiting.clear()
+        self._blocked.clear()
+        self._dependents.clear()
+        return removed
+
+    def _fail(self, job_id: str, error: str) -> List[Dict[str, Any]]:
+        """Fail a waiting job and everything that depends on it"""
+        failed = [self._pop(job_id)]
+        self._mark_failed(failed[0], error)
+        for descendant in self._descendants(job_id):
+            job = self._pop(descendant)
+            self._mark_failed(job, f"Depends on job {job_id}, which failed")
+            failed.append(job)
+        self._dependents.pop(job_id, None)
+        return failed
+
+    def _descendants(self, job_id: str) -> List[str]:
+        """Ids of the waiting jobs that depend on a job, directly or not, parents first"""
+        found = []
+        seen = {job_id}
+        pending = deque(self._dependents.get(job_id, []))
+        while pending:
+            child = pending.popleft()
+            if child in seen or child not in self._waiting:
+                continue
+            seen.add(child)
+            found.append(child)
+            pending.extend(self._dependents.get(child, []))
+        return found
+
+    def _pop(self, job_id: str) -> Dict[str, Any]:
+        job = self._waiting.pop(job_id)
+        for parent in self._blocked.pop(job_id, ()):
+            siblings = self._dependents.get(parent)
+            if siblings and job_id in siblings:
+                siblings.remove(job_id)
+                if not siblings:
+                    del self._dependents[parent]
+        return job
+
+    @staticmethod
+    def _mark_failed(job: Dict[str, Any], error: str):
+        job['status'] = 'failed'
+        job['error'] = error
+        job['failed_at'] = datetime.now().isoformat()
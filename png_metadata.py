@@ -0,0 +1,240 @@
+"""
+PNG Metadata
+Embeds generation parameters in output PNGs (iTXt chunk) and rebuilds the
+metadata index from them by scanning outputs/ in parallel
+"""
+
+import json
+import os
+import struct
+import uuid
+import zlib
+from datetime import datetime
+from pathlib import Path
+from typing import Optional, Dict, Any, List, Tuple
+
+from postprocess import process_context
+
+PNG_SIGNATURE = b'\x89PNG\r\n\x1a\n'
+METADATA_KEYWORD = 'comfyui-webui'
+TEXT_CHUNKS = (b'tEXt', b'zTXt', b'iTXt')
+COMPRESS_ABOVE_BYTES = 2048
+INLINE_SCAN_LIMIT = 64  # Read this many files or fewer without starting a pool
+
+# Entry keys derived from where the file is, not stored in the file
+LOCATION_KEYS = ('path', 'filename', 'mtime')
+
+
+def _chunk(kind: bytes, data: bytes) -> bytes:
+    crc = zlib.crc32(kind + data) & 0xFFFFFFFF
+    return struct.pack('>I', len(data)) + kind + data + struct.pack('>I', crc)
+
+
+def _text_keyword(kind: bytes, data: bytes) -> str:
+    return data.split(b'\0', 1)[0].decode('latin-1')
+
+
+def _decode_text(kind: bytes, data: bytes) -> str:
+    """Get the text of a tEXt, zTXt or iTXt chunk"""
+    keyword, rest = data.split(b'\0', 1)
+    if kind == b'tEXt':
+        return rest.decode('latin-1')
+    if kind == b'zTXt':
+        return zlib.decompress(rest[1:]).decode('latin-1')
+    compressed, _method = rest[0], rest[1]
+    _language, _translated, text = rest[2:].split(b'\0', 2)
+    return (zlib.decompress(text) if compressed else text).decode('utf-8')
+
+
+def portable_metadata(entry: Dict[str, Any]) -> Dict[str, Any]:
+    """Get the parts of a metadata entry that travel with the file"""
+    return {key: value for key, value in entry.items() if key not in LOCATION_KEYS}
+
+
+def embed_metadata(data: bytes, metadata: Dict[str, Any]) -> bytes:
+    """
+    Add generation metadata to PNG bytes as an iTXt chunk
+
+    The chunk goes before the image data so readers can stop early; an
+    existing chunk with the same keyword is replaced. Other formats are
+    returned unchanged.
+
+    Args:
+        data: Complete PNG file contents
+        metadata: JSON-serializable parameters
+
+    Returns:
+        PNG bytes with the metadata chunk
+    """
+    if not data.startswith(PNG_SIGNATURE):
+        return data
+
+    text = json.dumps(metadata, ensure_ascii=False).encode('utf-8')
+    compressed = len(text) > COMPRESS_ABOVE_BYTES
+    if compressed:
+        text = zlib.compress(text)
+    chunk = _chunk(b'iTXt', METADATA_KEYWORD.encode('latin-1') + b'\0' + bytes([compressed, 0]) + b'\0\0' + text)
+
+    parts = [data[:8]]
+    offset = 8
+    inserted = False
+    while offset + 8 <= len(data):
+        length, kind = struct.unpack('>I4s', data[offset:offset + 8])
+        end = offset + 12 + length
+        if kind in TEXT_CHUNKS and _text_keyword(kind, data[offset + 8:end - 4]) == METADATA_KEYWORD:
+            offset = end
+            continue
+        if not inserted and kind in (b'IDAT', b'IEND'):
+            parts.append(chunk)
+            inserted = True
+        parts.append(data[offset:end])
+        offset = end
+        if kind == b'IEND':
+            break
+    if not inserted:
+        return data  # Malformed PNG; leave it alone
+    return b''.join(parts)
+
+
+def read_metadata(path) -> Optional[Dict[str, Any]]:
+    """
+    Read embedded generation metadata by walking the PNG's chunks
+
+    Pixel data is skipped with seeks, never read or decoded.
+
+    Returns:
+        The embedded dict, or None if the file has none
+
+    Raises:
+        ValueError: If the file is not a PNG or its chunks are corrupt
+    """
+    with open(path, 'rb') as f:
+        if f.read(8) != PNG_SIGNATURE:
+            raise ValueError('Not a PNG file')
+        while True:
+            header = f.read(8)
+            if len(header) < 8:
+                return None
+            length, kind = struct.unpack('>I4s', header)
+            if kind == b'IEND':
+                return None
+            if kind not in TEXT_CHUNKS:
+                f.seek(length + 4, os.SEEK_CUR)
+                continue
+            data = f.read(length)
+            f.seek(4, os.SEEK_CUR)
+            if len(data) < length:
+                raise ValueError('PNG is truncated')
+            if _text_keyword(kind, data) != METADATA_KEYWORD:
+                continue
+            try:
+                metadata = json.loads(_decode_text(kind, data))
+            except (ValueError, zlib.error) as e:
+                raise ValueError(f"Corrupt metadata chunk: {e}")
+            return metadata if isinstance(metadata, dict) else None
+
+
+def _scan_file(path: str) -> Tuple[str, Optional[Dict[str, Any]], Optional[str]]:
+    """Worker: read one file's metadata as (path, metadata, error)"""
+    try:
+        return path, read_metadata(path), None
+    except (OSError, ValueError) as e:
+        return path, None, str(e)
+
+
+def scan_files(paths: List[str], processes: int = 4) -> List[Tuple[str, Optional[Dict[str, Any]], Optional[str]]]:
+    """Read the metadata of many PNGs, in a process pool when there are enough of them"""
+    if len(paths) <= INLINE_SCAN_LIMIT or processes <= 1:
+        return [_scan_file(path) for path in paths]
+    chunksize = max(1, min(256, len(paths) // (processes * 4)))
+    with process_context().Pool(processes) as pool:
+        return list(pool.imap_unordered(_scan_file, paths, chunksize=chunksize))
+
+
+def reconcile(output_dir: Path, entries: List[Dict[str, Any]], processes: int = 4, prune: bool = False) -> Tuple[List[Dict[str, Any]], Dict[str, int]]:
+    """
+    Bring metadata entries in line with the PNGs under output_dir
+
+    Only files that are new or whose mtime differs from their entry are read.
+    Embedded metadata wins over the entry, except for its id: a file whose
+    embedded id belongs to an entry whose file is gone is treated as moved and
+    keeps that entry; any other file keeps its entry's id or gets a new one,
+    so copies of an indexed file don't share its id. Files without embedded
+    metadata keep their entry, or get a bare one so they show up in the browser.
+
+    Args:
+        output_dir: Outputs root (entry paths are str(output_dir / relative))
+        entries: Current metadata entries
+        processes: Pool size for reading files
+        prune: Drop entries whose file no longer exists
+
+    Returns:
+        (entries, stats) with counts of scanned, unchanged, read, added,
+        updated, moved, missing, pruned and errors
+    """
+    output_dir = Path(output_dir)
+    on_disk = {}
+    for root, dirs, files in os.walk(output_dir):
+        dirs[:] = [d for d in dirs if not d.startswith('.')]
+        for name in files:
+            if name.lower().endswith('.png'):
+                path = Path(root) / name
+                on_disk[str(path)] = path.stat().st_mtime
+
+    by_path = {str(Path(entry['path'])): entry for entry in entries if entry.get('path')}
+    stats = dict.fromkeys(('scanned', 'unchanged', 'read', 'added', 'updated', 'moved', 'missing', 'pruned', 'errors'), 0)
+    stats['scanned'] = len(on_disk)
+
+    stale = []
+    for path, mtime in on_disk.items():
+        entry = by_path.get(path)
+        if entry is not None and entry.get('mtime') == mtime:
+            stats['unchanged'] += 1
+        else:
+            stale.append(path)
+
+    missing_ids = {entry.get('id'): entry for path, entry in by_path.items() if path not in on_disk}
+    results = scan_files(stale, processes)
+    stats['read'] = len(results)
+
+    for path, metadata, error in sorted(results):
+        location = Path(path)
+        subfolder = location.parent.relative_to(output_dir).as_posix()
+        location_fields = {
+            'filename': location.name,
+            'path': path,
+            'subfolder': '' if subfolder == '.' else subfolder,
+            'mtime': on_disk[path]
+        }
+        if error:
+            stats['errors'] += 1
+            print(f"Warning: Could not read metadata from {path}: {error}")
+
+        entry = by_path.get(path)
+        embedded = portable_metadata(metadata) if metadata else {}
+        embedded_id = embedded.pop('id', None)  # Only a moved file takes over its entry's id
+        if entry is None and embedded_id is not None and embedded_id in missing_ids:
+            entry = missing_ids.pop(embedded_id)
+            by_path.pop(str(Path(entry['path'])), None)
+            stats['moved'] += 1
+        elif entry is not None:
+            stats['updated'] += 1
+        else:
+            entry = {
+                'id': str(uuid.uuid4()),
+                'timestamp': datetime.fromtimestamp(on_disk[path]).isoformat(),
+                'prompt': ''
+            }
+            entries.append(entry)
+            stats['added'] += 1
+        entry.update(embedded)
+        entry.update(location_fields)
+        by_path[path] = entry
+
+    missing = [entry for path, entry in by_path.items() if path not in on_disk]
+    stats['missing'] = len(missing)
+    if prune and missing:
+        gone = {id(entry) for entry in missing}
+        entries = [entry for entry in entries if id(entry) not in gone]
+        stats['pruned'] = len(missing)
+    return entries, stats
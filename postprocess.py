@@ -0,0 +1,318 @@
+"""
+Post-processing Pipeline
+Runs CPU-side work on generated outputs (hashing, thumbnails, transcoding) in a
+process pool so the queue thread can submit the next ComfyUI job immediately
+"""
+
+import hashlib
+import multiprocessing
+import os
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from datetime import datetime
+from pathlib import Path
+from typing import Optional, Dict, Any, List, Union, Callable
+
+HASH_CHUNK_BYTES = 1024 * 1024
+THUMBNAIL_SIZE = 256
+WEBP_QUALITY = 90
+
+StepSpec = Union[str, Dict[str, Any]]
+# Imported once by the forkserver, so workers start without importing them again
+FORKSERVER_PRELOAD = ['postprocess', 'png_metadata', 'perceptual_hash']
+
+
+def process_context():
+    """
+    Get the multiprocessing context for worker pools
+
+    Pools are created while the server runs other threads, so workers are
+    not forked from it (a lock held by another thread could deadlock the
+    child). forkserver forks them from a single-threaded server process
+    instead; where it is unavailable (Windows) spawn is used. Both import
+    app.py in the workers, which skips its startup work there.
+    """
+    if 'forkserver' in multiprocessing.get_all_start_methods():
+        context = multiprocessing.get_context('forkserver')
+        context.set_forkserver_preload(FORKSERVER_PRELOAD)
+        return context
+    return multiprocessing.get_context('spawn')
+
+
+def _derived_path(context: Dict[str, Any], step: str, suffix: str) -> Path:
+    """Path of a file derived from the output, mirroring its location under the step's cache folder"""
+    relative = Path(context['relative_path'])
+    target = Path(context['cache_dir']) / step / relative.with_suffix(suffix)
+    target.parent.mkdir(parents=True, exist_ok=True)
+    return target
+
+
+def step_sha256(path: Path, context: Dict[str, Any], options: Dict[str, Any]) -> Dict[str, Any]:
+    """Hash the output file"""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(HASH_CHUNK_BYTES), b''):
+            digest.update(block)
+    return {'sha256': digest.hexdigest(), 'size': path.stat().st_size}
+
+
+def step_thumbnail(path: Path, context: Dict[str, Any], options: Dict[str, Any]) -> Dict[str, Any]:
+    """Write a downscaled WebP preview (requires Pillow)"""
+    from PIL import Image
+    size = int(options.get('size', THUMBNAIL_SIZE))
+    target = _derived_path(context, 'thumbnail', '.webp')
+    with Image.open(path) as img:
+        img.thumbnail((size, size))
+        img.save(target, 'WEBP', quality=int(options.get('quality', 80)))
+        width, height = img.size
+    return {'path': str(target), 'width': width, 'height': height}
+
+
+def step_webp(path: Path, context: Dict[str, Any], options: Dict[str, Any]) -> Dict[str, Any]:
+    """Write a full-size WebP copy of the output (requires Pillow)"""
+    from PIL import Image
+    target = _derived_path(context, 'webp', '.webp')
+    with Image.open(path) as img:
+        img.save(target, 'WEBP', quality=int(options.get('quality', WEBP_QUALITY)), lossless=bool(options.get('lossless', False)))
+    return {'path': str(target), 'size': target.stat().st_size}
+
+
+def step_dhash(path: Path, context: Dict[str, Any], options: Dict[str, Any]) -> Dict[str, Any]:
+    """Compute the perceptual hash used for near-duplicate lookups (requires Pillow)"""
+    from perceptual_hash import dhash, HASH_SIZE
+    return {'dhash': dhash(path, int(options.get('size', HASH_SIZE)))}
+
+
+# Step name -> function(path, context, options); steps run in a worker process
+STEPS = {
+    'sha256': step_sha256,
+    'dhash': step_dhash,
+    'thumbnail': step_thumbnail,
+    'webp': step_webp
+}
+
+
+def _normalize_step(spec: StepSpec) -> Dict[str, Any]:
+    """Convert 'name' or {'step': 'name', ...options} to {'step', 'options'}"""
+    if isinstance(spec, str):
+        name, options = spec, {}
+    else:
+        name = spec.get('step')
+        options = {key: value for key, value in spec.items() if key != 'step'}
+    if name not in STEPS:
+        raise ValueError(f"Unknown post-processing step: {name!r}")
+    return {'step': name, 'options': options}
+
+
+def run_steps(output_path: str, context: Dict[str, Any], steps: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """
+    Run steps on one output (executed in a worker process)
+
+    A failing step is recorded and the remaining steps still run; a step whose
+    optional dependency is not installed is marked 'skipped'.
+
+    Returns:
+        One {'step', 'status', 'duration_ms', 'result' | 'error'} dict per step
+    """
+    path = Path(output_path)
+    results = []
+    for step in steps:
+        started = time.perf_counter()
+        try:
+            result = STEPS[step['step']](path, context, step['options'])
+            entry = {'step': step['step'], 'status': 'completed', 'result': result}
+        except ImportError as e:
+            entry = {'step': step['step'], 'status': 'skipped', 'error': f"Missing dependency: {e.name or e}"}
+        except Exception as e:
+            entry = {'step': step['step'], 'status': 'failed', 'error': str(e)}
+        entry['duration_ms'] = round((time.perf_counter() - started) * 1000, 1)
+        results.append(entry)
+    return results
+
+
+class PostProcessor:
+    """Hands completed outputs to a bounded process pool and tracks their progress per job"""
+
+    def __init__(
+        self,
+        folder_steps: Dict[str, List[StepSpec]],
+        cache_dir: Path,
+        max_workers: int = 2,
+        max_pending: int = 1000,
+        max_records: int = 500,
+        on_result: Optional[Callable[[Dict[str, Any], Dict[str, Any]], None]] = None
+    ):
+        """
+        Initialize the post-processor
+
+        Args:
+            folder_steps: Output subfolder -> steps; the longest matching folder
+                          prefix wins and '' is the default for every output
+            cache_dir: Root folder for files derived from outputs (thumbnails, ...)
+            max_workers: Worker processes
+            max_pending: Outputs waiting for a worker before new ones are skipped
+            max_records: Job records kept for status queries
+            on_result: Called as on_result(job, results) with the merged results of
+                       the job's completed steps, on the pool's callback thread
+        """
+        self.folder_steps = {
+            folder.replace('\\', '/').strip('/'): [_normalize_step(spec) for spec in specs]
+            for folder, specs in folder_steps.items()
+        }
+        self.cache_dir = Path(cache_dir)
+        self.max_workers = max_workers
+        self.max_pending = max_pending
+        self.max_records = max_records
+        self.on_result = on_result
+        self._executor: Optional[ProcessPoolExecutor] = None
+        self._records: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+        self._pending = 0
+        self._totals = {'completed': 0, 'failed': 0, 'skipped': 0}
+        self._lock = threading.Lock()
+
+    def steps_for(self, subfolder: str) -> List[Dict[str, Any]]:
+        """Get the steps configured for an output subfolder"""
+        folder = (subfolder or '').replace('\\', '/').strip('/')
+        while True:
+            if folder in self.folder_steps:
+                return self.folder_steps[folder]
+            if not folder:
+                return []
+            folder = folder.rsplit('/', 1)[0] if '/' in folder else ''
+
+    def submit(self, job: Dict[str, Any]) -> Optional[str]:
+        """
+        Queue post-processing for a completed job without waiting for it
+
+        The job's 'postprocess' key is set to the job's processing status and
+        updated when the worker finishes ('pending', 'completed', 'failed' or 'skipped').
+
+        Args:
+            job: Completed job with 'output_path', 'relative_path' and 'subfolder'
+
+        Returns:
+            Initial status, or None when no steps apply to the job's folder
+        """
+        steps = self.steps_for(job.get('subfolder', ''))
+        if not steps or not job.get('output_path'):
+            return None
+
+        record = {
+            'job_id': job['id'],
+            'output_path': job['output_path'],
+            'status': 'pending',
+            'steps': [],
+            'submitted_at': datetime.now().isoformat(),
+            'finished_at': None
+        }
+        context = {
+            'relative_path': job.get('relative_path') or os.path.basename(job['output_path']),
+            'cache_dir': str(self.cache_dir)
+        }
+
+        with self._lock:
+            self._remember(record)
+            if self._pending >= self.max_pending:
+                record['status'] = 'skipped'
+                record['error'] = 'Post-processing backlog is full'
+                record['finished_at'] = record['submitted_at']
+                self._totals['skipped'] += 1
+                job['postprocess'] = 'skipped'
+                return 'skipped'
+            self._pending += 1
+            job['postprocess'] = 'pending'
+
+        try:
+            future = self._submit(job['output_path'], context, steps)
+        except Exception as e:
+            self._finish(job, record, None, f"Could not start post-processing: {e}")
+            return job['postprocess']
+        future.add_done_callback(lambda f: self._finish(job, record, f))
+        return 'pending'
+
+    def get(self, job_id: str) -> Optional[Dict[str, Any]]:
+        """Get a copy of a job's post-processing record"""
+        with self._lock:
+            record = self._records.get(job_id)
+            return dict(record) if record else None
+
+    def stats(self) -> Dict[str, Any]:
+        """Get pool size, backlog and outcome counts"""
+        with self._lock:
+            return {
+                'workers': self.max_workers,
+                'pending': self._pending,
+                'max_pending': self.max_pending,
+                **self._totals,
+                'folders': {folder or '*': [step['step'] for step in steps] for folder, steps in self.folder_steps.items()}
+            }
+
+    def shutdown(self):
+        """Stop the worker processes without waiting for outstanding work"""
+        with self._lock:
+            executor, self._executor = self._executor, None
+        if executor:
+            executor.shutdown(wait=False, cancel_futures=True)
+
+    def _submit(self, output_path: str, context: Dict[str, Any], steps: List[Dict[str, Any]]):
+        """Submit to the pool, starting it on first use and replacing it if a worker died"""
+        for attempt in range(2):
+            with self._lock:
+                if self._executor is None:
+                    self._executor = ProcessPoolExecutor(max_workers=self.max_workers, mp_context=process_context())
+                executor = self._executor
+            try:
+                return executor.submit(run_steps, output_path, context, steps)
+            except BrokenProcessPool:
+                print("Post-processing pool broke; starting a new one")
+                with self._lock:
+                    if self._executor is executor:
+                        self._executor = None
+                if attempt:
+                    raise
+
+    def _finish(self, job: Dict[str, Any], record: Dict[str, Any], future, error: Optional[str] = None):
+        """Record the outcome of a job's steps (runs on the pool's callback thread)"""
+        steps = []
+        if future is not None:
+            if future.cancelled():
+                error = 'Cancelled at shutdown'
+            elif future.exception() is not None:
+                error = f"Worker failed: {future.exception()}"
+            else:
+                steps = future.result()
+        failed = error is not None or any(step['status'] == 'failed' for step in steps)
+        status = 'failed' if failed else 'completed'
+
+        with self._lock:
+            self._pending -= 1
+            self._totals[status] += 1
+            record['steps'] = steps
+            record['status'] = status
+            record['finished_at'] = datetime.now().isoformat()
+            if error:
+                record['error'] = error
+        job['postprocess'] = status
+        if failed:
+            messages = [error] if error else [f"{step['step']}: {step['error']}" for step in steps if step['status'] == 'failed']
+            print(f"Post-processing failed for {record['output_path']}: {'; '.join(messages)}")
+
+        results = {}
+        for step in steps:
+            if step['status'] == 'completed' and isinstance(step.get('result'), dict):
+                results.update(step['result'])
+        if results and self.on_result:
+            try:
+                self.on_result(job, results)
+            except Exception as e:
+                print(f"Error handling post-processing results for {record['output_path']}: {e}")
+
+    def _remember(self, record: Dict[str, Any]):
+        """Store a record, dropping the oldest beyond max_records (caller holds the lock)"""
+        self._records[record['job_id']] = record
+        self._records.move_to_end(record['job_id'])
+        while len(self._records) > self.max_records:
+            self._records.popitem(last=False)
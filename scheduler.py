@@ -0,0 +1,311 @@
+"""
+Fair Scheduler
+Picks the next queued job by priority class and submitter using start-time
+fair queuing, so a large bulk batch cannot starve interactive requests or
+other people's jobs
+"""
+
+import heapq
+import time
+from collections import deque
+from itertools import islice
+from typing import Optional, Dict, Any, List, Iterable, Tuple, Callable
+
+# Priority class -> weight: a backlogged flow of each class is served in proportion
+# to its weight, so interactive jobs usually run next but bulk jobs never starve
+PRIORITY_WEIGHTS = {
+    'interactive': 16,
+    'normal': 4,
+    'bulk': 1
+}
+DEFAULT_PRIORITY = 'normal'
+WAIT_SAMPLES = 500  # Recent dispatches per class used for wait percentiles
+
+
+class _Flow:
+    """The queued items of one (priority class, submitter) pair, oldest first"""
+
+    __slots__ = ('key', 'weight', 'items', 'finish', 'version')
+
+    def __init__(self, key: Tuple[str, str], weight: int):
+        self.key = key
+        self.weight = weight
+        self.items = deque()  # [sequence, job, ready_since]
+        self.finish = 0.0  # Virtual finish tag of the flow's last dispatch
+        self.version = 0  # Heap entries with another version are stale
+
+
+class FairScheduler:
+    """
+    Weighted fair queue over (priority class, submitter) flows
+
+    Each flow is FIFO. Whenever a flow has work, its head carries a virtual
+    start tag max(V, flow finish); next() serves the smallest tag, sets the
+    virtual clock V to it and advances the flow's finish tag by 1 / weight.
+    Flows of the same class therefore alternate, and a class with weight w
+    gets w dispatches for every one of a weight-1 flow while both are busy.
+
+    Dispatched items stay queued until remove() (sweeps hand out many jobs
+    from one item). Not thread-safe: callers hold the queue lock.
+    """
+
+    def __init__(self, weights: Optional[Dict[str, int]] = None, default_priority: str = DEFAULT_PRIORITY):
+        self.weights = dict(weights or PRIORITY_WEIGHTS)
+        self.default_priority = default_priority
+        self._flows: Dict[Tuple[str, str], _Flow] = {}
+        self._heap: List[Tuple[float, int, int, Tuple[str, str]]] = []  # (start tag, sequence, version, flow key)
+        self._where: Dict[str, _Flow] = {}  # Job id -> flow holding it
+        self._virtual = 0.0
+        self._sequence = 0
+        self._versions = 0  # Global, so a recreated flow never matches an old heap entry
+        self._waits = {name: deque(maxlen=WAIT_SAMPLES) for name in self.weights}
+        self._dispatched = dict.fromkeys(self.weights, 0)
+
+    def __len__(self) -> int:
+        return len(self._where)
+
+    def __bool__(self) -> bool:
+        return bool(self._where)
+
+    def __contains__(self, job_id: str) -> bool:
+        return job_id in self._where
+
+    def check_priority(self, priority: Optional[str], default: Optional[str] = None) -> str:
+        """
+        Validate a priority class name (empty means the default)
+
+        Raises:
+            ValueError: If the class is unknown
+        """
+        if priority is None or priority == '':
+            return default or self.default_priority
+        if priority not in self.weights:
+            raise ValueError(f"Unknown priority {priority!r} (expected one of: {', '.join(self.weights)})")
+        return priority
+
+    def add(self, job: Dict[str, Any]):
+        """Queue a job (or sweep) behind the earlier jobs of its class and submitter"""
+        self.extend([job])
+
+    def extend(self, jobs: Iterable[Dict[str, Any]]):
+        """Queue jobs in order, oldest first"""
+        now = time.monotonic()
+        for job in jobs:
+            priority = job.get('priority')
+            if priority not in self.weights:
+                priority = job['priority'] = self.default_priority
+            flow = self._flow(priority, job.get('submitter') or '')
+            self._sequence += 1
+            flow.items.append([self._sequence, job, now])
+            self._where[job['id']] = flow
+            if len(flow.items) == 1:
+                self._activate(flow)
+
+    def next(self) -> Optional[Dict[str, Any]]:
+        """
+        Pick the item to run next and charge its flow for one job
+
+        The item stays queued (and first in its flow) until it is removed.
+
+        Returns:
+            The job or sweep, or None if nothing is queued
+        """
+        while self._heap:
+            start, _, version, key = heapq.heappop(self._heap)
+            flow = self._flows.get(key)
+            if flow is None or flow.version != version or not flow.items:
+                continue  # Stale entry
+            self._virtual = max(self._virtual, start)
+            flow.finish = start + 1.0 / flow.weight
+            self._push(flow, flow.finish)
+
+            entry = flow.items[0]
+            now = time.monotonic()
+            priority = flow.key[0]
+            self._waits[priority].append(now - entry[2])
+            self._dispatched[priority] += 1
+            entry[2] = now  # A sweep's next job waits from here
+            return entry[1]
+        return None
+
+    def next_batch(self, job: Dict[str, Any], limit: int, compatible: Callable[[Dict[str, Any]], bool]) -> List[Dict[str, Any]]:
+        """
+        Pick the jobs right behind a dispatched job in its flow that can run together with it
+
+        The flow is charged one dispatch per job, as if they had been picked
+        one by one. They stay queued until they are removed.
+
+        Args:
+            job: Job just returned by next()
+            limit: Maximum number of extra jobs
+            compatible: Whether a following job can share the execution
+
+        Returns:
+            The extra jobs in queue order (stops at the first incompatible one)
+        """
+        flow = self._where.get(job['id'])
+        if flow is None or limit <= 0 or flow.items[0][1] is not job:
+            return []
+        batch = []
+        now = time.monotonic()
+        for entry in islice(flow.items, 1, limit + 1):
+            if not compatible(entry[1]):
+                break
+            self._waits[flow.key[0]].append(now - entry[2])
+            entry[2] = now
+            batch.append(entry[1])
+        if batch:
+            self._dispatched[flow.key[0]] += len(batch)
+            flow.finish += len(batch) / flow.weight
+            self._push(flow, flow.finish)
+        return batch
+
+    def get(self, job_id: str) -> Optional[Dict[str, Any]]:
+        flow = self._where.get(job_id)
+        if flow is None:
+            return None
+        for entry in flow.items:
+            if entry[1]['id'] == job_id:
+                return entry[1]
+        return None
+
+    def remove(self, job_id: str) -> Optional[Dict[str, Any]]:
+        """
+        Take a job out of the queue
+
+        Returns:
+            The removed job, or None if it is not queued
+        """
+        entry = self._take(job_id)
+        return entry[1] if entry else None
+
+    def set_priority(self, job_id: str, priority: str) -> Optional[Dict[str, Any]]:
+        """
+        Move a queued job to another priority class
+
+        It keeps its place relative to the other jobs of its submitter in the new class.
+
+        Returns:
+            The job, or None if it is not queued
+
+        Raises:
+            ValueError: If the class is unknown
+        """
+        priority = self.check_priority(priority)
+        flow = self._where.get(job_id)
+        if flow is None:
+            return None
+        if flow.key[0] == priority:
+            return self.get(job_id)
+        entry = self._take(job_id)
+        job = entry[1]
+        job['priority'] = priority
+        target = self._flow(priority, flow.key[1])
+        position = len(target.items)
+        while position and target.items[position - 1][0] > entry[0]:
+            position -= 1
+        target.items.insert(position, entry)
+        self._where[job_id] = target
+        if len(target.items) == 1 or position == 0:
+            self._activate(target)
+        return job
+
+    def clear(self, keep: Iterable[str] = ()) -> List[Dict[str, Any]]:
+        """
+        Remove every queued job except the given ids
+
+        Returns:
+            The removed jobs
+        """
+        keep = set(keep)
+        removed = []
+        for flow in list(self._flows.values()):
+            kept = deque()
+            for entry in flow.items:
+                if entry[1]['id'] in keep:
+                    kept.append(entry)
+                else:
+                    removed.append(entry[1])
+                    del self._where[entry[1]['id']]
+            if len(kept) != len(flow.items):
+                flow.items = kept
+                self._push(flow, max(self._virtual, flow.finish))
+        return removed
+
+    def jobs(self) -> List[Dict[str, Any]]:
+        """
+        Get the queued items in the order they are expected to run
+
+        Simulates the scheduler without changing it. Each item counts as one
+        dispatch, so a sweep's place reflects only its next job.
+        """
+        heap = []
+        cursors = {}
+        for key, flow in self._flows.items():
+            if flow.items:
+                cursors[key] = 0
+                heap.append((max(self._virtual, flow.finish), flow.items[0][0], key))
+        heapq.heapify(heap)
+        order = []
+        while heap:
+            start, _, key = heapq.heappop(heap)
+            flow = self._flows[key]
+            position = cursors[key]
+            order.append(flow.items[position][1])
+            position += 1
+            if position < len(flow.items):
+                cursors[key] = position
+                heapq.heappush(heap, (start + 1.0 / flow.weight, flow.items[position][0], key))
+        return order
+
+    def stats(self) -> Dict[str, Any]:
+        """Get per-class queue lengths, oldest waits and recent dispatch waits (seconds)"""
+        now = time.monotonic()
+        classes = {}
+        for priority, weight in self.weights.items():
+            flows = [flow for key, flow in self._flows.items() if key[0] == priority and flow.items]
+            waits = sorted(self._waits[priority])
+            classes[priority] = {
+                'weight': weight,
+                'queued': sum(len(flow.items) for flow in flows),
+                'submitters': len(flows),
+                'oldest_wait': round(max((now - flow.items[0][2] for flow in flows), default=0.0), 1),
+                'dispatched': self._dispatched[priority],
+                'wait_mean': round(sum(waits) / len(waits), 2) if waits else None,
+                'wait_p50': round(waits[len(waits) // 2], 2) if waits else None,
+                'wait_p95': round(waits[min(len(waits) - 1, int(len(waits) * 0.95))], 2) if waits else None,
+                'wait_max': round(waits[-1], 2) if waits else None
+            }
+        return {'queued': len(self._where), 'classes': classes}
+
+    def _flow(self, priority: str, submitter: str) -> _Flow:
+        key = (priority, submitter)
+        flow = self._flows.get(key)
+        if flow is None:
+            flow = self._flows[key] = _Flow(key, self.weights[priority])
+        return flow
+
+    def _activate(self, flow: _Flow):
+        """Schedule a flow whose head changed; a flow idle for a while restarts at the virtual clock"""
+        self._push(flow, max(self._virtual, flow.finish))
+
+    def _push(self, flow: _Flow, start: float):
+        self._versions += 1
+        flow.version = self._versions
+        if flow.items:
+            heapq.heappush(self._heap, (start, flow.items[0][0], flow.version, flow.key))
+
+    def _take(self, job_id: str) -> Optional[list]:
+        flow = self._where.pop(job_id, None)
+        if flow is None:
+            return None
+        items = flow.items
+        if items[0][1]['id'] == job_id:
+            entry = items.popleft()
+            self._push(flow, max(self._virtual, flow.finish))
+        else:
+            entry = next(entry for entry in items if entry[1]['id'] == job_id)
+            items.remove(entry)
+        if not items and flow.finish <= self._virtual:
+            del self._flows[flow.key]  # Nothing to remember for an idle flow
+        return entry
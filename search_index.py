@@ -0,0 +1,410 @@
+"""
+Search Index
+In-memory inverted index over image metadata for prompt search with phrase
+and prefix queries, BM25 ranking and pagination
+"""
+
+import bisect
+import heapq
+import math
+import re
+import threading
+from array import array
+from collections import Counter
+from pathlib import Path
+from typing import Optional, Dict, Any, List, Callable, Iterable, Tuple
+
+from metadata_columns import ColumnStore, COLUMN_FIELDS, normalize_filters
+
+TOKEN_PATTERN = re.compile(r'\w+', re.UNICODE)
+QUERY_PATTERN = re.compile(r'"([^"]*)"|(\S+)')
+INDEXED_FIELDS = ('prompt', 'file_prefix', 'image_filename')
+FIELD_BREAK = 0  # Term id between fields so phrases never span two fields
+MAX_PREFIX_TERMS = 100  # Most frequent expansions kept for a prefix query
+BM25_K1 = 1.2
+BM25_B = 0.75
+COMPACT_RATIO = 0.3  # Rebuild once this share of documents is deleted
+
+
+def tokenize(text: Any) -> List[str]:
+    """Lowercase word tokens of a field value"""
+    return TOKEN_PATTERN.findall(str(text).lower()) if text else []
+
+
+def parse_query(query: str) -> List[Tuple[str, Any]]:
+    """
+    Parse a query into AND-ed clauses
+
+    Quoted text and hyphenated words are phrases, 'word*' is a prefix, and
+    everything else is a single term.
+
+    Returns:
+        ('term', term), ('prefix', prefix) or ('phrase', [terms]) tuples
+    """
+    clauses = []
+    for quoted, word in QUERY_PATTERN.findall(query):
+        text = quoted if quoted else word
+        prefix = not quoted and text.endswith('*')
+        tokens = tokenize(text)
+        if not tokens:
+            continue
+        if prefix:
+            clauses.extend(('term', token) for token in tokens[:-1])
+            clauses.append(('prefix', tokens[-1]))
+        elif len(tokens) == 1:
+            clauses.append(('term', tokens[0]))
+        else:
+            clauses.append(('phrase', tokens))
+    return clauses
+
+
+class SearchIndex:
+    """
+    Inverted index over metadata entries
+
+    Documents get increasing numbers, so each term's postings are a sorted
+    array of document numbers (with a parallel array of term frequencies)
+    that only grows at the end. Each document keeps its token sequence (as
+    term ids) for phrase matching. Deleted documents are tombstoned and
+    dropped at the next compaction.
+    """
+
+    def __init__(self, loader: Callable[[], Iterable[Dict[str, Any]]], root: Optional[Path] = None):
+        """
+        Initialize the index
+
+        Args:
+            loader: Returns all metadata entries; called to build the index on first use
+            root: Outputs root, for the folder of each entry in structured queries
+        """
+        self.loader = loader
+        self.root = root
+        self._lock = threading.RLock()
+        self._built = False
+        self._reset()
+
+    def _reset(self):
+        self._term_ids: Dict[str, int] = {}
+        self._vocabulary: List[str] = []  # Sorted terms for prefix lookups
+        self._postings: List[array] = [array('I')]  # Term id -> sorted document numbers (id 0 is FIELD_BREAK)
+        self._frequencies: List[array] = [array('H')]  # Term id -> term count per posting
+        self._docs: List[Optional[Dict[str, Any]]] = []  # Document number -> entry (None when deleted)
+        self._tokens: List[Optional[bytes]] = []  # Document number -> term ids (packed uint32)
+        self._lengths = array('I')  # Document number -> token count
+        self._doc_numbers: Dict[str, int] = {}  # Entry id -> document number
+        self._total_length = 0
+        self._deleted = 0
+        self._columns = ColumnStore(self.root)  # Generation parameters for structured queries
+
+    def rebuild(self, entries: Optional[Iterable[Dict[str, Any]]] = None):
+        """Index all entries from scratch (from the loader when none are given)"""
+        with self._lock:
+            self._reset()
+            self._columns.begin_bulk()
+            for entry in (self.loader() if entries is None else entries):
+                self._add(entry)
+            self._columns.end_bulk()
+            self._built = True
+
+    def add(self, entry: Dict[str, Any]):
+        """Add or update an entry (only re-tokenized when an indexed field changed)"""
+        with self._lock:
+            if not self._built:
+                return  # The first query loads it with everything else
+            number = self._doc_numbers.get(entry.get('id'))
+            if number is not None:
+                current = self._docs[number]
+                if all(current.get(field) == entry.get(field) for field in INDEXED_FIELDS + COLUMN_FIELDS + ('path',)):
+                    self._docs[number] = dict(entry)
+                    return
+                self._remove(number)
+            self._add(entry)
+
+    def remove(self, entry_id: str):
+        """Remove an entry by id"""
+        with self._lock:
+            number = self._doc_numbers.get(entry_id)
+            if number is not None:
+                self._remove(number)
+                if self._deleted > 1000 and self._deleted > COMPACT_RATIO * len(self._docs):
+                    self.rebuild([doc for doc in self._docs if doc is not None])
+
+    def search(self, query: str, offset: int = 0, limit: int = 50) -> Dict[str, Any]:
+        """
+        Find entries matching every clause of a query, best matches first
+
+        Documents are ranked by BM25 over all indexed fields; equal scores
+        list the most recently indexed entry first.
+
+        Args:
+            query: Terms, "quoted phrases" and prefix* terms
+            offset: Results to skip
+            limit: Results to return
+
+        Returns:
+            Dict with 'total' matches and 'results' (entry copies with a 'score')
+        """
+        with self._lock:
+            numbers, scores = self._text_matches(query)
+            # Iterate newest first so ties keep that order (nlargest is stable)
+            order = heapq.nlargest(offset + limit, range(len(numbers) - 1, -1, -1), key=scores.__getitem__)
+            return {'total': len(numbers), 'results': self._results(numbers, order[offset:], scores)}
+
+    def query(
+        self,
+        filters: Dict[str, Any],
+        text: Optional[str] = None,
+        facets: Iterable[str] = (),
+        sort: Optional[str] = None,
+        offset: int = 0,
+        limit: Optional[int] = 50
+    ) -> Dict[str, Any]:
+        """
+        Structured query over generation parameters with facet counts
+
+        Args:
+            filters: See metadata_columns.normalize_filters
+            text: Optional search query the results must also match
+            facets: Fields to count values of over all matches
+            sort: Column to order by, '-' prefix for descending (default: relevance
+                  with text, else newest first)
+            offset: Results to skip
+            limit: Results to return (None for every match)
+
+        Returns:
+            Dict with 'total', 'results' and 'facets'
+
+        Raises:
+            ValueError: For invalid filters, facets or sort fields
+        """
+        normalized = normalize_filters(filters)
+        with self._lock:
+            if not self._built:
+                self.rebuild()
+            scores = None
+            if text and text.strip():
+                numbers, text_scores = self._text_matches(text)
+                scores = dict(zip(numbers, text_scores))
+                numbers = self._columns.match(normalized, candidates=numbers) if normalized else sorted(numbers)
+            elif normalized:
+                numbers = self._columns.match(normalized)
+            else:
+                numbers = [number for number, doc in enumerate(self._docs) if doc is not None]
+
+            if sort:
+                key = self._columns.sort_key(sort.lstrip('-'))
+                descending = sort.startswith('-')
+            elif scores is not None:
+                key, descending = scores.__getitem__, True
+            else:
+                key, descending = self._columns.sort_key('timestamp'), True
+            # Ties: newest document first
+            ranked = reversed(numbers) if descending else numbers
+            if limit is None:
+                page = sorted(ranked, key=key, reverse=descending)[offset:]  # Stable, like the heaps
+            elif descending:
+                page = heapq.nlargest(offset + limit, ranked, key=key)[offset:]
+            else:
+                page = heapq.nsmallest(offset + limit, ranked, key=key)[offset:]
+
+            results = []
+            for number in page:
+                entry = dict(self._docs[number])
+                if scores is not None:
+                    entry['score'] = round(scores[number], 4)
+                results.append(entry)
+            return {
+                'total': len(numbers),
+                'results': results,
+                'facets': self._columns.facets(numbers, facets)
+            }
+
+    def get(self, entry_ids: Iterable[str]) -> List[Dict[str, Any]]:
+        """Get copies of entries by id, in the given order (unknown ids are skipped)"""
+        with self._lock:
+            if not self._built:
+                self.rebuild()
+            numbers = [self._doc_numbers.get(entry_id) for entry_id in entry_ids]
+            return [dict(self._docs[number]) for number in numbers if number is not None]
+
+    def _text_matches(self, query: str) -> Tuple[List[int], List[float]]:
+        """Document numbers matching a search query with their scores (caller holds the lock)"""
+        clauses = parse_query(query)
+        if not clauses:
+            return [], []
+        if not self._built:
+            self.rebuild()
+
+        terms, prefixes, phrases = [], [], []
+        for kind, value in clauses:
+            if kind == 'prefix':
+                term_ids = self._expand_prefix(value)
+                if not term_ids:
+                    return [], []
+                prefixes.append(term_ids)
+                continue
+            term_ids = [self._term_ids.get(term) for term in (value if kind == 'phrase' else [value])]
+            if None in term_ids:
+                return [], []
+            terms.extend(term_id for term_id in term_ids if term_id not in terms)
+            if kind == 'phrase':
+                phrases.append(term_ids)
+
+        numbers, scores = self._match(terms, prefixes)
+        if phrases:
+            needles = [array('I', phrase).tobytes() for phrase in phrases]
+            keep = [
+                i for i, number in enumerate(numbers)
+                if all(self._has_phrase(self._tokens[number], needle) for needle in needles)
+            ]
+            numbers = [numbers[i] for i in keep]
+            scores = [scores[i] for i in keep]
+        return numbers, scores
+
+    def _results(self, numbers: List[int], order: Iterable[int], scores: List[float]) -> List[Dict[str, Any]]:
+        results = []
+        for i in order:
+            entry = dict(self._docs[numbers[i]])
+            entry['score'] = round(scores[i], 4)
+            results.append(entry)
+        return results
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                'built': self._built,
+                'documents': len(self._docs) - self._deleted,
+                'terms': len(self._vocabulary),
+                'deleted': self._deleted
+            }
+
+    def _add(self, entry: Dict[str, Any]):
+        number = len(self._docs)
+        term_ids = self._term_ids
+        tokens = []
+        for field in INDEXED_FIELDS:
+            words = tokenize(entry.get(field))
+            if words:
+                if tokens:
+                    tokens.append(FIELD_BREAK)
+                # Real term ids start at 1, so 'or' only creates missing terms
+                tokens.extend([term_ids.get(word) or self._new_term(word) for word in words])
+        counts = Counter(tokens)
+        counts.pop(FIELD_BREAK, None)
+        postings, frequencies = self._postings, self._frequencies
+        for term_id, count in counts.items():
+            postings[term_id].append(number)
+            frequencies[term_id].append(count if count < 0xFFFF else 0xFFFF)
+        self._docs.append(dict(entry))
+        self._tokens.append(array('I', tokens).tobytes())
+        self._lengths.append(len(tokens))
+        self._columns.add(number, entry)
+        self._doc_numbers[entry.get('id')] = number
+        self._total_length += len(tokens)
+
+    def _new_term(self, term: str) -> int:
+        term_id = len(self._postings)
+        self._term_ids[term] = term_id
+        self._postings.append(array('I'))
+        self._frequencies.append(array('H'))
+        bisect.insort(self._vocabulary, term)
+        return term_id
+
+    def _remove(self, number: int):
+        entry = self._docs[number]
+        for term_id in set(array('I', self._tokens[number])):
+            if term_id == FIELD_BREAK:
+                continue
+            postings = self._postings[term_id]
+            position = bisect.bisect_left(postings, number)
+            if position < len(postings) and postings[position] == number:
+                del postings[position]
+                del self._frequencies[term_id][position]
+        self._total_length -= self._lengths[number]
+        self._columns.remove(number)
+        self._docs[number] = None
+        self._tokens[number] = None
+        self._doc_numbers.pop(entry.get('id'), None)
+        self._deleted += 1
+
+    def _expand_prefix(self, prefix: str) -> List[int]:
+        """Term ids starting with prefix, keeping the most frequent ones"""
+        start = bisect.bisect_left(self._vocabulary, prefix)
+        term_ids = []
+        for term in self._vocabulary[start:]:
+            if not term.startswith(prefix):
+                break
+            term_id = self._term_ids[term]
+            if self._postings[term_id]:
+                term_ids.append(term_id)
+        if len(term_ids) > MAX_PREFIX_TERMS:
+            term_ids = heapq.nlargest(MAX_PREFIX_TERMS, term_ids, key=lambda term_id: len(self._postings[term_id]))
+        return term_ids
+
+    def _match(self, terms: List[int], prefixes: List[List[int]]) -> Tuple[List[int], List[float]]:
+        """
+        Document numbers containing every term and a term of every prefix group, with BM25 scores
+
+        Matching starts from the rarest term and narrows with binary searches in
+        the other posting lists, so cost follows the smallest list.
+        """
+        live = max(1, len(self._docs) - self._deleted)
+        base = BM25_K1 * (1 - BM25_B)
+        per_length = BM25_K1 * BM25_B * live / max(1, self._total_length)
+        boost = BM25_K1 + 1
+        lengths = self._lengths
+
+        def idf(term_id):
+            df = len(self._postings[term_id])
+            return math.log(1 + (live - df + 0.5) / (df + 0.5))
+
+        def prefix_scores(term_ids):
+            scored = {}
+            for term_id in term_ids:
+                weight = idf(term_id) * boost
+                for number, tf in zip(self._postings[term_id], self._frequencies[term_id]):
+                    scored[number] = scored.get(number, 0.0) + weight * tf / (tf + base + per_length * lengths[number])
+            return scored
+
+        terms = sorted(terms, key=lambda term_id: len(self._postings[term_id]))
+        groups = [prefix_scores(term_ids) for term_ids in prefixes]
+        if terms:
+            first = terms.pop(0)
+            weight = idf(first) * boost
+            numbers = self._postings[first]
+            scores = [
+                weight * tf / (tf + base + per_length * lengths[number])
+                for number, tf in zip(numbers, self._frequencies[first])
+            ]
+        else:
+            groups.sort(key=len)
+            first = groups.pop(0)
+            numbers = sorted(first)
+            scores = [first[number] for number in numbers]
+
+        for term_id in terms:
+            postings, frequencies = self._postings[term_id], self._frequencies[term_id]
+            weight = idf(term_id) * boost
+            size = len(postings)
+            kept_numbers, kept_scores = [], []
+            for number, score in zip(numbers, scores):
+                position = bisect.bisect_left(postings, number)
+                if position < size and postings[position] == number:
+                    tf = frequencies[position]
+                    kept_numbers.append(number)
+                    kept_scores.append(score + weight * tf / (tf + base + per_length * lengths[number]))
+            numbers, scores = kept_numbers, kept_scores
+
+        for group in groups:
+            kept = [(number, score + group[number]) for number, score in zip(numbers, scores) if number in group]
+            numbers = [number for number, _ in kept]
+            scores = [score for _, score in kept]
+        return list(numbers), scores
+
+    @staticmethod
+    def _has_phrase(tokens: bytes, needle: bytes) -> bool:
+        """Whether the packed term ids contain the packed phrase at a term boundary"""
+        position = tokens.find(needle)
+        while position != -1 and position % 4:
+            position = tokens.find(needle, position + 1)
+        return position != -1
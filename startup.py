@@ -0,0 +1,125 @@
+"""
+Startup Sequence
+Named startup steps that run in background threads while the web server is
+already answering, with their progress for a readiness endpoint
+"""
+
+import importlib
+import threading
+import time
+import traceback
+from typing import Optional, Dict, Any, Callable, Iterable
+
+
+class StartupStep:
+    """State of one startup step"""
+
+    __slots__ = ('name', 'state', 'error', 'started', 'finished', 'done')
+
+    def __init__(self, name: str):
+        self.name = name
+        self.state = 'pending'  # pending -> running -> ready | failed
+        self.error: Optional[str] = None
+        self.started: Optional[float] = None
+        self.finished: Optional[float] = None
+        self.done = threading.Event()
+
+
+class StartupSequence:
+    """
+    Runs startup work off the main thread
+
+    Each step runs in its own daemon thread once the steps it comes after
+    have finished (whether or not they succeeded). Request handlers that
+    need a step's result call wait().
+    """
+
+    def __init__(self):
+        self.created = time.monotonic()
+        self._steps: Dict[str, StartupStep] = {}
+        self._lock = threading.Lock()
+
+    def run(self, name: str, target: Callable[[], Any], after: Iterable[str] = ()):
+        """
+        Start a step
+
+        Args:
+            name: Step name (unique)
+            target: Function doing the work; an exception marks the step failed
+            after: Steps (already added) to wait for first
+        """
+        step = StartupStep(name)
+        with self._lock:
+            if name in self._steps:
+                raise ValueError(f"Startup step {name!r} already exists")
+            self._steps[name] = step
+            previous = [self._steps[other] for other in after]
+
+        def body():
+            for other in previous:
+                other.done.wait()
+            step.state = 'running'
+            step.started = time.monotonic()
+            try:
+                target()
+                step.state = 'ready'
+            except Exception as e:
+                step.state = 'failed'
+                step.error = str(e)
+                print(f"Startup step '{name}' failed: {e}")
+                traceback.print_exc()
+            finally:
+                step.finished = time.monotonic()
+                step.done.set()
+            print(f"Startup step '{name}' {step.state} after {step.finished - self.created:.2f}s")
+
+        threading.Thread(target=body, name=f"startup-{name}", daemon=True).start()
+
+    def wait(self, name: str, timeout: Optional[float] = None) -> bool:
+        """
+        Wait for a step to finish
+
+        Returns:
+            Whether it finished successfully within the timeout (unknown steps count as finished)
+        """
+        step = self._steps.get(name)
+        if step is None:
+            return True
+        return step.done.wait(timeout) and step.state == 'ready'
+
+    def is_ready(self, name: Optional[str] = None) -> bool:
+        """Whether one step (or every step) has finished successfully"""
+        steps = [self._steps[name]] if name in self._steps else [] if name else list(self._steps.values())
+        return all(step.state == 'ready' for step in steps)
+
+    def status(self) -> Dict[str, Any]:
+        """Get overall readiness and the state and duration (seconds) of each step"""
+        now = time.monotonic()
+        steps = {}
+        for step in list(self._steps.values()):
+            steps[step.name] = {
+                'state': step.state,
+                'seconds': round((step.finished or now) - step.started, 3) if step.started else None,
+                'ready_at': round(step.finished - self.created, 3) if step.finished else None,
+                'error': step.error
+            }
+        return {
+            'ready': self.is_ready(),
+            'uptime': round(now - self.created, 3),
+            'steps': steps
+        }
+
+
+def warm_imports(modules: Iterable[str]) -> Callable[[], None]:
+    """
+    Get a step target that imports modules so the first request using them doesn't pay for it
+
+    Missing optional modules are skipped.
+    """
+    def target():
+        for module in modules:
+            try:
+                importlib.import_module(module)
+            except ImportError as e:
+                print(f"Not preloading {module}: {e}")
+    return target
@@ -31,6 +31,9 @@ let isAutoplayActive = false;
 // Batch generation state
 let batchPreviewData = [];
 let detectedBatchParameters = [];
+let batchIngestFile = null;  // Large CSV file parsed on the server instead of in the browser
+const LARGE_BATCH_FILE_BYTES = 256 * 1024;
+const BATCH_FILE_PREVIEW_ROWS = 20;
 
 // AI streaming state
 let activeStream = null;
@@ -47,10 +50,29 @@ document.addEventListener('DOMContentLoaded', function() {
     initializeMobileOverlay();
     initializeDeviceFullscreenSync();
     browseFolder('');
+    loadWorkflows();
     startQueueUpdates();
     startHardwareMonitoring();
 });
 
+// Fill the workflow selector (hidden while there is only one workflow)
+async function loadWorkflows() {
+    try {
+        const response = await fetch('/api/workflows');
+        const result = await response.json();
+        if (!result.success) return;
+        
+        const select = document.getElementById('workflow');
+        select.innerHTML = result.workflows.map(w =>
+            `<option value="${escapeHtml(w.name)}" title="${escapeHtml(w.description || '')}">${escapeHtml(w.name)}</option>`
+        ).join('');
+        select.value = result.default;
+        document.getElementById('workflowGroup').style.display = result.workflows.length > 1 ? '' : 'none';
+    } catch (error) {
+        console.error('Error loading workflows:', error);
+    }
+}
+
 // Device Fullscreen Sync for Reveal fullscreen viewer
 function initializeDeviceFullscreenSync() {
     // Use MutationObserver to detect when fullscreen overlay is activated
@@ -275,11 +297,17 @@ function initializeEventListeners() {
     document.getElementById('fullscreenPlayPause').addEventListener('click', toggleAutoplay);
     
     // Folder management
+    document.getElementById('gallerySearch').addEventListener('input', (e) => {
+        clearTimeout(gallerySearchTimer);
+        gallerySearchTimer = setTimeout(() => searchImages(e.target.value.trim()), 300);
+    });
     document.getElementById('newFolderBtn').addEventListener('click', createNewFolder);
     document.getElementById('setOutputFolderBtn').addEventListener('click', setOutputFolder);
     document.getElementById('selectionModeBtn').addEventListener('click', toggleSelectionMode);
+    document.getElementById('collapseDuplicatesBtn').addEventListener('click', toggleCollapseDuplicates);
     document.getElementById('moveBtn').addEventListener('click', moveSelectedItems);
     document.getElementById('deleteBtn').addEventListener('click', deleteSelectedItems);
+    document.getElementById('exportBtn').addEventListener('click', exportSelectedItems);
     
     // Touch support for fullscreen
     initTouchSupport();
@@ -619,7 +647,14 @@ async function updateAutoUnloadTimer() {
         
         if (!timerElement || !timerText) return;
         
-        if (status.timer_active && status.unload_in_seconds > 0) {
+        const connection = status.connection || {};
+        if (connection.state && connection.state !== 'closed') {
+            // ComfyUI is unreachable: the queue is paused until it answers again
+            timerText.textContent = connection.retry_in_seconds > 0
+                ? `ComfyUI unreachable - retrying in ${Math.ceil(connection.retry_in_seconds)}s`
+                : 'ComfyUI unreachable - reconnecting';
+            timerElement.style.display = 'flex';
+        } else if (status.timer_active && status.unload_in_seconds > 0) {
             // Show timer with countdown
             const minutes = Math.floor(status.unload_in_seconds / 60);
             const seconds = status.unload_in_seconds % 60;
@@ -759,8 +794,8 @@ function renderQueueItem(job, isActive) {
             <div class="queue-item-content">
                 <div class="queue-item-header">
                     <span class="queue-item-status ${statusClass}">${job.status}</span>
-                    ${(job.status === 'queued' || job.status === 'completed' || job.status === 'failed') && !isActive ? `
-                        <button class="queue-item-cancel" data-job-id="${escapeHtml(job.id)}" title="Remove this item">
+                    ${['queued', 'waiting', 'generating', 'completed', 'failed', 'cancelled'].includes(job.status) ? `
+                        <button class="queue-item-cancel" data-job-id="${escapeHtml(job.id)}" title="${job.status === 'generating' ? 'Cancel generation' : 'Remove this item'}">
                             <svg width="16" height="16" viewBox="0 0 24 24" fill="none" stroke="currentColor" stroke-width="2">
                                 <line x1="18" y1="6" x2="6" y2="18"></line>
                                 <line x1="6" y1="6" x2="18" y2="18"></line>
@@ -772,6 +807,12 @@ function renderQueueItem(job, isActive) {
                 <div class="queue-item-params">
                     <span class="param-badge">${job.width}x${job.height}</span>
                     <span class="param-badge">${job.steps} steps</span>
+                    ${job.type === 'sweep' ? `<span class="param-badge">Sweep ${job.cursor}/${job.total}</span>` : ''}
+                    ${job.sweep_id ? `<span class="param-badge">Sweep #${job.sweep_index + 1}/${job.sweep_total}</span>` : ''}
+                    ${job.batch_size ? `<span class="param-badge">Batch ${job.batch_index + 1}/${job.batch_size}</span>` : ''}
+                    ${job.pipeline_step ? `<span class="param-badge">Step ${escapeHtml(job.pipeline_step)}</span>` : ''}
+                    ${job.status === 'queued' && job.priority && job.priority !== 'normal' ? `<span class="param-badge">${escapeHtml(job.priority)}</span>` : ''}
+                    ${job.postprocess && job.postprocess !== 'completed' ? `<span class="param-badge">Post-processing ${escapeHtml(job.postprocess)}</span>` : ''}
                 </div>
             </div>
         </div>
@@ -797,7 +838,11 @@ async function cancelJob(jobId) {
             // Force immediate UI update
             console.log('Updating queue after deletion...');
             await updateQueue();
-            showNotification('Item removed', 'Removed', 'success', 2000);
+            if (result.status === 'generating') {
+                showNotification('Generation cancelled', 'Cancelled', 'success', 2000);
+            } else {
+                showNotification('Item removed', 'Removed', 'success', 2000);
+            }
         } else {
             console.error('Failed to remove:', result.error);
             showNotification(result.error || 'Failed to remove item', 'Error', 'error');
@@ -858,7 +903,8 @@ async function generateImage() {
         subfolder: document.getElementById('subfolder').value.trim(),
         mcnl_lora: document.getElementById('mcnlLora').checked,
         snofs_lora: document.getElementById('snofsLora').checked,
-        male_lora: document.getElementById('maleLora').checked
+        male_lora: document.getElementById('maleLora').checked,
+        workflow: document.getElementById('workflow').value || null
     };
     
     try {
@@ -880,6 +926,9 @@ async function generateImage() {
             // Reload gallery after a delay to show new image
             setTimeout(() => browseFolder(currentPath), 3000);
             showNotification('Image added to queue', 'Queued', 'success', 3000);
+        } else {
+            const result = await response.json();
+            showNotification(result.error || 'Could not queue the job', 'Error', 'error');
         }
     } catch (error) {
         console.error('Error queueing job:', error);
@@ -1330,11 +1379,81 @@ async function selectBrowsedImage(filename, folder, imagePath) {
     }
 }
 
+// Prompt search (results replace the folder view until the query is cleared)
+let gallerySearchTimer = null;
+
+async function searchImages(query) {
+    if (!query) {
+        browseFolder(currentPath);
+        return;
+    }
+    try {
+        const response = await fetch(`/api/search?q=${encodeURIComponent(query)}&per_page=200`);
+        const data = await response.json();
+        if (!data.success) {
+            showNotification(data.error || 'Search failed', 'Search', 'error');
+            return;
+        }
+        allItems = [...data.results];
+        images = data.results;
+        selectedItems.clear();
+        
+        const more = data.total > data.results.length ? ` (showing ${data.results.length})` : '';
+        document.getElementById('breadcrumb').innerHTML =
+            `<span class="breadcrumb-item" onclick="clearGallerySearch()">🏠 Root</span> / 🔍 ${data.total} results for "${escapeHtml(query)}"${more}`;
+        const savedPath = currentPath;
+        currentPath = '';  // No ".." entry in search results
+        renderGallery([], data.results);
+        currentPath = savedPath;
+        updateSelectionButtons();
+    } catch (error) {
+        console.error('Error searching images:', error);
+    }
+}
+
+function clearGallerySearch() {
+    document.getElementById('gallerySearch').value = '';
+    browseFolder('');
+}
+
+// Near-duplicate collapsing (one image per perceptual-hash group in the folder view)
+let collapseDuplicates = false;
+
+function toggleCollapseDuplicates() {
+    collapseDuplicates = !collapseDuplicates;
+    document.getElementById('collapseDuplicatesBtn').classList.toggle('btn-active', collapseDuplicates);
+    browseFolder(currentPath);
+}
+
+async function collapseDuplicateFiles(path, files) {
+    try {
+        const response = await fetch(`/api/duplicates?path=${encodeURIComponent(path)}`);
+        const data = await response.json();
+        if (!data.success) return files;
+        
+        const hidden = new Set();
+        const counts = {};
+        data.groups.forEach(group => {
+            counts[group.representative.id] = group.duplicates.length;
+            group.duplicates.forEach(duplicate => hidden.add(duplicate.id));
+        });
+        return files
+            .filter(file => !hidden.has(file.id))
+            .map(file => counts[file.id] ? { ...file, similar_count: counts[file.id] } : file);
+    } catch (error) {
+        console.error('Error loading duplicates:', error);
+        return files;
+    }
+}
+
 // Folder Browsing
 async function browseFolder(path) {
     try {
         const response = await fetch(`/api/browse?path=${encodeURIComponent(path)}`);
         const data = await response.json();
+        if (collapseDuplicates) {
+            data.files = await collapseDuplicateFiles(data.current_path, data.files);
+        }
         
         currentPath = data.current_path;
         allItems = [...data.folders, ...data.files];
@@ -1425,6 +1544,7 @@ function renderGallery(folders, files) {
                     <div class="gallery-item-meta">
                         <span class="param-badge">${file.width}x${file.height}</span>
                         <span class="param-badge">${file.steps} steps</span>
+                        ${file.similar_count ? `<span class="param-badge" title="Near-duplicates hidden">+${file.similar_count} similar</span>` : ''}
                     </div>
                 </div>
             </div>
@@ -1484,6 +1604,29 @@ function updateSelectionButtons() {
     
     moveBtn.style.display = hasSelection ? 'inline-flex' : 'none';
     deleteBtn.style.display = hasSelection ? 'inline-flex' : 'none';
+    document.getElementById('exportBtn').style.display = hasSelection ? 'inline-flex' : 'none';
+}
+
+function exportSelectedItems() {
+    if (selectedItems.size === 0) return;
+    
+    // A regular form post lets the browser stream the archive straight to disk
+    const form = document.createElement('form');
+    form.method = 'POST';
+    form.action = '/api/export';
+    form.style.display = 'none';
+    const addField = (name, value) => {
+        const input = document.createElement('input');
+        input.type = 'hidden';
+        input.name = name;
+        input.value = value;
+        form.appendChild(input);
+    };
+    selectedItems.forEach(item => addField('items', item));
+    addField('manifest', 'true');
+    document.body.appendChild(form);
+    form.submit();
+    form.remove();
 }
 
 // Folder Management
@@ -1679,7 +1822,7 @@ function renderMetadata(image) {
             </div>
             <div class="metadata-item">
                 <div class="metadata-label">Seed</div>
-                <div class="metadata-value">${image.seed}</div>
+                <div class="metadata-value">${image.seed}${image.batch_size ? ` (image ${image.batch_index + 1} of a batch of ${image.batch_size})` : ''}</div>
             </div>
             <div class="metadata-item">
                 <div class="metadata-label">LoRAs</div>
@@ -1714,6 +1857,9 @@ function importImageData() {
     document.getElementById('mcnlLora').checked = currentImageData.mcnl_lora || false;
     document.getElementById('snofsLora').checked = currentImageData.snofs_lora || false;
     document.getElementById('maleLora').checked = currentImageData.male_lora || false;
+    if (currentImageData.workflow) {
+        document.getElementById('workflow').value = currentImageData.workflow;
+    }
     
     // Note: We don't import image-related fields (use_image, use_image_size, image_filename)
     // as those are specific to the source image upload workflow
@@ -2217,7 +2363,11 @@ function initializeBatchGeneration() {
     }
     
     if (batchCSV) {
-        batchCSV.addEventListener('input', updateBatchPreview);
+        batchCSV.addEventListener('input', () => {
+            // Editing the CSV by hand replaces a loaded large file
+            batchIngestFile = null;
+            updateBatchPreview();
+        });
     }
     
     // Batch buttons
@@ -2314,8 +2464,14 @@ async function queueImageBatchGeneration() {
             })
         });
         const result = await response.json();
+        if (result.rejected && result.rejected.length > 0) {
+            console.warn('Skipped unreadable images:', result.rejected);
+        }
         if (result.success) {
-            showNotification(`Queued ${result.queued_count} image(s) from folder`, 'Image Batch Queued', 'success', 3000);
+            const skipped = result.rejected && result.rejected.length > 0
+                ? ` (skipped ${result.rejected.length} unreadable: ${result.rejected.map(r => r.filename).slice(0, 3).join(', ')}${result.rejected.length > 3 ? ', ...' : ''})`
+                : '';
+            showNotification(`Queued ${result.queued_count} image(s) from folder${skipped}`, 'Image Batch Queued', skipped ? 'warning' : 'success', skipped ? 5000 : 3000);
             updateQueue();
         } else {
             showNotification('Error: ' + (result.error || 'Failed to queue image batch'), 'Error', 'error');
@@ -2799,9 +2955,15 @@ function updateBatchPreview() {
         </div>` + html;
     }
     
+    if (batchIngestFile) {
+        html = `<div style="color: var(--text-secondary); font-size: 0.9rem; margin-bottom: 0.75rem; padding: 0.5rem; background: var(--bg-secondary); border-radius: 4px;">
+            Previewing the first ${batchPreviewData.length} rows of ${escapeHtml(batchIngestFile.name)}. All rows are expanded on the server when queued.
+        </div>` + html;
+    }
+    
     batchPreview.innerHTML = html;
     queueBatchBtn.disabled = false;
-    batchCount.textContent = batchPreviewData.length.toString();
+    batchCount.textContent = batchIngestFile ? 'all' : batchPreviewData.length.toString();
 }
 
 async function queueBatchGeneration() {
@@ -2841,6 +3003,11 @@ async function queueBatchGeneration() {
     
     const variableParams = getVariableParameters();
     
+    if (batchIngestFile) {
+        await ingestBatchFile(document.getElementById('batchBasePrompt').value.trim(), defaults, variableParams);
+        return;
+    }
+    
     // Prepare batch jobs
     const jobs = batchPreviewData.map(item => {
         const job = {
@@ -2911,11 +3078,82 @@ async function queueBatchGeneration() {
     }
 }
 
+async function ingestBatchFile(basePrompt, defaults, variableParams) {
+    // Stream the file to the server, which parses and queues it in chunks
+    const ingestId = `ingest-${Date.now()}-${Math.random().toString(36).slice(2, 10)}`;
+    const formData = new FormData();
+    formData.append('file', batchIngestFile);
+    formData.append('template', basePrompt);
+    formData.append('defaults', JSON.stringify(defaults));
+    formData.append('variable', variableParams.join(','));
+    formData.append('ingest_id', ingestId);
+    
+    const queueBatchBtn = document.getElementById('queueBatchBtn');
+    const batchCount = document.getElementById('batchCount');
+    queueBatchBtn.disabled = true;
+    
+    const progressTimer = setInterval(async () => {
+        try {
+            const response = await fetch(`/api/queue/ingest/${ingestId}`);
+            const progress = await response.json();
+            if (progress.success) {
+                batchCount.textContent = progress.queued_count.toString();
+            }
+        } catch (error) {
+            // Progress is best effort; the final result comes from the upload request
+        }
+    }, 1000);
+    
+    try {
+        const response = await fetch('/api/queue/ingest', { method: 'POST', body: formData });
+        const result = await response.json();
+        
+        if (result.errors && result.errors.length > 0) {
+            console.warn('Rejected batch rows:', result.errors);
+        }
+        
+        if (result.success) {
+            const rejected = result.error_count > 0
+                ? ` (${result.error_count} invalid rows skipped, first: line ${result.errors[0].line}: ${result.errors[0].error})`
+                : '';
+            showNotification(`Queued ${result.queued_count} images${rejected}`, 'Batch Queued', result.error_count > 0 ? 'warning' : 'success', 5000);
+            updateQueue();
+        } else {
+            showNotification('Error: ' + result.error, 'Queue Failed', 'error');
+            if (result.queued_count > 0) {
+                updateQueue();
+            }
+        }
+    } catch (error) {
+        console.error('Error ingesting batch file:', error);
+        showNotification('Error uploading batch file', 'Error', 'error');
+    } finally {
+        clearInterval(progressTimer);
+        queueBatchBtn.disabled = false;
+        batchCount.textContent = 'all';
+    }
+}
+
 async function handleCSVFileUpload(event) {
     const file = event.target.files[0];
     if (!file) return;
     
     try {
+        if (file.size > LARGE_BATCH_FILE_BYTES) {
+            // Only load the head for the preview; the server parses the whole file
+            const head = await file.slice(0, 64 * 1024).text();
+            const lines = head.split('\n');
+            lines.pop();  // Last line may be cut off
+            const dataLines = lines.filter(line => line.trim() && !line.trim().startsWith('#'));
+            batchIngestFile = file;
+            document.getElementById('batchCSV').value = dataLines.slice(0, BATCH_FILE_PREVIEW_ROWS + 1).join('\n');
+            updateBatchPreview();
+            showNotification(`Large CSV file loaded (${(file.size / 1024 / 1024).toFixed(1)} MB), rows are parsed on the server`, 'Loaded', 'success', 3000);
+            event.target.value = '';
+            return;
+        }
+        
+        batchIngestFile = null;
         const text = await file.text();
         document.getElementById('batchCSV').value = text;
         updateBatchPreview();
@@ -2985,6 +3223,7 @@ function openAIParameterModal() {
     
     // Show modal
     document.getElementById('aiParameterModal').style.display = 'flex';
+    warmAIModel('aiParamProvider', 'aiParamModel');
 }
 
 function closeAIParameterModal() {
@@ -2997,6 +3236,7 @@ async function generateCSVWithAI() {
     const provider = document.getElementById('aiParamProvider').value;
     const model = document.getElementById('aiParamModel').value;
     const customContext = document.getElementById('aiParamContext').value.trim();
+    const bypassCache = !document.getElementById('aiParamUseCache').checked;
     
     const includeBasePrompt = document.getElementById('aiParamIncludeBasePrompt').checked;
     const includeInstructions = document.getElementById('aiParamIncludeInstructions').checked;
@@ -3041,6 +3281,7 @@ async function generateCSVWithAI() {
                 provider: provider,
                 custom_context: includeCustom ? customContext : null,
                 use_instructions: includeInstructions,
+                bypass_cache: bypassCache,
                 stream: true
             }, 'aiParamResult');
             showNotification('CSV generated successfully!', 'Success', 'success', 3000);
@@ -3057,7 +3298,8 @@ async function generateCSVWithAI() {
                     model: model,
                     provider: provider,
                     custom_context: includeCustom ? customContext : null,
-                    use_instructions: includeInstructions
+                    use_instructions: includeInstructions,
+                    bypass_cache: bypassCache
                 })
             });
             
@@ -3094,6 +3336,7 @@ function useAIGeneratedCSV() {
     }
     
     // Set CSV in batch tab
+    batchIngestFile = null;
     document.getElementById('batchCSV').value = csvData;
     updateBatchPreview();
     
@@ -3110,7 +3353,7 @@ function updateAIParamModelList() {
     if (models.length === 0) {
         modelSelect.innerHTML = '<option value="">No models available</option>';
     } else {
-        modelSelect.innerHTML = models.map(m => `<option value="${m}">${m}</option>`).join('');
+        modelSelect.innerHTML = renderModelOptions(provider, models);
     }
 }
 
@@ -3153,6 +3396,7 @@ function openParameterEditModal() {
     
     // Show modal
     document.getElementById('parameterEditModal').style.display = 'flex';
+    warmAIModel('editParamProvider', 'editParamModel');
 }
 
 function setupParameterEditModalListeners() {
@@ -3208,7 +3452,7 @@ function updateEditParamModelList() {
     if (models.length === 0) {
         modelSelect.innerHTML = '<option value="">No models available</option>';
     } else {
-        modelSelect.innerHTML = models.map(m => `<option value="${m}">${m}</option>`).join('');
+        modelSelect.innerHTML = renderModelOptions(provider, models);
     }
 }
 
@@ -3219,6 +3463,7 @@ async function generateParameterValues() {
     const provider = document.getElementById('editParamProvider').value;
     const model = document.getElementById('editParamModel').value;
     const instructions = document.getElementById('editParamInstructions').value.trim();
+    const bypassCache = !document.getElementById('editParamUseCache').checked;
     
     if (selectedParams.length === 0) {
         showNotification('Please select at least one parameter', 'No Parameters', 'warning');
@@ -3256,6 +3501,7 @@ async function generateParameterValues() {
                     model: model,
                     provider: provider,
                     instructions: instructions,
+                    bypass_cache: bypassCache,
                     stream: true
                 }, 'editParamResult');
                 const valueCount = document.getElementById('editParamResult').value.split('\n').filter(v => v.trim()).length;
@@ -3270,7 +3516,8 @@ async function generateParameterValues() {
                         count: count,
                         model: model,
                         provider: provider,
-                        instructions: instructions
+                        instructions: instructions,
+                        bypass_cache: bypassCache
                     })
                 });
                 
@@ -3296,6 +3543,7 @@ async function generateParameterValues() {
                     provider: provider,
                     custom_context: instructions || null,
                     use_instructions: true,
+                    bypass_cache: bypassCache,
                     stream: true
                 }, 'editParamResult');
                 showNotification(`Generated ${count} rows for ${selectedParams.length} parameters`, 'Success', 'success', 3000);
@@ -3312,7 +3560,8 @@ async function generateParameterValues() {
                         model: model,
                         provider: provider,
                         custom_context: instructions || null,
-                        use_instructions: true
+                        use_instructions: true,
+                        bypass_cache: bypassCache
                     })
                 });
                 
@@ -3452,6 +3701,7 @@ function applyParameterValues() {
     const newCSVText = newCSVLines.join('\n');
     
     // Apply to batch tab
+    batchIngestFile = null;
     document.getElementById('batchCSV').value = newCSVText;
     updateBatchPreview();
     
@@ -3464,6 +3714,7 @@ function applyParameterValues() {
 // ============================================================================
 
 let aiModels = { ollama: [], gemini: [] };
+let aiModelDetails = { ollama: [], gemini: [] };
 let aiCurrentPromptSource = 'single';
 
 function initializeAIFeatures() {
@@ -3484,6 +3735,27 @@ function initializeAIFeatures() {
     document.getElementById('aiStopBtn').addEventListener('click', stopAIGeneration);
     document.getElementById('aiModalCancelBtn').addEventListener('click', closeAIEditModal);
     document.getElementById('aiModalUseBtn').addEventListener('click', aiUseResult);
+    
+    // Pre-warm whichever model gets selected so the first request skips the load
+    document.getElementById('aiModel').addEventListener('change', () => warmAIModel('aiProvider', 'aiModel'));
+    document.getElementById('aiParamModel').addEventListener('change', () => warmAIModel('aiParamProvider', 'aiParamModel'));
+    document.getElementById('editParamModel').addEventListener('change', () => warmAIModel('editParamProvider', 'editParamModel'));
+}
+
+// Ask the backend to load the selected Ollama model in the background
+function warmAIModel(providerSelectId, modelSelectId) {
+    const provider = document.getElementById(providerSelectId).value;
+    const model = document.getElementById(modelSelectId).value;
+    
+    if (provider !== 'ollama' || !model) {
+        return;
+    }
+    
+    fetch('/api/ai/warm', {
+        method: 'POST',
+        headers: { 'Content-Type': 'application/json' },
+        body: JSON.stringify({ model, provider })
+    }).catch(error => console.error('Error warming AI model:', error));
 }
 
 // Streaming helper function
@@ -3520,6 +3792,9 @@ async function streamAIResponse(endpoint, payload, targetElementId) {
                     if (data.done) {
                         return;
                     }
+                    if (data.warning) {
+                        showNotification(data.warning, 'AI Warning', 'warning');
+                    }
                     if (data.text) {
                         document.getElementById(targetElementId).value += data.text;
                     }
@@ -3581,15 +3856,23 @@ async function stopAIGeneration() {
     currentStreamProvider = null;
 }
 
-async function loadAIModels() {
+async function loadAIModels(attempt = 0) {
     try {
         const response = await fetch('/api/ai/models');
         const result = await response.json();
         
         if (result.success) {
             aiModels = result.models;
+            aiModelDetails = result.details || {};
             updateAIModelList();
             updateAIParamModelList();
+            updateEditParamModelList();
+            
+            // The catalogue fills in the background on startup - check again shortly
+            const pending = Object.values(result.status || {}).some(s => !s.loaded && !s.error);
+            if (pending && attempt < 5) {
+                setTimeout(() => loadAIModels(attempt + 1), 2000);
+            }
         } else {
             console.error('Failed to load AI models:', result.error);
         }
@@ -3598,6 +3881,22 @@ async function loadAIModels() {
     }
 }
 
+// Build <option> tags, labelling models with size/family from the catalogue when known
+function renderModelOptions(provider, models) {
+    const details = {};
+    (aiModelDetails[provider] || []).forEach(d => { details[d.name] = d; });
+    
+    return models.map(m => {
+        const info = details[m] || {};
+        const extras = [info.parameter_size, info.family].filter(Boolean);
+        if (info.size) {
+            extras.push(`${(info.size / (1024 ** 3)).toFixed(1)} GB`);
+        }
+        const label = extras.length ? `${m} (${extras.join(' · ')})` : m;
+        return `<option value="${escapeHtml(m)}">${escapeHtml(label)}</option>`;
+    }).join('');
+}
+
 function updateAIModelList() {
     const provider = document.getElementById('aiProvider').value;
     const modelSelect = document.getElementById('aiModel');
@@ -3615,7 +3914,7 @@ function updateAIModelList() {
             modelInfo.style.color = 'var(--warning)';
         }
     } else {
-        modelSelect.innerHTML = models.map(m => `<option value="${m}">${m}</option>`).join('');
+        modelSelect.innerHTML = renderModelOptions(provider, models);
         modelInfo.textContent = `${models.length} model(s) available`;
         modelInfo.style.color = 'var(--success)';
     }
@@ -3645,6 +3944,7 @@ function openAIEditModal(source) {
     
     // Show modal
     document.getElementById('aiEditModal').style.display = 'flex';
+    warmAIModel('aiProvider', 'aiModel');
 }
 
 function closeAIEditModal() {
@@ -3658,6 +3958,7 @@ async function aiOptimizePrompt() {
     const model = document.getElementById('aiModel').value;
     const useInstructions = document.getElementById('aiUseOptimizeInstructions').checked;
     const isBatchPrompt = aiCurrentPromptSource === 'batch';
+    const bypassCache = !document.getElementById('aiUseCache').checked;
     
     if (!model) {
         showNotification('Please select a model', 'No Model Selected', 'warning');
@@ -3686,7 +3987,7 @@ async function aiOptimizePrompt() {
         if (provider === 'ollama') {
             // Use streaming for Ollama
             await streamAIResponse('/api/ai/optimize', {
-                prompt, model, provider, use_instructions: useInstructions, is_batch: isBatchPrompt, stream: true
+                prompt, model, provider, use_instructions: useInstructions, is_batch: isBatchPrompt, bypass_cache: bypassCache, stream: true
             }, 'aiResult');
             showNotification('Prompt optimized successfully!', 'Success', 'success', 3000);
         } else {
@@ -3694,7 +3995,7 @@ async function aiOptimizePrompt() {
             const response = await fetch('/api/ai/optimize', {
                 method: 'POST',
                 headers: { 'Content-Type': 'application/json' },
-                body: JSON.stringify({ prompt, model, provider, use_instructions: useInstructions, is_batch: isBatchPrompt })
+                body: JSON.stringify({ prompt, model, provider, use_instructions: useInstructions, is_batch: isBatchPrompt, bypass_cache: bypassCache })
             });
             
             const result = await response.json();
@@ -3726,6 +4027,7 @@ async function aiApplySuggestion() {
     const suggestion = document.getElementById('aiSuggestion').value.trim();
     const provider = document.getElementById('aiProvider').value;
     const model = document.getElementById('aiModel').value;
+    const bypassCache = !document.getElementById('aiUseCache').checked;
     
     if (!model) {
         showNotification('Please select a model', 'No Model Selected', 'warning');
@@ -3754,7 +4056,7 @@ async function aiApplySuggestion() {
         if (provider === 'ollama') {
             // Use streaming for Ollama
             await streamAIResponse('/api/ai/suggest', {
-                prompt, suggestion, model, provider, stream: true
+                prompt, suggestion, model, provider, bypass_cache: bypassCache, stream: true
             }, 'aiResult');
             showNotification('Suggestion applied successfully!', 'Success', 'success', 3000);
         } else {
@@ -3762,7 +4064,7 @@ async function aiApplySuggestion() {
             const response = await fetch('/api/ai/suggest', {
                 method: 'POST',
                 headers: { 'Content-Type': 'application/json' },
-                body: JSON.stringify({ prompt, suggestion, model, provider })
+                body: JSON.stringify({ prompt, suggestion, model, provider, bypass_cache: bypassCache })
             });
             
             const result = await response.json();
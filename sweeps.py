@@ -0,0 +1,179 @@
+"""
+Parameter Sweeps
+Grid jobs that store only their axes and a cursor; concrete jobs are decoded one at a time
+"""
+
+import math
+from typing import Dict, Any, List, Union
+from batch_ingest import PARAM_PATTERN, extract_parameters, convert_field, TEXT_FIELDS, JOB_FIELDS
+
+# Job fields that can be swept (output naming fields stay fixed for the whole sweep)
+SWEEP_FIELDS = tuple(field for field in JOB_FIELDS if field not in TEXT_FIELDS)
+RANGE_FIELDS = ('width', 'height', 'steps', 'cfg', 'shift', 'seed')
+MAX_SWEEP_SIZE = 10 ** 9
+
+# Keys of a sweep entry that are not generation parameters
+SWEEP_KEYS = ('type', 'axes', 'total', 'cursor', 'failed')
+
+
+def _normalize_axis(name: str, spec: Any, placeholders: List[str]) -> Dict[str, Any]:
+    """Validate one axis and convert it to {'name', 'values'} or {'name', 'start', 'step', 'count'}"""
+    is_field = name in SWEEP_FIELDS
+    if not is_field and name not in placeholders:
+        raise ValueError(f"Unknown sweep axis '{name}' (not a job parameter or [{name}] in the prompt)")
+
+    if isinstance(spec, list):
+        if not spec:
+            raise ValueError(f"Axis '{name}' has no values")
+        if is_field:
+            values = [convert_field(name, value, None) for value in spec]
+        else:
+            values = [str(value) for value in spec]
+        return {'name': name, 'values': values}
+
+    if not isinstance(spec, dict) or 'start' not in spec:
+        raise ValueError(f"Axis '{name}' must be a list of values or a range with 'start'")
+    if name not in RANGE_FIELDS:
+        raise ValueError(f"Axis '{name}' only accepts a list of values")
+
+    start = spec['start']
+    step = spec.get('step', 1)
+    if not isinstance(start, (int, float)) or not isinstance(step, (int, float)) or step == 0:
+        raise ValueError(f"Axis '{name}' needs a numeric start and a non-zero step")
+    if 'count' in spec:
+        count = int(spec['count'])
+    elif 'stop' in spec:
+        # Inclusive stop, tolerant of float rounding (1.0 to 2.0 by 0.1 gives 11 values)
+        count = math.floor((spec['stop'] - start) / step + 1e-9) + 1
+    else:
+        raise ValueError(f"Axis '{name}' needs 'stop' or 'count'")
+    if count < 1:
+        raise ValueError(f"Axis '{name}' range is empty")
+
+    axis = {'name': name, 'start': start, 'step': step, 'count': count}
+    # Both ends must be valid, which covers every value in between
+    convert_field(name, axis_value(axis, 0), None)
+    convert_field(name, axis_value(axis, count - 1), None)
+    return axis
+
+
+def axis_length(axis: Dict[str, Any]) -> int:
+    return len(axis['values']) if 'values' in axis else axis['count']
+
+
+def axis_value(axis: Dict[str, Any], position: int) -> Any:
+    """Get the value at a position along an axis"""
+    if 'values' in axis:
+        return axis['values'][position]
+    value = axis['start'] + position * axis['step']
+    if isinstance(axis['start'], int) and isinstance(axis['step'], int):
+        return value
+    return round(value, 6)
+
+
+def build_sweep(params: Dict[str, Any], axes: Union[Dict[str, Any], List[Dict[str, Any]]]) -> Dict[str, Any]:
+    """
+    Build the compact queue entry for a sweep
+
+    Args:
+        params: Base generation parameters (from job_parameters); the prompt may
+                contain [placeholders] that are swept like any other axis
+        axes: Axis name -> list of values or range {'start', 'stop' | 'count', 'step'},
+              or a list of {'name', ...} dicts. The first axis changes slowest.
+
+    Returns:
+        Sweep entry (without id/status) to be wrapped by new_job()
+
+    Raises:
+        ValueError: If an axis is invalid or the sweep is empty or too large
+    """
+    if isinstance(axes, dict):
+        axes = [
+            {'name': name, **spec} if isinstance(spec, dict) else {'name': name, 'values': spec}
+            for name, spec in axes.items()
+        ]
+    if not isinstance(axes, list) or not axes:
+        raise ValueError('At least one sweep axis is required')
+
+    placeholders = extract_parameters(params.get('prompt', ''))
+    normalized = []
+    for axis in axes:
+        if not isinstance(axis, dict) or 'name' not in axis:
+            raise ValueError('Each sweep axis needs a name')
+        spec = axis['values'] if 'values' in axis else {k: v for k, v in axis.items() if k != 'name'}
+        normalized.append(_normalize_axis(axis['name'], spec, placeholders))
+
+    names = [axis['name'] for axis in normalized]
+    if len(set(names)) != len(names):
+        raise ValueError('Sweep axes must be unique')
+    unswept = [name for name in placeholders if name not in names]
+    if unswept:
+        raise ValueError(f"Prompt parameters without an axis: {', '.join(unswept)}")
+
+    total = math.prod(axis_length(axis) for axis in normalized)
+    if total > MAX_SWEEP_SIZE:
+        raise ValueError(f"Sweep has {total} combinations (limit {MAX_SWEEP_SIZE})")
+
+    return {
+        **params,
+        'type': 'sweep',
+        'axes': normalized,
+        'total': total,
+        'cursor': 0,  # Index of the next combination to generate; advanced when it finishes
+        'failed': 0
+    }
+
+
+def is_sweep(job: Dict[str, Any]) -> bool:
+    return job.get('type') == 'sweep'
+
+
+def combination(sweep: Dict[str, Any], index: int) -> Dict[str, Any]:
+    """Decode a combination index into axis values (mixed radix, last axis fastest)"""
+    values = {}
+    for axis in reversed(sweep['axes']):
+        index, position = divmod(index, axis_length(axis))
+        values[axis['name']] = axis_value(axis, position)
+    return values
+
+
+def job_at(sweep: Dict[str, Any], index: int) -> Dict[str, Any]:
+    """
+    Materialize the concrete job for one combination of a sweep
+
+    The job id is derived from the sweep id and index, so the same combination
+    always maps to the same job.
+    """
+    values = combination(sweep, index)
+    job = {key: value for key, value in sweep.items() if key not in SWEEP_KEYS}
+    job['id'] = f"{sweep['id']}-{index}"
+    job['prompt'] = PARAM_PATTERN.sub(
+        lambda m: str(values.get(m.group(1), m.group(0))),
+        sweep.get('prompt', '')
+    )
+    for name, value in values.items():
+        if name in SWEEP_FIELDS:
+            job[name] = value
+    job['sweep_id'] = sweep['id']
+    job['sweep_index'] = index
+    job['sweep_total'] = sweep['total']
+    return job
+
+
+def next_job(sweep: Dict[str, Any]) -> Dict[str, Any]:
+    """Get the job at the sweep's cursor"""
+    return job_at(sweep, sweep['cursor'])
+
+
+def record_result(sweep: Dict[str, Any], job: Dict[str, Any]) -> bool:
+    """
+    Advance the cursor past a finished job of this sweep
+
+    Returns:
+        True when every combination has been generated
+    """
+    if job.get('sweep_index') == sweep['cursor']:
+        sweep['cursor'] += 1
+        if job.get('status') == 'failed':
+            sweep['failed'] += 1
+    return sweep['cursor'] >= sweep['total']
@@ -0,0 +1,243 @@
+"""
+Workflow Registry
+ComfyUI workflows described by a parameter-to-node mapping (<name>.map.json
+in the workflows folder), compiled once into patch plans
+"""
+
+import json
+import threading
+from pathlib import Path
+from typing import Optional, Dict, Any, List, Tuple
+
+MAP_SUFFIX = '.map.json'
+BATCH_NODE = 'webui:batch'  # RepeatLatentBatch inserted in front of the sampler for batches
+
+# Job parameters a mapping may cover
+PARAMETERS = (
+    'prompt', 'width', 'height', 'steps', 'cfg', 'shift', 'seed',
+    'use_image', 'use_image_size', 'image_filename',
+    'mcnl_lora', 'snofs_lora', 'male_lora', 'batch_size'
+)
+# Parameters a job cannot turn on for a workflow that has no input for them
+FEATURE_PARAMETERS = ('use_image', 'use_image_size', 'image_filename', 'mcnl_lora', 'snofs_lora', 'male_lora')
+
+
+class WorkflowError(ValueError):
+    """A workflow is unknown, its mapping is invalid or it cannot run a job"""
+
+
+class PatchPlan:
+    """
+    A workflow template and the node inputs each parameter sets
+
+    build() copies only the nodes the plan writes to; all other nodes are
+    shared with the cached template, which must therefore never be modified.
+    """
+
+    def __init__(self, name: str, template: Dict[str, Any], mapping: Dict[str, Any], workflow_file: str = ''):
+        """
+        Compile a mapping against its workflow
+
+        Args:
+            name: Workflow name
+            template: Workflow in ComfyUI API format
+            mapping: Parsed .map.json: 'parameters' (parameter -> {'node', 'input'}
+                     or a list of them), optional 'sampler' and 'description'
+            workflow_file: Template file name, relative to the workflows folder
+
+        Raises:
+            WorkflowError: If the mapping refers to unknown parameters, nodes or inputs
+        """
+        self.name = name
+        self.template = template
+        self.workflow_file = workflow_file
+        self.description = mapping.get('description', '')
+        self.targets: Dict[str, Tuple[Tuple[str, str], ...]] = {}
+        for parameter, targets in (mapping.get('parameters') or {}).items():
+            if parameter not in PARAMETERS:
+                raise WorkflowError(f"{name}: unknown parameter '{parameter}'")
+            if isinstance(targets, dict):
+                targets = [targets]
+            compiled = []
+            for target in targets:
+                node, input_name = str(target.get('node')), target.get('input')
+                if input_name not in template.get(node, {}).get('inputs', {}):
+                    raise WorkflowError(f"{name}: parameter '{parameter}' maps to missing input {node}.{input_name}")
+                compiled.append((node, input_name))
+            self.targets[parameter] = tuple(compiled)
+
+        self.sampler = mapping.get('sampler')
+        if self.sampler is not None and 'latent_image' not in template.get(self.sampler, {}).get('inputs', {}):
+            raise WorkflowError(f"{name}: sampler node {self.sampler} has no latent_image input")
+        self.nodes = {node for targets in self.targets.values() for node, _ in targets}
+
+    @property
+    def supports_batches(self) -> bool:
+        return 'batch_size' in self.targets or self.sampler is not None
+
+    def supports(self, parameter: str) -> bool:
+        return parameter in self.targets
+
+    def check(self, values: Dict[str, Any]):
+        """
+        Refuse jobs that turn on a feature this workflow has no input for
+
+        Raises:
+            WorkflowError: Naming the first such parameter
+        """
+        for parameter in FEATURE_PARAMETERS:
+            if values.get(parameter) and parameter not in self.targets:
+                raise WorkflowError(f"Workflow '{self.name}' does not support {parameter}")
+
+    def build(self, values: Dict[str, Any], batch_size: int = 1, template: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+        """
+        Get the workflow with parameter values applied
+
+        Args:
+            values: Parameter -> value; None leaves the template's value
+            batch_size: Images per execution, through the 'batch_size'
+                        parameter or a RepeatLatentBatch node before the sampler
+            template: Workflow to patch instead of the cached template
+
+        Returns:
+            The patched workflow (shares untouched nodes with the template)
+
+        Raises:
+            WorkflowError: If a batch is requested from a workflow without batch support
+        """
+        template = template if template is not None else self.template
+        batch_by_node = batch_size > 1 and 'batch_size' not in self.targets
+        if batch_by_node and self.sampler is None:
+            raise WorkflowError(f"Workflow '{self.name}' does not support batches")
+
+        workflow = dict(template)
+        for node in self.nodes | ({self.sampler} if batch_by_node else set()):
+            workflow[node] = {**template[node], 'inputs': dict(template[node]['inputs'])}
+        for parameter, value in values.items():
+            if value is None:
+                continue
+            for node, input_name in self.targets.get(parameter, ()):
+                workflow[node]['inputs'][input_name] = value
+        if batch_size > 1:
+            if batch_by_node:
+                sampler_inputs = workflow[self.sampler]['inputs']
+                workflow[BATCH_NODE] = {
+                    'class_type': 'RepeatLatentBatch',
+                    'inputs': {'samples': sampler_inputs['latent_image'], 'amount': batch_size}
+                }
+                sampler_inputs['latent_image'] = [BATCH_NODE, 0]
+            else:
+                for node, input_name in self.targets['batch_size']:
+                    workflow[node]['inputs'][input_name] = batch_size
+        return workflow
+
+    def set(self, workflow: Dict[str, Any], parameter: str, value: Any):
+        """Change one parameter of a workflow returned by build()"""
+        for node, input_name in self.targets.get(parameter, ()):
+            workflow[node]['inputs'][input_name] = value
+
+    def describe(self) -> Dict[str, Any]:
+        return {
+            'name': self.name,
+            'description': self.description,
+            'parameters': list(self.targets),
+            'batches': self.supports_batches
+        }
+
+
+class WorkflowRegistry:
+    """Workflows with a .map.json in a folder, compiled on first use and again when either file changes"""
+
+    def __init__(self, directory: Path, default: str = 'Qwen_Full'):
+        """
+        Initialize the registry
+
+        Args:
+            directory: Folder holding <name>.json workflows and <name>.map.json mappings
+            default: Workflow used by jobs that don't name one
+        """
+        self.directory = Path(directory)
+        self.default = default
+        self._plans: Dict[str, Tuple[Tuple[float, float], PatchPlan]] = {}  # name -> ((map mtime, workflow mtime), plan)
+        self._lock = threading.Lock()
+
+    def names(self) -> List[str]:
+        if not self.directory.exists():
+            return []
+        return sorted(path.name[:-len(MAP_SUFFIX)] for path in self.directory.glob(f"*{MAP_SUFFIX}"))
+
+    def check(self, name: Optional[str], params: Optional[Dict[str, Any]] = None) -> str:
+        """
+        Validate a job's workflow name (empty means the default)
+
+        Args:
+            name: Workflow name
+            params: Job parameters the workflow must be able to apply
+
+        Returns:
+            The workflow name
+
+        Raises:
+            WorkflowError: If there is no such workflow or it cannot run the job
+        """
+        name = name or self.default
+        if not isinstance(name, str) or Path(name).name != name:
+            raise WorkflowError(f"Invalid workflow name {name!r}")
+        if not (self.directory / f"{name}{MAP_SUFFIX}").is_file():
+            raise WorkflowError(f"Unknown workflow '{name}' (available: {', '.join(self.names()) or 'none'})")
+        plan = self.get(name)
+        if params:
+            plan.check(params)
+        return name
+
+    def get(self, name: Optional[str] = None) -> PatchPlan:
+        """
+        Get the compiled plan of a workflow
+
+        Raises:
+            WorkflowError: If the workflow or its mapping is missing or invalid
+        """
+        name = name or self.default
+        if not isinstance(name, str) or Path(name).name != name:
+            raise WorkflowError(f"Invalid workflow name {name!r}")
+        map_path = self.directory / f"{name}{MAP_SUFFIX}"
+        with self._lock:
+            try:
+                map_mtime = map_path.stat().st_mtime
+            except OSError:
+                raise WorkflowError(f"Unknown workflow '{name}'")
+            cached = self._plans.get(name)
+            if cached:
+                try:
+                    if cached[0] == (map_mtime, (self.directory / cached[1].workflow_file).stat().st_mtime):
+                        return cached[1]
+                except OSError:
+                    pass  # Workflow file gone; recompiling reports it
+
+            try:
+                with open(map_path, 'r', encoding='utf-8') as f:
+                    mapping = json.load(f)
+            except (OSError, json.JSONDecodeError) as e:
+                raise WorkflowError(f"Cannot read the mapping of workflow '{name}': {e}")
+            workflow_file = mapping.get('workflow', f"{name}.json")
+            workflow_path = self.directory / workflow_file
+            try:
+                workflow_mtime = workflow_path.stat().st_mtime
+                with open(workflow_path, 'r', encoding='utf-8') as f:
+                    template = json.load(f)
+            except (OSError, json.JSONDecodeError) as e:
+                raise WorkflowError(f"Cannot read workflow '{name}' ({workflow_file}): {e}")
+            plan = PatchPlan(name, template, mapping, workflow_file)
+            self._plans[name] = ((map_mtime, workflow_mtime), plan)
+            print(f"Compiled workflow '{name}': {len(plan.targets)} parameters on {len(plan.nodes)} nodes")
+            return plan
+
+    def describe(self) -> List[Dict[str, Any]]:
+        """Get name, description, mapped parameters and batch support of every valid workflow"""
+        workflows = []
+        for name in self.names():
+            try:
+                workflows.append({**self.get(name).describe(), 'default': name == self.default})
+            except WorkflowError as e:
+                print(f"Skipping workflow: {e}")
+        return workflows
@@ -0,0 +1,137 @@
+"""
+ZIP Export
+Streams files from disk as a ZIP archive through a generator, without temp
+files and with memory bounded by the read chunk size
+"""
+
+import io
+import json
+import os
+import time
+import zipfile
+from pathlib import Path
+from typing import Optional, Dict, Any, List, Tuple, Iterable, Iterator
+
+READ_CHUNK_BYTES = 1024 * 1024
+MANIFEST_NAME = 'manifest.jsonl'
+MIN_ZIP_TIMESTAMP = 315619200  # 1980-01-02; ZIP dates cannot be earlier than 1980
+
+
+class _StreamBuffer(io.RawIOBase):
+    """Write-only sink for ZipFile that hands out what was written since the last drain"""
+
+    def __init__(self):
+        self._chunks: List[bytes] = []
+        self._position = 0
+
+    def writable(self) -> bool:
+        return True
+
+    def write(self, data) -> int:
+        self._chunks.append(bytes(data))
+        self._position += len(data)
+        return len(data)
+
+    def tell(self) -> int:
+        # Not seekable, so ZipFile writes sizes after each entry's data
+        return self._position
+
+    def drain(self) -> bytes:
+        data = b''.join(self._chunks)
+        self._chunks.clear()
+        return data
+
+
+def collect_files(items: Iterable[Path], exclude: Iterable[Path] = ()) -> List[Tuple[str, Path]]:
+    """
+    Expand files and folders into (archive name, path) pairs
+
+    Folders keep their name and structure in the archive; selected files go
+    to the top level. Hidden files and folders and the excluded paths are
+    left out, and clashing names get ' (1)', ' (2)', ...
+
+    Args:
+        items: Files and folders to export
+        exclude: Paths never to include (e.g. the metadata file)
+
+    Returns:
+        (archive name, path) pairs in archive order
+    """
+    excluded = {Path(path).resolve() for path in exclude}
+    files = []
+    names = set()
+    seen = set()
+
+    def add(arcname: str, path: Path):
+        resolved = path.resolve()
+        if resolved in excluded or resolved in seen:
+            return
+        seen.add(resolved)
+        stem, suffix = os.path.splitext(arcname)
+        index = 1
+        while arcname in names:
+            arcname = f"{stem} ({index}){suffix}"
+            index += 1
+        names.add(arcname)
+        files.append((arcname, path))
+
+    for item in items:
+        item = Path(item)
+        if item.is_file():
+            add(item.name, item)
+            continue
+        for root, dirs, filenames in os.walk(item):
+            dirs[:] = sorted(d for d in dirs if not d.startswith('.'))
+            for name in sorted(filenames):
+                if not name.startswith('.'):
+                    path = Path(root) / name
+                    add(path.relative_to(item.parent).as_posix(), path)
+    return files
+
+
+def stream_zip(files: List[Tuple[str, Path]], manifest: Optional[Iterable[Dict[str, Any]]] = None) -> Iterator[bytes]:
+    """
+    Generate a ZIP archive of files, chunk by chunk
+
+    Files are stored without compression (outputs are already compressed
+    images). Files that disappear before they are reached are left out.
+
+    Args:
+        files: (archive name, path) pairs, e.g. from collect_files()
+        manifest: Records written one JSON object per line to manifest.jsonl (deflated)
+
+    Yields:
+        Archive bytes
+    """
+    buffer = _StreamBuffer()
+    with zipfile.ZipFile(buffer, 'w', compression=zipfile.ZIP_STORED) as archive:
+        for arcname, path in files:
+            try:
+                source = open(path, 'rb')
+            except OSError as e:
+                print(f"Export: skipping {path}: {e}")
+                continue
+            with source:
+                stat = os.fstat(source.fileno())
+                mtime = max(stat.st_mtime, MIN_ZIP_TIMESTAMP)
+                info = zipfile.ZipInfo(arcname, date_time=time.localtime(mtime)[:6])
+                info.file_size = stat.st_size  # Lets ZipFile pick ZIP64 headers up front for large files
+                info.compress_type = zipfile.ZIP_STORED
+                with archive.open(info, 'w') as target:
+                    for block in iter(lambda: source.read(READ_CHUNK_BYTES), b''):
+                        target.write(block)
+                        yield buffer.drain()  # A full block, never empty
+            data = buffer.drain()
+            if data:
+                yield data
+
+        if manifest is not None:
+            info = zipfile.ZipInfo(MANIFEST_NAME, date_time=time.localtime()[:6])
+            info.compress_type = zipfile.ZIP_DEFLATED
+            with archive.open(info, 'w') as target:
+                for record in manifest:
+                    target.write((json.dumps(record, ensure_ascii=False) + '\n').encode('utf-8'))
+                    data = buffer.drain()
+                    if data:
+                        yield data
+    yield buffer.drain()  # Central directory